@@ -0,0 +1 @@
+# this space intentionally left blank
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+import argparse
+import itertools
+import random
+import sys
+import time
+
+from ipaddress import ip_address, ip_network
+
+FLOW_TEMPLATE = (
+    '<flow type="{flowtype}"><meta direction="original">'
+    '<layer3 protonum="2" protoname="ipv4"><src>{src}</src><dst>{dst}</dst>'
+    '</layer3><layer4 protonum="6" protoname="tcp"><sport>{sport}</sport>'
+    '<dport>{dport}</dport></layer4></meta><meta direction="reply">'
+    '<layer3 protonum="2" protoname="ipv4"><src>{dst}</src><dst>{src}</dst>'
+    '</layer3><layer4 protonum="6" protoname="tcp"><sport>{dport}</sport>'
+    '<dport>{sport}</dport></layer4></meta><meta direction="independent">'
+    '<timeout>120</timeout><id>{id}</id></meta></flow>\n')
+
+DPORTS = (443, 80, 22, 25, 53, 3306, 5432, 6379, 8080, 9418)
+
+
+def main(sysargs=sys.argv[:]):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description='write synthetic conntrack event XML to stdout')
+    add_arguments(parser)
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=0.0,
+        help='flows per second to write (0 to write as fast as possible)')
+    args = parser.parse_args(sysargs[1:])
+
+    out = sys.stdout
+    out.write('<?xml version="1.0" encoding="utf-8"?>\n<conntrack>\n')
+    started = time.monotonic()
+    for (i, line) in enumerate(generate_events(**generator_kwargs(args))):
+        out.write(line)
+        if args.rate > 0:
+            delay = started + (i + 1) / args.rate - time.monotonic()
+            if delay > 0:
+                out.flush()
+                time.sleep(delay)
+    out.write('</conntrack>\n')
+    return 0
+
+
+def add_arguments(parser):
+    parser.add_argument('--flows', type=int, default=100000)
+    parser.add_argument('--sources', type=int, default=500)
+    parser.add_argument('--destinations', type=int, default=2000)
+    parser.add_argument(
+        '--skew',
+        type=float,
+        default=1.1,
+        help='zipf exponent of the source and destination popularity')
+    parser.add_argument(
+        '--mix',
+        default='0.4,0.4,0.2',
+        help='new,update,destroy proportions of generated flows')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def generator_kwargs(args):
+    return dict(
+        flows=args.flows,
+        sources=args.sources,
+        destinations=args.destinations,
+        skew=args.skew,
+        mix=parse_mix(args.mix),
+        seed=args.seed)
+
+
+def parse_mix(mix):
+    weights = tuple(float(w) for w in mix.split(','))
+    if len(weights) != 3 or sum(weights) <= 0:
+        raise ValueError(f'invalid new,update,destroy mix {mix!r}')
+    return weights
+
+
+def generate_events(flows=100000,
+                    sources=500,
+                    destinations=2000,
+                    skew=1.1,
+                    mix=(0.4, 0.4, 0.2),
+                    seed=0):
+    # Sources and destinations are each drawn from a zipf-like popularity
+    # distribution, so a few pairs dominate as they do behind a busy NAT.
+    rand = random.Random(seed)
+    srcs = [str(ip_address(0x0a000000 + i)) for i in range(sources)]
+    dsts = [str(ip_address(0x08000000 + i * 7)) for i in range(destinations)]
+    src_weights = _zipf_weights(sources, skew)
+    dst_weights = _zipf_weights(destinations, skew)
+    flowtypes = ('new', 'update', 'destroy')
+    type_weights = list(itertools.accumulate(mix))
+
+    for i in range(flows):
+        yield FLOW_TEMPLATE.format(
+            flowtype=rand.choices(flowtypes, cum_weights=type_weights)[0],
+            src=rand.choices(srcs, cum_weights=src_weights)[0],
+            dst=rand.choices(dsts, cum_weights=dst_weights)[0],
+            sport=rand.randrange(32768, 61000),
+            dport=DPORTS[i % len(DPORTS)],
+            id=i)
+
+
+def ignore_networks(count, seed=0):
+    # Ignore networks are /24s drawn across the generated destination space
+    # plus unrelated ranges, so most lookups miss as they would in practice.
+    rand = random.Random(seed)
+    return [
+        ip_network(f'{rand.randrange(1, 224)}.{rand.randrange(256)}.'
+                   f'{rand.randrange(256)}.0/24') for _ in range(count)
+    ]
+
+
+def _zipf_weights(count, skew):
+    return list(
+        itertools.accumulate(
+            1.0 / (rank**skew) for rank in range(1, count + 1)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+import argparse
+import itertools
+import random
+import sys
+
+from collections import Counter
+
+from nat_conntracker.cidr_matcher import IPV4_MAPPED
+from nat_conntracker.count_min_stats import CountMinStats
+from nat_conntracker.flow_key import FlowKey
+from nat_conntracker.space_saving_stats import SpaceSavingStats
+from nat_conntracker.stats import Stats
+
+ENGINES = (
+    ('fifo', Stats),
+    ('space-saving', SpaceSavingStats),
+    ('count-min', CountMinStats),
+)
+
+
+def main(sysargs=sys.argv[:]):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--flows', type=int, default=200000)
+    parser.add_argument('--keys', type=int, default=5000)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--churn', type=float, default=0.5)
+    parser.add_argument('--max-stats-size', type=int, default=1000)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(sysargs[1:])
+
+    stream = list(
+        skewed_stream(args.flows, args.keys, args.skew, args.churn,
+                      random.Random(args.seed)))
+    exact = Counter(stream)
+    expected = exact.most_common(args.top_n)
+
+    print(f'flows={len(stream)} distinct={len(exact)} '
+          f'max_stats_size={args.max_stats_size} top_n={args.top_n}')
+    for name, engine_class in ENGINES:
+        engine = engine_class(max_size=args.max_stats_size)
+        for key in stream:
+            engine.add(key)
+        (recall, max_error) = accuracy(expected, engine.top_keys(args.top_n),
+                                       exact)
+        print(f'engine={name} recall={recall:.3f} '
+              f'max_relative_error={max_error:.3f}')
+    return 0
+
+
+def skewed_stream(flows, keys, skew, churn, rand):
+    # Zipf-distributed heavy hitters interleaved with a churn of one-off
+    # flows that never repeat.
+    heavy = [_key(i, i % 251, 443) for i in range(keys)]
+    weights = list(
+        itertools.accumulate(
+            1.0 / (rank**skew) for rank in range(1, keys + 1)))
+    one_off = itertools.count(keys)
+    for _ in range(flows):
+        if rand.random() < churn:
+            yield _key(next(one_off), rand.randrange(65536), 53)
+        else:
+            yield rand.choices(heavy, cum_weights=weights)[0]
+
+
+def accuracy(expected, reported, exact):
+    expected_keys = set(key for (key, _) in expected)
+    found = sum(1 for (key, _) in reported if key in expected_keys)
+    max_error = 0.0
+    for (key, count) in reported:
+        max_error = max(max_error, abs(count - exact[key]) / exact[key])
+    return (found / max(len(expected), 1), max_error)
+
+
+def _key(src, dst, dport):
+    return FlowKey(IPV4_MAPPED | (0x0a000000 + src),
+                   IPV4_MAPPED | (0x08000000 + dst), dport)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
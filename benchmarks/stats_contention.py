@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+import argparse
+import sys
+import threading
+import time
+
+from nat_conntracker.cidr_matcher import IPV4_MAPPED
+from nat_conntracker.flow_key import FlowKey
+from nat_conntracker.sharded_stats import ShardedStats
+from nat_conntracker.stats import Stats
+
+ENGINES = (
+    ('fifo', Stats),
+    ('sharded', ShardedStats),
+)
+
+
+def main(sysargs=sys.argv[:]):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--producers', type=int, default=4)
+    parser.add_argument('--flows', type=int, default=200000)
+    parser.add_argument('--keys', type=int, default=20000)
+    parser.add_argument('--max-stats-size', type=int, default=20000)
+    parser.add_argument('--churn-keys', type=int, default=200000)
+    parser.add_argument('--sample-interval', type=float, default=0.05)
+    args = parser.parse_args(sysargs[1:])
+
+    keys = _keys(args.keys)
+    for name, engine_class in ENGINES:
+        engine = engine_class(max_size=args.max_stats_size)
+        _report(name, args, *run(engine, keys, args))
+
+    # The Stats full-table paths: evictions from a full table under churn,
+    # and reads of more than the incrementally kept candidates.
+    _report(
+        'fifo-churn', args,
+        *run(
+            Stats(max_size=args.max_stats_size), _keys(args.churn_keys), args))
+    _report(
+        'fifo-scan', args,
+        *run(
+            Stats(max_size=args.max_stats_size),
+            keys,
+            args,
+            top_n=args.max_stats_size))
+    return 0
+
+
+def _keys(count):
+    return [
+        FlowKey(IPV4_MAPPED | (0x0a000000 + i), IPV4_MAPPED | 0x08080808, 443)
+        for i in range(count)
+    ]
+
+
+def _report(name, args, flows_per_sec, pauses):
+    pauses.sort()
+    print(f'engine={name} producers={args.producers} '
+          f'flows_per_sec={flows_per_sec:.0f} samples={len(pauses)} '
+          f'p50_pause_ms={_percentile(pauses, 0.5) * 1000:.3f} '
+          f'max_pause_ms={_percentile(pauses, 1.0) * 1000:.3f}')
+
+
+def run(engine, keys, args, top_n=10):
+    done = threading.Event()
+    pauses = []
+
+    def produce(offset):
+        nkeys = len(keys)
+        for i in range(args.flows):
+            engine.add(keys[(i * 7 + offset) % nkeys])
+        flush = getattr(engine, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def sample():
+        while not done.wait(args.sample_interval):
+            start = time.perf_counter()
+            engine.top(n=top_n)
+            engine.reset()
+            pauses.append(time.perf_counter() - start)
+
+    sampler = threading.Thread(target=sample)
+    producers = [
+        threading.Thread(target=produce, args=(i, ))
+        for i in range(args.producers)
+    ]
+
+    start = time.perf_counter()
+    sampler.start()
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+
+    return ((args.flows * args.producers) / elapsed, pauses)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+import argparse
+import bz2
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import sys
+import time
+
+from benchmarks.generator import (add_arguments, generate_events,
+                                  generator_kwargs, ignore_networks)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE = os.path.join(
+    os.path.dirname(HERE), 'tests', 'data', 'conntrack-events-sample.xml.bz2')
+
+PARSERS = ('minidom', 'expat', 'fast')
+ENGINES = ('fifo', 'space-saving', 'count-min', 'windowed', 'sharded')
+
+
+def main(sysargs=sys.argv[:]):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description='measure parse and count throughput, writing one JSON '
+        'object per parser and stats engine to stdout')
+    add_arguments(parser)
+    parser.add_argument(
+        '--events',
+        choices=('generator', 'sample'),
+        default='generator',
+        help='synthetic events or the recorded conntrack sample')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=20,
+        help='times the recorded sample is replayed')
+    parser.add_argument('--ignore-networks', type=int, default=100)
+    parser.add_argument('--max-stats-size', type=int, default=1000)
+    parser.add_argument('--sample-every', type=int, default=10000)
+    parser.add_argument('--parsers', default=','.join(PARSERS))
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument(
+        '--case-timeout',
+        type=float,
+        default=600.0,
+        help='seconds a case may run before it is reported as failed')
+    args = parser.parse_args(sysargs[1:])
+
+    # Each case runs in a fresh interpreter so that peak RSS is its own.
+    context = multiprocessing.get_context('spawn')
+    failed = 0
+    for parser_name in args.parsers.split(','):
+        for engine_name in args.engines.split(','):
+            results = context.Queue()
+            proc = context.Process(
+                target=_run_case,
+                args=(vars(args), parser_name, engine_name, results))
+            proc.start()
+            result = _wait_case(proc, results, args.case_timeout)
+            if result is None:
+                failed += 1
+                print(
+                    f'case failed parser={parser_name} '
+                    f'engine={engine_name} exitcode={proc.exitcode}',
+                    file=sys.stderr,
+                    flush=True)
+                continue
+            print(json.dumps(result, sort_keys=True), flush=True)
+    return 1 if failed else 0
+
+
+def _wait_case(proc, results, timeout):
+    # The result is read before joining, since a child blocks on exit until
+    # its queued result has been consumed. A child that exits without one
+    # has failed, and one that outlives the timeout is killed.
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            result = results.get(timeout=1.0)
+            proc.join()
+            return result
+        except queue.Empty:
+            if not proc.is_alive():
+                proc.join()
+                return None
+            if time.monotonic() >= deadline:
+                proc.terminate()
+                proc.join()
+                return None
+
+
+def _run_case(args, parser_name, engine_name, results):
+    results.put(run_case(args, parser_name, engine_name))
+
+
+def run_case(args, parser_name, engine_name):
+    from nat_conntracker.__main__ import VERSION, _build_stats
+    from nat_conntracker.conntracker import Conntracker
+    from nat_conntracker.mem_settings import MemSettings
+    from nat_conntracker.null_healther import NullHealther
+    from nat_conntracker.null_syncer import NullSyncer
+
+    logger = logging.getLogger('benchmarks')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    lines = load_events(args)
+    settings = MemSettings()
+    for net in ignore_networks(args['ignore_networks'], seed=args['seed']):
+        settings.add_ignore_dst(net)
+
+    stats_args = dict(
+        stats_engine=engine_name,
+        max_stats_size=args['max_stats_size'],
+        cms_epsilon=0.001,
+        cms_delta=0.01,
+        window=60,
+        bucket_width=5,
+        stats_batch_size=256)
+    conntracker = Conntracker(
+        logger,
+        NullSyncer(),
+        settings,
+        NullHealther(),
+        _build_stats(stats_args, logger),
+        parser_class=_parser_class(parser_name))
+
+    rss_before = _peak_rss_kb()
+    latencies = []
+    pauses = []
+    started = time.perf_counter()
+    conntracker.handle(
+        _timed(lines, latencies, pauses, conntracker, args['sample_every']))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pauses.sort()
+    return {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'events': args['events'],
+        'parser': parser_name,
+        'engine': engine_name,
+        'flows': len(lines),
+        'seconds': round(elapsed, 6),
+        'flows_per_sec': round(len(lines) / elapsed, 1),
+        'p50_latency_us': round(_percentile(latencies, 0.50) * 1e6, 3),
+        'p99_latency_us': round(_percentile(latencies, 0.99) * 1e6, 3),
+        'samples': len(pauses),
+        'p50_sample_ms': round(_percentile(pauses, 0.50) * 1e3, 3),
+        'max_sample_ms': round(_percentile(pauses, 1.0) * 1e3, 3),
+        'rss_before_kb': rss_before,
+        'peak_rss_kb': _peak_rss_kb(),
+    }
+
+
+def load_events(args):
+    if args['events'] == 'sample':
+        with bz2.open(SAMPLE, 'rt') as sample:
+            lines = [line for line in sample
+                     if line.startswith('<flow')] * args['repeat']
+    else:
+        kwargs = generator_kwargs(argparse.Namespace(**args))
+        lines = list(generate_events(**kwargs))
+    return lines
+
+
+def _timed(lines, latencies, pauses, conntracker, sample_every):
+    # The time between handing a line to the parser and it asking for the
+    # next one is the per-flow latency. sample() runs inline every
+    # sample_every lines and is timed separately as the pause it causes.
+    perf_counter = time.perf_counter
+    for (i, line) in enumerate(lines, 1):
+        started = perf_counter()
+        yield line
+        latencies.append(perf_counter() - started)
+        if i % sample_every == 0:
+            started = perf_counter()
+            conntracker.sample(threshold=2**31, top_n=10)
+            pauses.append(perf_counter() - started)
+
+
+def _parser_class(name):
+    if name == 'expat':
+        from nat_conntracker.streaming_flow_parser import StreamingFlowParser
+        return StreamingFlowParser
+    if name == 'fast':
+        from nat_conntracker.fast_flow_parser import FastFlowParser
+        return FastFlowParser
+    from nat_conntracker.flow_parser import FlowParser
+    return FlowParser
+
+
+def _peak_rss_kb():
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
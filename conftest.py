@@ -1,11 +1,29 @@
+import bz2
 import os
+import shutil
 import socket
 import sys
+import time
 
 import pytest
 import redis
 
-sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+HERE = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.insert(0, HERE)
+
+
+@pytest.fixture(scope='session')
+def events_sample(tmpdir_factory):
+    # Decompressed from the committed capture, as `make deps` does.
+    path = str(
+        tmpdir_factory.mktemp('data').join('conntrack-events-sample.xml'))
+    with bz2.open(
+            os.path.join(HERE, 'tests', 'data',
+                         'conntrack-events-sample.xml.bz2')) as inp:
+        with open(path, 'wb') as out:
+            shutil.copyfileobj(inp, out)
+    return path
 
 
 @pytest.fixture(autouse=True)
@@ -15,19 +33,41 @@ def no_socket_gethostbyaddr(monkeypatch):
 
 @pytest.fixture(autouse=True)
 def no_redis_from_url(monkeypatch):
-    monkeypatch.setattr(redis, 'from_url', lambda u: FakeRedisConn(u))
+    # Connections to the same url share state, like clients of one server.
+    servers = {}
+    monkeypatch.setattr(redis, 'from_url',
+                        lambda u: FakeRedisConn(u, servers.setdefault(u, {})))
 
 
 class FakeRedisConn(object):
-    def __init__(self, url):
+    def __init__(self, url, server=None):
+        server = server if server is not None else {}
         self.url = url
-        self._sets = {}
+        self._sets = server.setdefault('sets', {})
+        self._strings = server.setdefault('strings', {})
+        self._zsets = server.setdefault('zsets', {})
+        self._ttls = server.setdefault('ttls', {})
+        self._subscribers = server.setdefault('subscribers', [])
 
-    def publish(self, *args):
-        pass
+    def publish(self, channel, message):
+        subscribers = [
+            ps for ps in self._subscribers if channel in ps.channels
+        ]
+        for ps in subscribers:
+            ps.messages.append({
+                'type': 'message',
+                'channel': channel,
+                'data': message
+            })
+        return len(subscribers)
 
     def pubsub(self, **kwargs):
-        pass
+        ps = FakeRedisPubSub()
+        self._subscribers.append(ps)
+        return ps
+
+    def pipeline(self, transaction=True):
+        return FakeRedisPipeline(self)
 
     def ping(self):
         return b'PONG'
@@ -40,3 +80,68 @@ class FakeRedisConn(object):
             self._sets[key] = set()
         self._sets[key].add(str(value).encode('utf-8'))
         return len(self._sets[key])
+
+    def get(self, key):
+        return self._strings.get(key)
+
+    def set(self, key, value):
+        self._strings[key] = str(value).encode('utf-8')
+        return True
+
+    def incr(self, key):
+        value = int(self._strings.get(key) or 0) + 1
+        self._strings[key] = str(value).encode('utf-8')
+        return value
+
+    def zincrby(self, name, amount, value):
+        zset = self._zsets.setdefault(name, {})
+        member = str(value).encode('utf-8')
+        zset[member] = zset.get(member, 0.0) + float(amount)
+        return zset[member]
+
+    def zrevrange(self, name, start, end, withscores=False):
+        ranked = sorted(
+            self._zsets.get(name, {}).items(), key=lambda item: -item[1])
+        ranked = ranked[start:(None if end == -1 else end + 1)]
+        if withscores:
+            return ranked
+        return [member for (member, _) in ranked]
+
+    def expire(self, name, seconds):
+        self._ttls[name] = seconds
+        return name in self._zsets or name in self._sets
+
+
+class FakeRedisPubSub(object):
+    def __init__(self):
+        self.channels = set()
+        self.messages = []
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    def get_message(self, timeout=0.0):
+        if self.messages:
+            return self.messages.pop(0)
+        time.sleep(min(timeout, 0.01))
+        return None
+
+
+class FakeRedisPipeline(object):
+    def __init__(self, conn):
+        self._conn = conn
+        self._commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return command
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        return [
+            getattr(self._conn, name)(*args, **kwargs)
+            for (name, args, kwargs) in commands
+        ]
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import argparse
+import functools
 import logging
 import os
 import sys
@@ -8,11 +9,14 @@ from urllib.parse import unquote_plus
 from ipaddress import ip_network
 
 from .conntracker import Conntracker
+from .emitter import AlertEmitter
+from .flow_parser import FlowParser
+from .hostname_resolver import HostnameResolver
 from .mem_settings import MemSettings
 from .null_healther import NullHealther
 from .null_syncer import NullSyncer
 from .runner import Runner
-from .stats import Stats
+from .stats import TOP_SIZE, Stats
 
 try:
     import pkg_resources
@@ -32,24 +36,58 @@ PRIVATE_NETS = (
 )
 
 ARG_DEFAULTS = (
+    ('alert_queue_size', 64),
+    ('bucket_width', 5),
+    ('checkpoint_interval', 0),
+    ('checkpoint_max_age', 300),
+    ('checkpoint_path', ''),
+    ('cms_delta', 0.01),
+    ('cms_epsilon', 0.001),
+    ('cluster_role', 'none'),
+    ('cluster_top_k', TOP_SIZE),
     ('conn_threshold', 100),
     ('debug', False),
     ('dst_ignore_cidrs', ('127.0.0.1/32', )),
     ('eval_interval', 60),
     ('events', sys.stdin),
+    ('fanout_max_sources', 10000),
+    ('fanout_threshold', 0),
     ('gesund_checks_enabled', False),
     ('gesund_namespace', 'gesund-0'),
     ('include_privnets', False),
+    ('ingest_policy', 'block'),
+    ('ingest_queue_size', 0),
+    ('load_shed_max_rate', 0),
     ('log_file', ''),
     ('max_stats_size', 1000),
+    ('metrics_port', 0),
+    ('metrics_textfile', ''),
+    ('netlink', False),
+    ('netlink_rcvbuf', 4 * 1024 * 1024),
+    ('netlink_replay', ''),
+    ('parser', 'minidom'),
+    ('read_size', 65536),
     ('redis_url', ''),
+    ('resolver_pool_size', 4),
+    ('resolver_ttl', 3600),
+    ('rules_file', ''),
+    ('runtime', 'threads'),
+    ('settings_watch', False),
     ('src_ignore_cidrs', ('127.0.0.1/32', )),
+    ('stats_batch_size', 256),
+    ('stats_engine', 'fifo'),
     ('sync_channel', 'nat-conntracker:sync'),
+    ('sync_encoding', 'json'),
     ('top_n', 10),
+    ('window', 60),
+    ('workers', 0),
 )
 
 
 def main(sysargs=sys.argv[:]):
+    if sysargs[1:2] == ['replay']:
+        return replay(sysargs[1:])
+
     parser = build_argument_parser(os.environ)
     args = parser.parse_args(sysargs[1:])
     _handle_misc_printing(args.print_service, args.print_wrapper)
@@ -86,10 +124,16 @@ def build_runner(**kwargs):
     if args.get('redis_url', ''):
         from .redis_syncer import RedisSyncer
         syncer = RedisSyncer(
-            logger, args['sync_channel'], conn_url=args['redis_url'])
+            logger,
+            args['sync_channel'],
+            conn_url=args['redis_url'],
+            encoding=args['sync_encoding'])
 
         from .redis_settings import RedisSettings
-        settings = RedisSettings(conn_url=args['redis_url'])
+        settings = RedisSettings(
+            conn_url=args['redis_url'],
+            watch=args['settings_watch'],
+            logger=logger)
 
         logger.info('using redis syncer and settings')
 
@@ -99,6 +143,260 @@ def build_runner(**kwargs):
                 conn_url=args['redis_url'],
                 redis_namespace=args['gesund_namespace'])
 
+    cluster = None
+    if args['cluster_role'] != 'none':
+        if args.get('redis_url', ''):
+            from .cluster import Cluster
+            cluster = Cluster(
+                logger,
+                conn_url=args['redis_url'],
+                role=args['cluster_role'],
+                interval=args['eval_interval'],
+                top_k=args['cluster_top_k'])
+            logger.info(f'using cluster role={args["cluster_role"]}')
+        else:
+            logger.warn('ignoring cluster role without redis url')
+
+    fanout = None
+    if args['fanout_threshold'] > 0:
+        from .fanout import FanoutDetector
+        fanout = FanoutDetector(
+            threshold=args['fanout_threshold'],
+            max_sources=args['fanout_max_sources'])
+        logger.info(f'using fanout detector {fanout!r}')
+
+    (src_ign, dst_ign) = build_ignores(args)
+
+    settings.ping()
+    syncer.ping()
+    healther.ping()
+
+    with settings.batch():
+        for net in src_ign:
+            logger.info(f'adding src ignore={net}')
+            settings.add_ignore_src(net)
+
+        for net in dst_ign:
+            logger.info(f'adding dst ignore={net}')
+            settings.add_ignore_dst(net)
+
+        if args['rules_file']:
+            from .rules import format_rule, load_rules
+            for rule in load_rules(args['rules_file']):
+                logger.info(f'adding rule {format_rule(rule)}')
+                settings.add_rule(rule)
+
+    parser_class = FlowParser
+    if args['parser'] == 'expat':
+        from .streaming_flow_parser import StreamingFlowParser
+        parser_class = StreamingFlowParser
+    elif args['parser'] == 'fast':
+        from .fast_flow_parser import FastFlowParser
+        parser_class = FastFlowParser
+
+    if args['netlink'] or args['netlink_replay']:
+        from .netlink_source import NetlinkEventSource
+        parser_class = functools.partial(
+            NetlinkEventSource,
+            rcvbuf=args['netlink_rcvbuf'],
+            replay=(args['netlink_replay'] or None))
+        logger.info('using netlink event source')
+    elif args['workers'] > 0 and _has_pipeline():
+        from .pipeline import ParallelPipeline
+        parser_class = functools.partial(
+            ParallelPipeline, workers=args['workers'])
+        logger.info(f'using parse pipeline workers={args["workers"]}')
+    else:
+        if args['workers'] > 0:
+            logger.warn('ignoring workers without shared memory support')
+        logger.info(f'using parser={args["parser"]}')
+
+    ingest_queue = None
+    # Workers and the netlink source read their input directly, so there is
+    # nothing for an ingest queue or load shedder to sit in front of.
+    owns_input = getattr(
+        getattr(parser_class, 'func', parser_class), 'owns_input', False)
+    if args['ingest_queue_size'] > 0 and owns_input:
+        logger.warn('ignoring ingest queue with workers or netlink reading '
+                    'the input directly')
+    elif args['ingest_queue_size'] > 0:
+        from .ingest_queue import IngestQueue
+        ingest_queue = IngestQueue(
+            logger,
+            max_records=args['ingest_queue_size'],
+            policy=args['ingest_policy'])
+        logger.info(f'using ingest queue {ingest_queue!r}')
+
+    shedder = None
+    if args['load_shed_max_rate'] > 1:
+        if ingest_queue is not None:
+            from .load_shedder import LoadShedder
+            shedder = LoadShedder(
+                logger, ingest_queue, max_rate=args['load_shed_max_rate'])
+            logger.info(f'using load shedder {shedder!r}')
+        else:
+            logger.warn('ignoring load shedding without an ingest queue')
+
+    stats = _build_stats(args, logger)
+    # Flows matching a rule are counted a second time with the same engine
+    # and size, so rules see the same scale as the global threshold.
+    rule_stats = _build_stats(args, logger)
+    checkpointer = None
+    if args['checkpoint_path']:
+        from .checkpoint import Checkpointer
+        checkpointer = Checkpointer(
+            args['checkpoint_path'],
+            logger,
+            interval=args['checkpoint_interval'],
+            max_age=args['checkpoint_max_age'])
+        logger.info(f'using checkpointer {checkpointer!r}')
+
+    resolver = HostnameResolver(
+        logger, pool_size=args['resolver_pool_size'], ttl=args['resolver_ttl'])
+    emitter = AlertEmitter(
+        logger, syncer, resolver, max_pending=args['alert_queue_size'])
+
+    exporters = []
+    if args['metrics_port'] > 0:
+        from .metrics import MetricsServer
+        server = MetricsServer(args['metrics_port']).start()
+        exporters.append(server)
+        logger.info(f'serving metrics port={server.port}')
+
+    if args['metrics_textfile']:
+        from .metrics import TextfileWriter
+        exporters.append(TextfileWriter(args['metrics_textfile']).start())
+        logger.info(f'writing metrics textfile={args["metrics_textfile"]}')
+
+    conntracker = Conntracker(
+        logger,
+        syncer,
+        settings,
+        healther,
+        stats,
+        parser_class=parser_class,
+        read_size=args['read_size'],
+        resolver=resolver,
+        cluster=cluster,
+        fanout=fanout,
+        ingest_queue=ingest_queue,
+        checkpointer=checkpointer,
+        shedder=shedder,
+        emitter=emitter,
+        exporters=exporters,
+        rule_stats=rule_stats)
+
+    if checkpointer is not None:
+        # Restored before the periodic writes start, so that they never
+        # replace the checkpoint with an empty one.
+        conntracker.restore()
+        checkpointer.start(stats, rule_stats=rule_stats)
+
+    if args['runtime'] == 'asyncio':
+        from .async_runner import AsyncRunner
+        return AsyncRunner(conntracker, syncer, logger, **dict(args))
+
+    return Runner(conntracker, syncer, logger, **dict(args))
+
+
+def replay(sysargs):
+    parser = build_replay_argument_parser(os.environ)
+    args = dict(ARG_DEFAULTS)
+    args.update(parser.parse_args(sysargs[1:]).__dict__)
+
+    logging.basicConfig(
+        level=(logging.DEBUG if args['debug'] else logging.WARN),
+        format='time=%(asctime)s level=%(levelname)s %(message)s',
+        datefmt='%Y-%m-%dT%H:%M:%S%z')
+    logger = logging.getLogger(__name__)
+
+    settings = MemSettings()
+    (src_ign, dst_ign) = build_ignores(args)
+    for net in src_ign:
+        settings.add_ignore_src(net)
+    for net in dst_ign:
+        settings.add_ignore_dst(net)
+
+    from .replay import Replay, open_capture
+    stats = _build_stats(args, logger)
+    conntracker = Conntracker(logger, NullSyncer(), settings, NullHealther(),
+                              stats)
+    replayer = Replay(
+        conntracker,
+        stats,
+        logger,
+        threshold=args['conn_threshold'],
+        top_n=args['top_n'],
+        interval=args['eval_interval'],
+        report_format=args['format'],
+        read_size=args['read_size'])
+    for path in args['captures']:
+        with open_capture(path) as capture:
+            replayer.replay(capture)
+    replayer.finish()
+    return 0
+
+
+def build_replay_argument_parser(env, defaults=None):
+    defaults = defaults if defaults is not None else dict(ARG_DEFAULTS)
+    parser = argparse.ArgumentParser(
+        prog='nat-conntracker replay',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description='replay recorded conntrack XML captures as fast as '
+        'possible, evaluating windows of event time')
+    parser.add_argument(
+        'captures',
+        nargs='+',
+        help='event XML captures, optionally .gz or .bz2 compressed, '
+        'or - for stdin')
+    parser.add_argument(
+        '-T',
+        '--conn-threshold',
+        type=int,
+        default=defaults['conn_threshold'],
+        help='connection count threshold per window')
+    parser.add_argument(
+        '-n',
+        '--top-n',
+        type=int,
+        default=defaults['top_n'],
+        help='top n counted connections reported per window')
+    parser.add_argument(
+        '-I',
+        '--eval-interval',
+        type=int,
+        default=defaults['eval_interval'],
+        help='seconds of event time in each evaluation window')
+    parser.add_argument(
+        '-S',
+        '--max-stats-size',
+        type=int,
+        default=defaults['max_stats_size'],
+        help='max number of src=>dst:dport counters to track')
+    parser.add_argument(
+        '-E',
+        '--stats-engine',
+        choices=('fifo', 'space-saving', 'count-min'),
+        default=defaults['stats_engine'],
+        help='counting engine used for src=>dst:dport counters')
+    parser.add_argument(
+        '-b',
+        '--read-size',
+        type=int,
+        default=defaults['read_size'],
+        help='bytes per capture read (0 to iterate lines)')
+    parser.add_argument(
+        '--format',
+        choices=('text', 'json'),
+        default='text',
+        help='report as text or as one JSON object per window')
+    parser.add_argument(
+        '-D', '--debug', action='store_true', help='enable debug logging')
+    _add_ignore_arguments(parser, env, defaults)
+    return parser
+
+
+def build_ignores(args):
     src_ign = None
     dst_ign = None
     if args['include_privnets']:
@@ -117,26 +415,42 @@ def build_runner(**kwargs):
             continue
         dst_ign = (dst_ign or ()) + (ip_network(dst_item), )
 
-    settings.ping()
-    syncer.ping()
-    healther.ping()
+    return (src_ign or (), dst_ign or ())
 
-    for net in src_ign:
-        logger.info(f'adding src ignore={net}')
-        settings.add_ignore_src(net)
 
-    for net in dst_ign:
-        logger.info(f'adding dst ignore={net}')
-        settings.add_ignore_dst(net)
+def _build_stats(args, logger):
+    logger.info(f'using stats engine={args["stats_engine"]}')
+    if args['stats_engine'] == 'space-saving':
+        from .space_saving_stats import SpaceSavingStats
+        return SpaceSavingStats(max_size=args['max_stats_size'])
+    if args['stats_engine'] == 'count-min':
+        from .count_min_stats import CountMinStats
+        return CountMinStats(
+            max_size=args['max_stats_size'],
+            epsilon=args['cms_epsilon'],
+            delta=args['cms_delta'])
 
-    conntracker = Conntracker(
-        logger,
-        syncer,
-        settings,
-        healther,
-        Stats(max_size=args['max_stats_size']))
+    if args['stats_engine'] == 'windowed':
+        from .windowed_stats import WindowedStats
+        return WindowedStats(
+            max_size=args['max_stats_size'],
+            window=args['window'],
+            bucket_width=args['bucket_width'])
+
+    if args['stats_engine'] == 'sharded':
+        from .sharded_stats import ShardedStats
+        return ShardedStats(
+            max_size=args['max_stats_size'],
+            top_size=_top_size(args),
+            batch_size=args['stats_batch_size'])
+
+    return Stats(max_size=args['max_stats_size'], top_size=_top_size(args))
 
-    return Runner(conntracker, syncer, logger, **dict(args))
+
+def _top_size(args):
+    # Enough candidates for sample() to read both the top_n and the cluster
+    # top_k without scanning the table.
+    return max(args.get('top_n', 0), args.get('cluster_top_k', 0), TOP_SIZE)
 
 
 def build_argument_parser(env, defaults=None):
@@ -149,7 +463,7 @@ def build_argument_parser(env, defaults=None):
     parser.add_argument(
         'events',
         nargs='?',
-        type=argparse.FileType('r'),
+        type=argparse.FileType('rb'),
         default=defaults['events'],
         help='input event XML stream or filename')
     parser.add_argument(
@@ -160,6 +474,12 @@ def build_argument_parser(env, defaults=None):
             env.get('NAT_CONNTRACKER_CONN_THRESHOLD',
                     env.get('CONN_THRESHOLD', defaults['conn_threshold']))),
         help='connection count threshold for message logging')
+    parser.add_argument(
+        '--rules-file',
+        default=env.get('NAT_CONNTRACKER_RULES_FILE',
+                        env.get('RULES_FILE', defaults['rules_file'])),
+        help='file of per dport, dst and src threshold rules, one per line '
+        'as in "threshold=20 dport=25 dst=0.0.0.0/0 src=10.0.0.0/8"')
     parser.add_argument(
         '-n',
         '--top-n',
@@ -176,6 +496,204 @@ def build_argument_parser(env, defaults=None):
             env.get('NAT_CONNTRACKER_MAX_STATS_SIZE',
                     env.get('MAX_STATS_SIZE', defaults['max_stats_size']))),
         help='max number of src=>dst:dport counters to track')
+    parser.add_argument(
+        '-E',
+        '--stats-engine',
+        choices=('fifo', 'space-saving', 'count-min', 'windowed', 'sharded'),
+        default=env.get('NAT_CONNTRACKER_STATS_ENGINE',
+                        env.get('STATS_ENGINE', defaults['stats_engine'])),
+        help='counting engine used for src=>dst:dport counters')
+    parser.add_argument(
+        '--stats-batch-size',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_STATS_BATCH_SIZE',
+                    env.get('STATS_BATCH_SIZE',
+                            defaults['stats_batch_size']))),
+        help='flows counted per thread before merging into sharded stats')
+    parser.add_argument(
+        '--cms-epsilon',
+        type=float,
+        default=float(
+            env.get('NAT_CONNTRACKER_CMS_EPSILON',
+                    env.get('CMS_EPSILON', defaults['cms_epsilon']))),
+        help='count-min error as a fraction of total flows per interval')
+    parser.add_argument(
+        '--cms-delta',
+        type=float,
+        default=float(
+            env.get('NAT_CONNTRACKER_CMS_DELTA',
+                    env.get('CMS_DELTA', defaults['cms_delta']))),
+        help='count-min probability of exceeding the error bound')
+    parser.add_argument(
+        '--window',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_WINDOW',
+                    env.get('WINDOW', defaults['window']))),
+        help='trailing window in seconds evaluated by the windowed engine')
+    parser.add_argument(
+        '--bucket-width',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_BUCKET_WIDTH',
+                    env.get('BUCKET_WIDTH', defaults['bucket_width']))),
+        help='width in seconds of each windowed engine bucket')
+    parser.add_argument(
+        '--fanout-threshold',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_FANOUT_THRESHOLD',
+                    env.get('FANOUT_THRESHOLD',
+                            defaults['fanout_threshold']))),
+        help='distinct destinations or dports per source per eval interval '
+        'to alert on (0 to disable)')
+    parser.add_argument(
+        '--fanout-max-sources',
+        type=int,
+        default=int(
+            env.get(
+                'NAT_CONNTRACKER_FANOUT_MAX_SOURCES',
+                env.get('FANOUT_MAX_SOURCES',
+                        defaults['fanout_max_sources']))),
+        help='sources tracked by the fanout detector before evicting the '
+        'least recently seen')
+    parser.add_argument(
+        '--checkpoint-path',
+        default=env.get(
+            'NAT_CONNTRACKER_CHECKPOINT_PATH',
+            env.get('CHECKPOINT_PATH', defaults['checkpoint_path'])),
+        help='file to write stats to on shutdown and restore them from '
+        'on start')
+    parser.add_argument(
+        '--checkpoint-interval',
+        type=int,
+        default=int(
+            env.get(
+                'NAT_CONNTRACKER_CHECKPOINT_INTERVAL',
+                env.get('CHECKPOINT_INTERVAL',
+                        defaults['checkpoint_interval']))),
+        help='seconds between periodic checkpoints (0 for shutdown only)')
+    parser.add_argument(
+        '--checkpoint-max-age',
+        type=int,
+        default=int(
+            env.get(
+                'NAT_CONNTRACKER_CHECKPOINT_MAX_AGE',
+                env.get('CHECKPOINT_MAX_AGE',
+                        defaults['checkpoint_max_age']))),
+        help='seconds after which a checkpoint is too old to restore')
+    parser.add_argument(
+        '--cluster-role',
+        choices=('none', 'node', 'aggregator'),
+        default=env.get('NAT_CONNTRACKER_CLUSTER_ROLE',
+                        env.get('CLUSTER_ROLE', defaults['cluster_role'])),
+        help='push per-interval top counts to redis as a node, or also '
+        'alert on the fleet-wide merge as the aggregator')
+    parser.add_argument(
+        '--cluster-top-k',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_CLUSTER_TOP_K',
+                    env.get('CLUSTER_TOP_K', defaults['cluster_top_k']))),
+        help='top counts pushed per node per eval interval')
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_METRICS_PORT',
+                    env.get('METRICS_PORT', defaults['metrics_port']))),
+        help='serve prometheus metrics on this localhost port (0 to disable)')
+    parser.add_argument(
+        '--metrics-textfile',
+        default=env.get(
+            'NAT_CONNTRACKER_METRICS_TEXTFILE',
+            env.get('METRICS_TEXTFILE', defaults['metrics_textfile'])),
+        help='periodically write prometheus metrics to this file for the '
+        'node exporter textfile collector')
+    parser.add_argument(
+        '--settings-watch',
+        action='store_true',
+        default=_asbool(
+            env.get('NAT_CONNTRACKER_SETTINGS_WATCH',
+                    env.get('SETTINGS_WATCH', defaults['settings_watch']))),
+        help='reload redis settings on change notifications instead of '
+        'polling every 30 seconds')
+    parser.add_argument(
+        '-p',
+        '--parser',
+        choices=('minidom', 'expat', 'fast'),
+        default=env.get('NAT_CONNTRACKER_PARSER',
+                        env.get('PARSER', defaults['parser'])),
+        help='event XML parser engine')
+    parser.add_argument(
+        '--ingest-queue-size',
+        type=int,
+        default=int(
+            env.get(
+                'NAT_CONNTRACKER_INGEST_QUEUE_SIZE',
+                env.get('INGEST_QUEUE_SIZE', defaults['ingest_queue_size']))),
+        help='raw records buffered between a dedicated reader thread and '
+        'the parser (0 to read and parse on one thread)')
+    parser.add_argument(
+        '--ingest-policy',
+        choices=('block', 'drop-oldest', 'drop-non-new'),
+        default=env.get('NAT_CONNTRACKER_INGEST_POLICY',
+                        env.get('INGEST_POLICY', defaults['ingest_policy'])),
+        help='what to do with new records when the ingest queue is full')
+    parser.add_argument(
+        '--load-shed-max-rate',
+        type=int,
+        default=int(
+            env.get(
+                'NAT_CONNTRACKER_LOAD_SHED_MAX_RATE',
+                env.get('LOAD_SHED_MAX_RATE',
+                        defaults['load_shed_max_rate']))),
+        help='sample new flows down to 1-in-N, at most this N, while the '
+        'ingest queue backs up (0 to disable)')
+    parser.add_argument(
+        '--runtime',
+        choices=('threads', 'asyncio'),
+        default=env.get('NAT_CONNTRACKER_RUNTIME',
+                        env.get('RUNTIME', defaults['runtime'])),
+        help='run input, sampling and sync on threads or an asyncio loop')
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_WORKERS',
+                    env.get('WORKERS', defaults['workers']))),
+        help='parse events in this many worker processes (0 to disable)')
+    parser.add_argument(
+        '-b',
+        '--read-size',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_READ_SIZE',
+                    env.get('READ_SIZE', defaults['read_size']))),
+        help='bytes per read from the event stream (0 for line iteration)')
+    parser.add_argument(
+        '--netlink',
+        action='store_true',
+        default=_asbool(
+            env.get('NAT_CONNTRACKER_NETLINK',
+                    env.get('NETLINK', defaults['netlink']))),
+        help='read conntrack events from netlink instead of events XML')
+    parser.add_argument(
+        '--netlink-rcvbuf',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_NETLINK_RCVBUF',
+                    env.get('NETLINK_RCVBUF', defaults['netlink_rcvbuf']))),
+        help='netlink socket receive buffer size in bytes')
+    parser.add_argument(
+        '--netlink-replay',
+        type=unquote_plus,
+        default=unquote_plus(
+            env.get('NAT_CONNTRACKER_NETLINK_REPLAY',
+                    env.get('NETLINK_REPLAY', defaults['netlink_replay']))),
+        help='replay recorded raw netlink messages from this file')
     parser.add_argument(
         '-l',
         '--log-file',
@@ -200,6 +718,12 @@ def build_argument_parser(env, defaults=None):
             env.get('NAT_CONNTRACKER_SYNC_CHANNEL',
                     env.get('SYNC_CHANNEL', defaults['sync_channel']))),
         help='redis channel name to use for syncing')
+    parser.add_argument(
+        '--sync-encoding',
+        choices=('json', 'binary'),
+        default=env.get('NAT_CONNTRACKER_SYNC_ENCODING',
+                        env.get('SYNC_ENCODING', defaults['sync_encoding'])),
+        help='encoding of batched over-threshold sync messages')
     parser.add_argument(
         '-G',
         '--gesund-checks-enabled',
@@ -217,6 +741,31 @@ def build_argument_parser(env, defaults=None):
             'NAT_CONNTRACKER_GESUND_NAMESPACE',
             env.get('GESUND_NAMESPACE', defaults['gesund_namespace'])),
         help='redis namespace to use when communicating with gesund')
+    parser.add_argument(
+        '--alert-queue-size',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_ALERT_QUEUE_SIZE',
+                    env.get('ALERT_QUEUE_SIZE',
+                            defaults['alert_queue_size']))),
+        help='samples of alerts waiting to be logged and published by a '
+        'separate thread (0 to alert inline)')
+    parser.add_argument(
+        '--resolver-pool-size',
+        type=int,
+        default=int(
+            env.get(
+                'NAT_CONNTRACKER_RESOLVER_POOL_SIZE',
+                env.get('RESOLVER_POOL_SIZE',
+                        defaults['resolver_pool_size']))),
+        help='number of threads resolving hostnames of alerted sources')
+    parser.add_argument(
+        '--resolver-ttl',
+        type=int,
+        default=int(
+            env.get('NAT_CONNTRACKER_RESOLVER_TTL',
+                    env.get('RESOLVER_TTL', defaults['resolver_ttl']))),
+        help='seconds to cache resolved hostnames')
     parser.add_argument(
         '-I',
         '--eval-interval',
@@ -225,6 +774,30 @@ def build_argument_parser(env, defaults=None):
             env.get('NAT_CONNTRACKER_EVAL_INTERVAL',
                     env.get('EVAL_INTERVAL', defaults['eval_interval']))),
         help='interval at which stats will be evaluated')
+    _add_ignore_arguments(parser, env, defaults)
+    parser.add_argument(
+        '-D',
+        '--debug',
+        action='store_true',
+        default=_asbool(
+            env.get('NAT_CONNTRACKER_DEBUG', env.get('DEBUG',
+                                                     defaults['debug']))),
+        help='enable debug logging')
+    parser.add_argument(
+        '--print-service',
+        action='store_true',
+        default=False,
+        help='print systemd service definition and exit')
+    parser.add_argument(
+        '--print-wrapper',
+        action='store_true',
+        default=False,
+        help='print wrapper script and exit')
+
+    return parser
+
+
+def _add_ignore_arguments(parser, env, defaults):
     parser.add_argument(
         '-s',
         '--src-ignore-cidrs',
@@ -260,26 +833,11 @@ def build_argument_parser(env, defaults=None):
                     env.get('INCLUDE_PRIVNETS',
                             defaults['include_privnets']))),
         help='include private networks when handling flows')
-    parser.add_argument(
-        '-D',
-        '--debug',
-        action='store_true',
-        default=_asbool(
-            env.get('NAT_CONNTRACKER_DEBUG', env.get('DEBUG',
-                                                     defaults['debug']))),
-        help='enable debug logging')
-    parser.add_argument(
-        '--print-service',
-        action='store_true',
-        default=False,
-        help='print systemd service definition and exit')
-    parser.add_argument(
-        '--print-wrapper',
-        action='store_true',
-        default=False,
-        help='print wrapper script and exit')
 
-    return parser
+
+def _has_pipeline():
+    from .pipeline import HAS_SHARED_MEMORY
+    return HAS_SHARED_MEMORY
 
 
 def _asbool(value):
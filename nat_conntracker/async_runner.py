@@ -0,0 +1,164 @@
+import asyncio
+import signal
+
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ['AsyncRunner']
+
+
+class AsyncRunner(object):
+    def __init__(self, conntracker, syncer, logger, **args):
+        self._conntracker = conntracker
+        self._syncer = syncer
+        self._logger = logger
+        self._args = args
+        self._done = None
+        self._read_executor = ThreadPoolExecutor(max_workers=1)
+        self._parse_executor = ThreadPoolExecutor(max_workers=1)
+
+    def run(self):
+        # asyncio.run() is only available from Python 3.7.
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+            self._read_executor.shutdown(wait=False)
+            self._parse_executor.shutdown(wait=False)
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        self._done = asyncio.Event()
+        self._add_signal_handlers(loop)
+
+        tasks = [
+            asyncio.ensure_future(self._handle()),
+            asyncio.ensure_future(self._sub()),
+        ]
+        try:
+            self._logger.info('entering async sample loop '
+                              'threshold={} top_n={} eval_interval={}'.format(
+                                  self._args['conn_threshold'],
+                                  self._args['top_n'],
+                                  self._args['eval_interval']))
+            await self._run_sample_loop(loop)
+        finally:
+            self._remove_signal_handlers(loop)
+            self._logger.info('cleaning up')
+            self._done.set()
+            # Anything still blocked in a read is abandoned rather than
+            # awaited, since the input may never reach EOF.
+            (_, pending) = await asyncio.wait(tasks, timeout=1.0)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            # A checkpointed partial interval is sampled after the next
+            # start instead, so that its crossings are not alerted twice.
+            if not await loop.run_in_executor(None,
+                                              self._conntracker.checkpoint):
+                await loop.run_in_executor(None, self._conntracker.sample,
+                                           self._args['conn_threshold'],
+                                           self._args['top_n'])
+            self._conntracker.cleanup()
+
+    async def _run_sample_loop(self, loop):
+        # Restored counts are completed by a full interval of new ones
+        # before the first sample checks and resets them.
+        restored = self._conntracker.restored > 0
+        while True:
+            if not restored:
+                await loop.run_in_executor(None, self._conntracker.sample,
+                                           self._args['conn_threshold'],
+                                           self._args['top_n'])
+            restored = False
+            try:
+                await asyncio.wait_for(self._done.wait(),
+                                       self._args['eval_interval'])
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    async def _handle(self):
+        loop = asyncio.get_event_loop()
+        try:
+            parser = self._conntracker.build_parser()
+            # An ingest queue reads the input on its own thread and feeds
+            # the load shedder and parser from it, so Conntracker.handle
+            # is used as on the threads runtime.
+            if getattr(parser, 'owns_input', False) or \
+                    self._args.get('ingest_queue_size', 0) > 0:
+                await loop.run_in_executor(
+                    self._parse_executor, self._conntracker.handle,
+                    self._args['events'], self._done.is_set)
+                return
+
+            await self._read_events(loop, parser)
+        except Exception:
+            self._logger.exception('breaking out of handle wrap')
+        finally:
+            self._done.set()
+
+    async def _read_events(self, loop, parser):
+        events = self._args['events']
+        raw = getattr(events, 'buffer', events)
+        read = getattr(raw, 'read1', None) or raw.read
+        read_size = self._args.get('read_size') or 65536
+
+        pending = b''
+        parsing = None
+        try:
+            while not self._done.is_set():
+                chunk = await loop.run_in_executor(self._read_executor, read,
+                                                   read_size)
+                if not chunk:
+                    break
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+
+                records = (pending + chunk).split(b'\n')
+                pending = records.pop()
+
+                # Reading the next chunk overlaps with parsing this one.
+                if parsing is not None:
+                    await parsing
+                parsing = loop.run_in_executor(self._parse_executor,
+                                               parser.handle_events, records)
+
+            if pending:
+                if parsing is not None:
+                    await parsing
+                parsing = loop.run_in_executor(self._parse_executor,
+                                               parser.handle_events, [pending])
+        finally:
+            if parsing is not None:
+                await parsing
+            await loop.run_in_executor(self._parse_executor,
+                                       self._conntracker.flush)
+
+    async def _sub(self):
+        try:
+            await self._syncer.asub(self._done)
+        except Exception:
+            self._logger.exception('breaking out of sub wrap')
+            self._done.set()
+
+    def _add_signal_handlers(self, loop):
+        try:
+            loop.add_signal_handler(signal.SIGUSR1,
+                                    self._conntracker.dump_state)
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, self._interrupt)
+        except (NotImplementedError, RuntimeError):
+            self._logger.debug('signal handlers unavailable')
+
+    def _remove_signal_handlers(self, loop):
+        for signum in (signal.SIGUSR1, signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(signum)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    def _interrupt(self):
+        self._logger.warn('interrupt')
+        self._done.set()
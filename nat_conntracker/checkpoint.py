@@ -0,0 +1,156 @@
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .flow_key import FlowKey
+
+__all__ = [
+    'CHECKPOINT_MAGIC', 'CHECKPOINT_VERSION', 'Checkpointer',
+    'read_checkpoint', 'write_checkpoint'
+]
+
+CHECKPOINT_MAGIC = b'NCTCKPT\x00'
+CHECKPOINT_VERSION = 1
+
+# magic, version, entry size, unix timestamp, entry count
+_HEADER = struct.Struct('!8sHHdI')
+# src and dst as 16-byte packed addresses, dport (-1 for none), count
+_ENTRY = struct.Struct('!16s16siQ')
+
+
+def write_checkpoint(path, items, timestamp=None):
+    timestamp = timestamp if timestamp is not None else time.time()
+    items = list(items)
+    buf = bytearray(_HEADER.size + _ENTRY.size * len(items))
+    _HEADER.pack_into(buf, 0, CHECKPOINT_MAGIC, CHECKPOINT_VERSION,
+                      _ENTRY.size, timestamp, len(items))
+    offset = _HEADER.size
+    for (key, count) in items:
+        _ENTRY.pack_into(buf, offset, key.src.to_bytes(16, 'big'),
+                         key.dst.to_bytes(16, 'big'), key.dport, count)
+        offset += _ENTRY.size
+
+    # Written aside and renamed so a crash mid-write never leaves a
+    # truncated checkpoint in place of the previous one.
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as out:
+        out.write(buf)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+    return len(items)
+
+
+def read_checkpoint(path):
+    # Returns (timestamp, [(FlowKey, count), ...]) or raises ValueError for
+    # anything that is not a complete checkpoint of a known version.
+    with open(path, 'rb') as inp:
+        size = os.fstat(inp.fileno()).st_size
+        if size < _HEADER.size:
+            raise ValueError('truncated checkpoint header')
+        with mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            (magic, version, entry_size, timestamp,
+             count) = _HEADER.unpack_from(mapped, 0)
+            if magic != CHECKPOINT_MAGIC:
+                raise ValueError('not a checkpoint')
+            if version != CHECKPOINT_VERSION or entry_size != _ENTRY.size:
+                raise ValueError(f'unsupported checkpoint version={version}')
+            end = _HEADER.size + entry_size * count
+            if size < end:
+                raise ValueError('truncated checkpoint entries')
+
+            from_bytes = int.from_bytes
+            with memoryview(mapped) as view:
+                items = [
+                    (FlowKey(
+                        from_bytes(src, 'big'), from_bytes(dst, 'big'), dport),
+                     count)
+                    for (src, dst, dport,
+                         count) in _ENTRY.iter_unpack(view[_HEADER.size:end])
+                ]
+    return (timestamp, items)
+
+
+class Checkpointer(object):
+    # Rule stats, when given, are kept in a second file next to the main
+    # one, written and restored alongside it.
+    def __init__(self, path, logger, interval=0, max_age=300, clock=time.time):
+        self.path = path
+        self.rules_path = f'{path}.rules'
+        self._logger = logger
+        self._interval = interval
+        self._max_age = max_age
+        self._clock = clock
+        self._done = threading.Event()
+        self._thread = None
+        self.writes = 0
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} path={self.path!r} ' \
+                f'interval={self._interval!r} max_age={self._max_age!r}>'
+
+    def restore(self, stats, rule_stats=None):
+        restored = self._restore(self.path, stats)
+        if rule_stats is not None:
+            self._restore(self.rules_path, rule_stats)
+        return restored
+
+    def write(self, stats, rule_stats=None):
+        try:
+            timestamp = self._clock()
+            if rule_stats is not None:
+                write_checkpoint(
+                    self.rules_path, rule_stats.items(), timestamp=timestamp)
+            written = write_checkpoint(
+                self.path, stats.items(), timestamp=timestamp)
+            self.writes += 1
+            self._logger.debug(f'wrote checkpoint path={self.path} '
+                               f'entries={written}')
+            return written
+        except OSError:
+            self._logger.exception('failed to write checkpoint')
+            return 0
+
+    def start(self, stats, rule_stats=None):
+        if self._interval <= 0:
+            return self
+        self._thread = threading.Thread(
+            target=self._run, args=(stats, rule_stats), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    def _run(self, stats, rule_stats):
+        while not self._done.wait(self._interval):
+            self.write(stats, rule_stats=rule_stats)
+
+    def _restore(self, path, stats):
+        if not os.path.exists(path):
+            return 0
+
+        started = time.perf_counter()
+        try:
+            (timestamp, items) = read_checkpoint(path)
+        except (OSError, ValueError) as exc:
+            self._logger.warn(f'discarding checkpoint path={path} '
+                              f'error={exc}')
+            return 0
+
+        age = self._clock() - timestamp
+        if age < 0 or age > self._max_age:
+            self._logger.warn(f'discarding stale checkpoint path={path} '
+                              f'age={age:.0f}s max_age={self._max_age}s')
+            return 0
+
+        for (key, count) in items:
+            stats.add(key, count)
+        self._logger.info(f'restored checkpoint path={path} '
+                          f'entries={len(items)} age={age:.0f}s '
+                          f'elapsed={time.perf_counter() - started:.4f}s')
+        return len(items)
@@ -0,0 +1,52 @@
+from ipaddress import ip_network
+
+__all__ = ['CIDRMatcher', 'pack_address', 'pack_network']
+
+# IPv4 addresses are packed into the IPv4-mapped IPv6 range (::ffff:0:0/96) so
+# that both address families share a single 128-bit integer space.
+IPV4_MAPPED = 0xffff << 32
+
+
+def pack_address(addr):
+    if addr.version == 4:
+        return IPV4_MAPPED | int(addr)
+    return int(addr)
+
+
+def pack_network(net):
+    if net.version == 4:
+        return (IPV4_MAPPED | int(net.network_address), net.prefixlen + 96)
+    return (int(net.network_address), net.prefixlen)
+
+
+class CIDRMatcher(object):
+    def __init__(self, networks=()):
+        by_prefixlen = {}
+        count = 0
+        for net in networks:
+            (prefix, prefixlen) = pack_network(ip_network(str(net)))
+            by_prefixlen.setdefault(prefixlen,
+                                    set()).add(prefix >> (128 - prefixlen))
+            count += 1
+
+        # One hash set of masked prefixes per distinct prefix length, so a
+        # lookup is at most one shift and set probe per prefix length.
+        self._tables = tuple((128 - prefixlen, frozenset(prefixes))
+                             for (prefixlen,
+                                  prefixes) in sorted(by_prefixlen.items()))
+        self._count = count
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} networks={self._count!r} ' \
+                f'prefixlens={len(self._tables)!r}>'
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, addr):
+        if not isinstance(addr, int):
+            addr = pack_address(addr)
+        for (shift, prefixes) in self._tables:
+            if (addr >> shift) in prefixes:
+                return True
+        return False
@@ -0,0 +1,113 @@
+import time
+
+import redis
+
+from . import metrics
+from .flow_key import FlowKey
+from .stats import TOP_SIZE
+
+__all__ = ['Cluster', 'decode_member', 'encode_member']
+
+_PUSH_SECONDS = metrics.REDIS_SECONDS.labels('cluster_push')
+_AGGREGATE_SECONDS = metrics.REDIS_SECONDS.labels('cluster_aggregate')
+
+
+def encode_member(key):
+    return f'{key.src:x},{key.dst:x},{key.dport}'
+
+
+def decode_member(member):
+    if isinstance(member, bytes):
+        member = member.decode('ascii')
+    (src, dst, dport) = member.split(',')
+    return FlowKey(int(src, 16), int(dst, 16), int(dport))
+
+
+class Cluster(object):
+    def __init__(self,
+                 logger,
+                 namespace='nat-conntracker',
+                 conn_url='redis://localhost:6379/0',
+                 role='node',
+                 interval=60,
+                 top_k=TOP_SIZE,
+                 clock=time.time):
+        self._logger = logger
+        self._namespace = namespace
+        self._conn = redis.from_url(conn_url)
+        self._interval = max(int(interval), 1)
+        self._clock = clock
+        self._last_aggregated = None
+        self._last_pushed = None
+        self.role = role
+        self.top_k = top_k
+        self.pushed = 0
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} role={self.role!r} ' \
+                f'interval={self._interval!r} top_k={self.top_k!r}>'
+
+    def interval_id(self, now=None):
+        now = now if now is not None else self._clock()
+        return int(now // self._interval)
+
+    def push(self, top_keys):
+        # Each node contributes at most top_k members per interval, so the
+        # Redis traffic is bounded by the fleet size and top_k rather than
+        # by flow volume. ZINCRBY does the cross-node merge server side.
+        top_keys = top_keys[:self.top_k]
+        if not top_keys:
+            return 0
+
+        # A node pushes once per interval. Another sample within the same
+        # interval, such as the final one on shutdown, would otherwise add a
+        # second partial count on top of the first.
+        interval_id = self.interval_id()
+        if interval_id == self._last_pushed:
+            self._logger.debug(
+                f'skipping cluster push interval_id={interval_id}')
+            return 0
+        self._last_pushed = interval_id
+
+        key = self._key(interval_id)
+        pipe = self._conn.pipeline(transaction=False)
+        for (flow_key, count) in top_keys:
+            pipe.zincrby(key, value=encode_member(flow_key), amount=count)
+        # Keep the set around long enough for the aggregator to read it
+        # after the interval closes.
+        pipe.expire(key, self._interval * 3)
+        with _PUSH_SECONDS.time():
+            pipe.execute()
+        self.pushed += len(top_keys)
+        return len(top_keys)
+
+    def aggregate(self, top_n=10):
+        # Only intervals that have closed are aggregated, and each only
+        # once, since nodes may still be pushing into the current one. The
+        # sample period drifts against the interval, so more than one may
+        # have closed since the last call; those still within the expiry of
+        # their pushes are all read, and a key takes its largest count.
+        if self.role != 'aggregator':
+            return []
+
+        last_closed = self.interval_id() - 1
+        first = last_closed
+        if self._last_aggregated is not None:
+            first = max(self._last_aggregated + 1, last_closed - 1)
+        if first > last_closed:
+            return []
+        self._last_aggregated = last_closed
+
+        counts = {}
+        with _AGGREGATE_SECONDS.time():
+            for interval_id in range(first, last_closed + 1):
+                top = self._conn.zrevrange(
+                    self._key(interval_id), 0, top_n - 1, withscores=True)
+                for (member, score) in top:
+                    key = decode_member(member)
+                    counts[key] = max(int(score), counts.get(key, 0))
+        return sorted(
+            counts.items(), key=lambda item: item[1], reverse=True)[:top_n]
+
+    def _key(self, interval_id):
+        return f'{self._namespace}:cluster:{interval_id}'
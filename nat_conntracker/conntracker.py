@@ -1,84 +1,306 @@
-import socket
-
-from ipaddress import ip_address
-from threading import Thread
+import time
 
+from . import metrics
+from .emitter import AlertEmitter
+from .flow_key import flow_key, format_daddr, format_host, format_top
 from .flow_parser import FlowParser
+from .hostname_resolver import HostnameResolver
+from .record_reader import RecordReader
+from .rules import format_rule
+from .stats import Stats
 
 __all__ = ['Conntracker']
 
+_NEW_FLOWS = metrics.FLOWS.labels('new')
+_UPDATE_FLOWS = metrics.FLOWS.labels('update')
+_DESTROY_FLOWS = metrics.FLOWS.labels('destroy')
+# Most of the events stream is updates and destroys, so their counters are
+# looked up here rather than by label for every flow.
+_SKIPPED_FLOWS = {'update': _UPDATE_FLOWS, 'destroy': _DESTROY_FLOWS}
+_SRC_IGNORED = metrics.IGNORED.labels('src')
+_DST_IGNORED = metrics.IGNORED.labels('dst')
+
 
 class Conntracker(object):
-    def __init__(self, logger, syncer, settings, healther, stats):
+    def __init__(self,
+                 logger,
+                 syncer,
+                 settings,
+                 healther,
+                 stats,
+                 parser_class=FlowParser,
+                 read_size=0,
+                 resolver=None,
+                 cluster=None,
+                 fanout=None,
+                 ingest_queue=None,
+                 checkpointer=None,
+                 shedder=None,
+                 emitter=None,
+                 exporters=(),
+                 rule_stats=None):
         self._logger = logger
         self._syncer = syncer
         self._settings = settings
         self._healther = healther
         self._stats = stats
+        # Flows that match a rule are also counted here, so that every pair
+        # a rule applies to is checked against its threshold and not only
+        # those that make the global top. build_runner passes a table of
+        # the same engine and size as stats.
+        self._rule_stats = rule_stats if rule_stats is not None else \
+            Stats()
+        # The flow path reuses the rules read by the last sample rather
+        # than asking settings for every flow.
+        self._rules = None
+        self.restored = 0
+        self._parser_class = parser_class
+        self._read_size = read_size
+        self._reader = None
+        self._resolver = resolver if resolver is not None else \
+            HostnameResolver(logger)
+        self._cluster = cluster
+        self._fanout = fanout
+        self._ingest_queue = ingest_queue
+        self._checkpointer = checkpointer
+        self._shedder = shedder
+        self._exporters = tuple(exporters)
+        self._emitter = emitter if emitter is not None else \
+            AlertEmitter(logger, syncer, self._resolver)
+        metrics.STATS_EVICTIONS.set_function(
+            lambda: getattr(self._stats, 'evictions', 0))
 
     def handle(self, stream, is_done=None):
-        FlowParser(self, self._logger).handle_events(stream, is_done=is_done)
+        if self._read_size > 0 and hasattr(
+                getattr(stream, 'buffer', stream), 'readinto'):
+            self._reader = RecordReader(stream, read_size=self._read_size)
+            stream = self._reader
+        try:
+            parser = self.build_parser()
+            if self._ingest_queue is not None and not getattr(
+                    parser, 'owns_input', False):
+                stream = self._ingest_queue.start(stream, is_done=is_done)
+                if self._shedder is not None:
+                    stream = self._shedder.filter(stream)
+            parser.handle_events(stream, is_done=is_done)
+        finally:
+            self.flush()
+
+    def build_parser(self):
+        return self._parser_class(self, self._logger)
+
+    def flush(self):
+        # Engines that batch per thread are flushed from the thread that
+        # did the counting.
+        for stats in (self._stats, self._rule_stats):
+            flush = getattr(stats, 'flush', None)
+            if flush is not None:
+                flush()
+
+    def restore(self):
+        # Runners wait a full interval before sampling restored counts,
+        # since sample() resets them.
+        if self._checkpointer is not None:
+            self.restored = self._checkpointer.restore(
+                self._stats, rule_stats=self._rule_stats)
+        return self.restored
+
+    def checkpoint(self):
+        if self._checkpointer is None:
+            return 0
+        return self._checkpointer.write(
+            self._stats, rule_stats=self._rule_stats)
 
     def cleanup(self):
+        self._emitter.close()
         self._healther.cleanup()
+        self._resolver.shutdown()
+        self._settings.close()
+        if self._checkpointer is not None:
+            self._checkpointer.stop()
+        for exporter in self._exporters:
+            exporter.stop()
 
     def sample(self, threshold, top_n):
+        started = time.perf_counter()
         self._logger.info(f'begin sample threshold={threshold} top_n={top_n}')
 
-        flow_count = 0
-        for ((src, dst), count) in self._stats.top(n=top_n):
-            flow_count += count
-            if count >= threshold:
-                self._logger.warn(f'over threshold={threshold} src={src} '
-                                  f'dst={dst} count={count} '
-                                  f'hostname={self._lookup_hostname(src)}')
-                self._syncer.pub(threshold, src, dst, count)
+        if self._reader is not None:
+            (bytes_rate, records_rate) = self._reader.rates()
+            self._logger.info(f'ingest bytes_per_sec={bytes_rate:.0f} '
+                              f'records_per_sec={records_rate:.0f}')
+
+        if self._ingest_queue is not None:
+            dropped = self._ingest_queue.drops_since_last()
+            if dropped:
+                self._logger.warn(
+                    'ingest overload '
+                    f'policy={self._ingest_queue.policy} ' + ' '.join(
+                        f'dropped_{reason}={count}'
+                        for (reason, count) in sorted(dropped.items())))
+
+        sample_rate = 1
+        if self._shedder is not None:
+            (sample_rate, kept, shed) = self._shedder.interval()
+            if sample_rate > 1:
+                self._logger.warn(f'load shedding sample_rate=1/{sample_rate} '
+                                  f'kept={kept} shed={shed}')
+
+        # The top is read once, since reading it from ShardedStats moves
+        # counts into a snapshot that the reset below discards.
+        top_keys = self._stats.top_keys(
+            n=max(top_n, self._cluster.top_k)
+            if self._cluster is not None else top_n)
+
+        candidates = dict(top_keys[:top_n])
+        flow_count = sum(candidates.values())
+        for (key, count) in self._rule_stats.items():
+            candidates[key] = max(count, candidates.get(key, 0))
+
+        rules = self._rules = self._settings.rules_matcher()
+        rate = getattr(self._stats, 'rate', None)
+        # Alerts are published in one batch per threshold.
+        crossings = {}
+        for (key, count) in candidates.items():
+            key_threshold = rules.threshold(key, threshold)
+            if count < key_threshold:
+                continue
+            (src, dst) = (format_host(key.src), format_daddr(key))
+            rate_field = ''
+            if rate is not None:
+                rate_field = f' rate={rate(count):.2f}'
+            if sample_rate > 1:
+                rate_field += f' sample_rate=1/{sample_rate}'
+            (alerts, offenders) = crossings.setdefault(key_threshold, ([], []))
+            alerts.append((f'over threshold={key_threshold} src={src} '
+                           f'dst={dst} count={count}{rate_field}', src))
+            offenders.append((src, dst, count))
+
+        for (key_threshold, (alerts, offenders)) in crossings.items():
+            self._emitter.emit(
+                key_threshold, alerts, offenders, sample_rate=sample_rate)
+
+        if self._cluster is not None:
+            self._sample_cluster(threshold, top_n, top_keys)
+
+        if self._fanout is not None:
+            self._sample_fanout(top_n)
 
         if flow_count >= self._settings.min_flow():
             self._healther.healthy('flow-count', ttl=300)
         else:
             self._healther.unhealthy('flow-count')
 
+        metrics.STATS_SIZE.set(len(self._stats))
         self._stats.reset()
+        self._rule_stats.reset()
+        metrics.SAMPLE_SECONDS.observe(time.perf_counter() - started)
         self._logger.info(f'end sample threshold={threshold} top_n={top_n}')
 
+    def _sample_cluster(self, threshold, top_n, top_keys):
+        self._cluster.push(top_keys[:self._cluster.top_k])
+
+        alerts = []
+        offenders = []
+        for ((src, dst), count) in format_top(self._cluster.aggregate(top_n)):
+            if count >= threshold:
+                alerts.append((f'over threshold={threshold} src={src} '
+                               f'dst={dst} count={count} source=cluster', src))
+                offenders.append((src, dst, count))
+
+        if offenders:
+            self._emitter.emit(threshold, alerts, offenders)
+
+    def _sample_fanout(self, top_n):
+        threshold = self._fanout.threshold
+        alerts = []
+        offenders = []
+        for (src, dsts, dports) in self._fanout.top(n=top_n):
+            if max(dsts, dports) >= threshold:
+                alerts.append((f'over fanout_threshold={threshold} '
+                               f'src={src} dsts={dsts} dports={dports}', src))
+                offenders.append((src, '*', max(dsts, dports)))
+
+        if offenders:
+            self._emitter.emit(threshold, alerts, offenders)
+        self._fanout.reset()
+
     def handle_flow(self, flow):
         if flow is None:
             return
 
         if flow.flowtype != 'new':
+            counter = _SKIPPED_FLOWS.get(flow.flowtype)
+            if counter is None:
+                counter = metrics.FLOWS.labels(flow.flowtype)
+            counter.inc()
             self._logger.debug(f'skipping flowtype={flow.flowtype}')
             # Only "new" flows are currently handled, meaning that any flows
             # of type "update" or "destroy" are ignored along with any of the
             # state changes they may describe.
             return
 
+        _NEW_FLOWS.inc()
         (src, dst) = flow.src_dst()
         if src is None or dst is None:
             self._logger.debug('skipping flow without src dst')
             return
 
-        src_addr = ip_address(src.host)
-        dst_addr = ip_address(dst.host)
+        try:
+            key = flow_key(src, dst)
+        except ValueError:
+            self._logger.debug(
+                f'skipping flow with invalid src={src.host} dst={dst.host}')
+            return
 
-        for ign in self._settings.dst_ignore():
-            if dst_addr in ign:
-                self._logger.debug(
-                    f'ignoring dst match src={src_addr} dst={dst_addr}')
-                return
+        if key.dst in self._settings.dst_ignore_matcher():
+            _DST_IGNORED.inc()
+            self._logger.debug(
+                f'ignoring dst match src={src.host} dst={dst.host}')
+            return
 
-        for ign in self._settings.src_ignore():
-            if src_addr in ign:
-                self._logger.debug(
-                    f'ignoring src match src={src_addr} dst={dst_addr}')
-                return
+        if key.src in self._settings.src_ignore_matcher():
+            _SRC_IGNORED.inc()
+            self._logger.debug(
+                f'ignoring src match src={src.host} dst={dst.host}')
+            return
 
         try:
-            self._logger.debug(f'adding src={src_addr} dst={dst_addr}')
-            self._stats.add(src, dst)
+            self._logger.debug(f'adding src={src.host} dst={dst.host}')
+            count = self._shedder.weight if self._shedder is not None else 1
+            self._stats.add(key, count)
+            rules = self._rules_matcher()
+            if len(rules) and rules.match(key) is not None:
+                self._rule_stats.add(key, count)
+            if self._fanout is not None:
+                self._fanout.add(key)
         except Exception as exc:
             self._logger.error(exc)
 
+    def handle_counts(self, counts):
+        dst_ign = self._settings.dst_ignore_matcher()
+        src_ign = self._settings.src_ignore_matcher()
+        rules = self._rules_matcher()
+        for (key, count) in counts:
+            _NEW_FLOWS.inc(count)
+            if key.dst in dst_ign:
+                _DST_IGNORED.inc(count)
+                continue
+            if key.src in src_ign:
+                _SRC_IGNORED.inc(count)
+                continue
+            self._stats.add(key, count)
+            if len(rules) and rules.match(key) is not None:
+                self._rule_stats.add(key, count)
+            if self._fanout is not None:
+                self._fanout.add(key)
+
+    def _rules_matcher(self):
+        rules = self._rules
+        if rules is None:
+            rules = self._rules = self._settings.rules_matcher()
+        return rules
+
     def dump_state(self, *_):
         src_ign = self._settings.src_ignore()
         for i, ign in enumerate(sorted(src_ign)):
@@ -88,24 +310,37 @@ class Conntracker(object):
         for i, ign in enumerate(sorted(dst_ign)):
             self._logger.info(f'dst_ign dump {i + 1}/{len(dst_ign)} net={ign}')
 
+        rules = self._settings.rules_matcher()
+        for (i, rule) in enumerate(rules.rules):
+            self._logger.info(
+                f'rules dump {i + 1}/{len(rules)} {format_rule(rule)}')
+
         self._logger.info(f'stats max_size={self._stats.max_size}')
+        self._logger.info(f'stats engine={self._stats!r}')
+        self._logger.info(f'rule stats size={len(self._rule_stats)}')
+        self._logger.info(f'resolver {self._resolver!r}')
+        self._logger.info(f'emitter {self._emitter!r} '
+                          f'pending={len(self._emitter)} '
+                          f'emitted={self._emitter.emitted} '
+                          f'dropped={self._emitter.dropped}')
+        if self._cluster is not None:
+            self._logger.info(f'cluster {self._cluster!r} '
+                              f'pushed={self._cluster.pushed}')
+        if self._ingest_queue is not None:
+            self._logger.info(f'ingest queue {self._ingest_queue!r} '
+                              f'depth={len(self._ingest_queue)} '
+                              f'received={self._ingest_queue.received} '
+                              f'dropped={dict(self._ingest_queue.dropped)}')
+        if self._shedder is not None:
+            self._logger.info(f'load shedder {self._shedder!r} '
+                              f'sample_rate=1/{self._shedder.rate}')
+        if self._checkpointer is not None:
+            self._logger.info(f'checkpointer {self._checkpointer!r} '
+                              f'writes={self._checkpointer.writes}')
+        if self._fanout is not None:
+            self._logger.info(f'fanout {self._fanout!r} '
+                              f'sources={len(self._fanout)} '
+                              f'evictions={self._fanout.evictions}')
         for i, ((src, dst), count) in enumerate(self._stats.top(10)):
             self._logger.info(
                 f'stats dump {i + 1}/10 src={src} dst={dst} count={count}')
-
-    def _lookup_hostname(self, ipv4, timeout=0.1):
-        ret = {'hostname': 'notset'}
-        fetch = Thread(target=self._build_hostname_fetch(ret, ipv4))
-        fetch.start()
-        fetch.join(timeout)
-        return ret['hostname']
-
-    def _build_hostname_fetch(self, ret, ipv4):
-        def fetch():
-            try:
-                ret['hostname'] = socket.gethostbyaddr(ipv4)[0]
-            except socket.herror:
-                ret['hostname'] = 'unknown'
-                self._logger.exception('failed to get hostname')
-
-        return fetch
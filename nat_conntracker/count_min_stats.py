@@ -0,0 +1,128 @@
+import heapq
+import math
+import random
+
+from array import array
+from operator import itemgetter
+from threading import Lock
+
+from .flow_key import format_top
+
+__all__ = ['CountMinStats']
+
+_PRIME = (1 << 61) - 1
+
+
+class CountMinStats(object):
+    def __init__(self, max_size=1000, epsilon=0.001, delta=0.01, seed=0):
+        self.max_size = max_size
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1.0 / delta)))
+        self.total = 0
+
+        rand = random.Random(seed)
+        self._hashes = tuple((rand.randrange(1, _PRIME),
+                              rand.randrange(0, _PRIME))
+                             for _ in range(self.depth))
+        self._zero = array('L', [0]) * self.width
+        self._rows = [array('L', self._zero) for _ in range(self.depth)]
+        self._candidates = {}
+        self._heap = []
+        self._lock = Lock()
+
+    def __repr__(self):
+        return ('<{} max_size={!r} epsilon={!r} delta={!r} width={!r} '
+                'depth={!r} total={!r} error={!r}>').format(
+                    self.__class__.__name__, self.max_size, self.epsilon,
+                    self.delta, self.width, self.depth, self.total,
+                    self.error_estimate())
+
+    def error_estimate(self):
+        # With probability 1 - delta, every estimate exceeds the true count
+        # by no more than epsilon times the total count.
+        return int(math.ceil(self.epsilon * self.total))
+
+    def __len__(self):
+        return len(self._candidates)
+
+    def top(self, n=10):
+        return format_top(self.top_keys(n=n))
+
+    def top_keys(self, n=10):
+        try:
+            self._lock.acquire()
+            return heapq.nlargest(
+                n, self._candidates.items(), key=itemgetter(1))
+        finally:
+            self._lock.release()
+
+    def items(self):
+        try:
+            self._lock.acquire()
+            return list(self._candidates.items())
+        finally:
+            self._lock.release()
+
+    def estimate(self, key):
+        try:
+            self._lock.acquire()
+            return self._estimate(key, 0)
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        try:
+            self._lock.acquire()
+            for row in self._rows:
+                row[:] = self._zero
+            self.total = 0
+            self._candidates = {}
+            self._heap = []
+        finally:
+            self._lock.release()
+
+    def add(self, key, count=1):
+        try:
+            self._lock.acquire()
+            self.total += count
+            self._offer(key, self._estimate(key, count))
+        finally:
+            self._lock.release()
+
+    def _estimate(self, key, count):
+        hashed = hash(key)
+        width = self.width
+        est = None
+        for (row, (a, b)) in zip(self._rows, self._hashes):
+            i = ((a * hashed + b) % _PRIME) % width
+            value = row[i] + count
+            if count:
+                row[i] = value
+            if est is None or value < est:
+                est = value
+        return est
+
+    def _offer(self, key, est):
+        candidates = self._candidates
+        heap = self._heap
+
+        if key not in candidates and len(candidates) >= self.max_size:
+            while heap[0][0] != candidates.get(heap[0][1]):
+                heapq.heappop(heap)
+            (floor, floor_key) = heap[0]
+            if est <= floor:
+                return
+            heapq.heappop(heap)
+            del candidates[floor_key]
+
+        candidates[key] = est
+        heapq.heappush(heap, (est, key))
+
+        # Entries for keys whose estimate has since grown are left in the
+        # heap and skipped lazily, so the heap is rebuilt once it is mostly
+        # stale.
+        if len(heap) > 4 * self.max_size + 64:
+            self._heap = [(v, k) for (k, v) in candidates.items()]
+            heapq.heapify(self._heap)
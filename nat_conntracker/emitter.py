@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+
+__all__ = ['AlertEmitter']
+
+
+class AlertEmitter(object):
+    # Logs threshold crossings with their hostnames and publishes them on a
+    # worker thread, so that neither delays the next sample. With
+    # max_pending=0 everything happens inline on the caller's thread.
+    def __init__(self, logger, syncer, resolver, max_pending=0):
+        self._logger = logger
+        self._syncer = syncer
+        self._resolver = resolver
+        self.max_pending = max_pending
+        self._pending = None
+        self._thread = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self.emitted = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} ' \
+                f'max_pending={self.max_pending!r}>'
+
+    def __len__(self):
+        return self._pending.qsize() if self._pending is not None else 0
+
+    def emit(self, threshold, alerts, offenders, sample_rate=1):
+        # alerts are (message, src) pairs logged with the src hostname, and
+        # offenders are (src, dst, count) tuples published as one batch.
+        job = (threshold, alerts, offenders, sample_rate)
+        if self.max_pending <= 0:
+            self._send(*job)
+            return True
+
+        self._start()
+        try:
+            self._pending.put_nowait(job)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            self._logger.warn(f'dropping alerts threshold={threshold} '
+                              f'count={len(alerts)} pending={len(self)}')
+            return False
+
+    def close(self, timeout=5.0):
+        # Waits up to timeout for pending alerts to be sent. A worker that is
+        # stuck with a full queue is told to stop after its current job and
+        # the alerts still pending are dropped.
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._pending.put(None, timeout=timeout)
+        except queue.Full:
+            self._stopping = True
+            self._logger.warn(f'dropping alerts on close pending={len(self)}')
+        thread.join(max(deadline - time.monotonic(), 0))
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self._pending is None:
+                self._pending = queue.Queue(maxsize=self.max_pending)
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name='emitter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._pending.get()
+            if job is None or self._stopping:
+                return
+            try:
+                self._send(*job)
+            except Exception:
+                self._logger.exception('failed to emit alerts')
+
+    def _send(self, threshold, alerts, offenders, sample_rate):
+        for (message, src) in alerts:
+            self._logger.warn(f'{message} hostname={self._lookup(src)}')
+        if offenders:
+            self._syncer.pub_batch(
+                threshold, offenders, sample_rate=sample_rate)
+        self.emitted += len(alerts)
+
+    def _lookup(self, ip):
+        # Alerts are logged with whatever is cached, and the hostname is
+        # logged separately once it resolves.
+        return self._resolver.lookup(
+            ip, callback=self._log_hostname) or 'pending'
+
+    def _log_hostname(self, ip, hostname):
+        self._logger.info(f'resolved src={ip} hostname={hostname}')
@@ -0,0 +1,136 @@
+import heapq
+import math
+
+from collections import OrderedDict
+from threading import Lock
+
+from .flow_key import NO_PORT, format_host
+
+__all__ = ['FanoutDetector', 'splitmix64']
+
+MASK64 = (1 << 64) - 1
+
+# Bias correction constants for register counts below 128.
+_SMALL_ALPHA = {16: 0.673, 32: 0.697, 64: 0.709}
+
+
+def splitmix64(value):
+    value = (value + 0x9e3779b97f4a7c15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & MASK64
+    return value ^ (value >> 31)
+
+
+def _hash_address(packed):
+    # Addresses are 128-bit, so the high half is folded into the hash of
+    # the low half rather than truncated away.
+    return splitmix64(splitmix64(packed & MASK64) ^ (packed >> 64))
+
+
+class _HyperLogLog(object):
+    # The register sum and zero count are maintained on every update so
+    # that estimate() is O(1) instead of a pass over all registers.
+    __slots__ = ('registers', 'inverse_sum', 'zeros')
+
+    def __init__(self, size):
+        self.registers = bytearray(size)
+        self.inverse_sum = float(size)
+        self.zeros = size
+
+    def add(self, hashed, precision):
+        index = hashed >> (64 - precision)
+        rest = hashed & ((1 << (64 - precision)) - 1)
+        rank = 64 - precision - rest.bit_length() + 1
+        old = self.registers[index]
+        if rank > old:
+            self.registers[index] = rank
+            self.inverse_sum += 2.0**-rank - 2.0**-old
+            if old == 0:
+                self.zeros -= 1
+
+    def estimate(self, alpha):
+        size = len(self.registers)
+        raw = alpha * size * size / self.inverse_sum
+        if raw <= 2.5 * size and self.zeros:
+            # Linear counting is more accurate while registers are sparse.
+            return size * math.log(size / self.zeros)
+        return raw
+
+
+class _Source(object):
+    __slots__ = ('dsts', 'dports')
+
+    def __init__(self, size):
+        self.dsts = _HyperLogLog(size)
+        self.dports = _HyperLogLog(size)
+
+
+class FanoutDetector(object):
+    def __init__(self, threshold=1000, max_sources=10000, precision=8):
+        if not 4 <= precision <= 16:
+            raise ValueError(f'precision must be in 4..16, got {precision!r}')
+        self.threshold = threshold
+        self.max_sources = max_sources
+        self.precision = precision
+        self.evictions = 0
+        self._size = 1 << precision
+        self._alpha = _SMALL_ALPHA.get(self._size,
+                                       0.7213 / (1 + 1.079 / self._size))
+        # Least recently seen sources are first, so cold sources are the
+        # ones evicted once max_sources is reached.
+        self._sources = OrderedDict()
+        self._lock = Lock()
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} threshold={self.threshold!r} ' \
+                f'max_sources={self.max_sources!r} ' \
+                f'precision={self.precision!r}>'
+
+    def __len__(self):
+        return len(self._sources)
+
+    def memory_bound(self):
+        return self.max_sources * 2 * self._size
+
+    def add(self, key):
+        try:
+            self._lock.acquire()
+            source = self._sources.get(key.src)
+            if source is None:
+                while len(self._sources) >= self.max_sources:
+                    self._sources.popitem(last=False)
+                    self.evictions += 1
+                source = _Source(self._size)
+                self._sources[key.src] = source
+            else:
+                self._sources.move_to_end(key.src)
+
+            source.dsts.add(_hash_address(key.dst), self.precision)
+            if key.dport != NO_PORT:
+                source.dports.add(splitmix64(key.dport), self.precision)
+        finally:
+            self._lock.release()
+
+    def top(self, n=10):
+        return [(format_host(src), dsts, dports)
+                for (src, dsts, dports) in self.top_keys(n=n)]
+
+    def top_keys(self, n=10):
+        try:
+            self._lock.acquire()
+            alpha = self._alpha
+            estimates = ((src, round(source.dsts.estimate(alpha)),
+                          round(source.dports.estimate(alpha)))
+                         for (src, source) in self._sources.items())
+            # Ranked by whichever spread is wider, so both scans across
+            # hosts and scans across ports of one host surface.
+            return heapq.nlargest(n, estimates, key=lambda e: max(e[1], e[2]))
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        try:
+            self._lock.acquire()
+            self._sources = OrderedDict()
+        finally:
+            self._lock.release()
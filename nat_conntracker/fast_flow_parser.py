@@ -0,0 +1,95 @@
+import re
+
+from . import metrics
+from .flow_parser import FlowAddress
+
+__all__ = ['FastFlowParser', 'NewFlow', 'extract_new_flow']
+
+
+class _Scanner(object):
+    def __init__(self, encode, decode):
+        self.decode = decode
+        self.new_marker = encode('type="new"')
+        self.meta_start = encode('<meta direction="original">')
+        self.meta_end = encode('</meta>')
+        self.fields = re.compile(encode(r'<(src|dst|dport)>([^<]*)</'))
+        self.src = encode('src')
+        self.dst = encode('dst')
+        self.dport = encode('dport')
+
+
+_LINES = metrics.LINES.labels()
+
+_SCANNERS = {
+    str: _Scanner(lambda s: s, lambda s: s),
+    bytes: _Scanner(lambda s: s.encode('ascii'), lambda b: b.decode('ascii')),
+}
+
+
+def extract_new_flow(line):
+    # Only the original-direction src, dst and dport are extracted, so the
+    # src port of the returned FlowAddress pair is always empty.
+    scanner = _SCANNERS.get(type(line))
+    if scanner is None:
+        line = bytes(line)
+        scanner = _SCANNERS[bytes]
+
+    if scanner.new_marker not in line:
+        return None
+
+    start = line.find(scanner.meta_start)
+    if start == -1:
+        return None
+
+    end = line.find(scanner.meta_end, start)
+    if end == -1:
+        return None
+
+    found = {}
+    for tag, value in scanner.fields.findall(line, start, end):
+        found.setdefault(tag, value)
+
+    src = found.get(scanner.src)
+    dst = found.get(scanner.dst)
+    if not src or not dst:
+        return None
+
+    decode = scanner.decode
+    dport = found.get(scanner.dport)
+    return (FlowAddress(decode(src), ''),
+            FlowAddress(decode(dst), '' if dport is None else decode(dport)))
+
+
+class NewFlow(object):
+    __slots__ = ('src', 'dst')
+
+    flowtype = 'new'
+
+    def __init__(self, src, dst):
+        self.src = src
+        self.dst = dst
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} src={repr(self.src)} ' \
+                f'dst={repr(self.dst)}>'
+
+    def src_dst(self):
+        return (self.src, self.dst)
+
+
+class FastFlowParser(object):
+    def __init__(self, conntracker, logger):
+        self._conntracker = conntracker
+        self._logger = logger
+
+    def handle_events(self, stream, is_done=None):
+        is_done = is_done if is_done is not None else lambda: False
+        for line in stream:
+            _LINES.inc()
+            try:
+                src_dst = extract_new_flow(line)
+                if src_dst is not None:
+                    self._conntracker.handle_flow(NewFlow(*src_dst))
+            finally:
+                if is_done():
+                    return
@@ -0,0 +1,51 @@
+import socket
+
+from collections import namedtuple
+
+from .cidr_matcher import IPV4_MAPPED
+
+__all__ = [
+    'FlowKey', 'NO_PORT', 'flow_key', 'format_daddr', 'format_host',
+    'format_top', 'pack_host'
+]
+
+NO_PORT = -1
+
+FlowKey = namedtuple('FlowKey', ['src', 'dst', 'dport'])
+
+
+def pack_host(host):
+    try:
+        if ':' in host:
+            return int.from_bytes(
+                socket.inet_pton(socket.AF_INET6, host), 'big')
+        return IPV4_MAPPED | int.from_bytes(
+            socket.inet_pton(socket.AF_INET, host), 'big')
+    except (OSError, TypeError):
+        raise ValueError(f'invalid host {host!r}')
+
+
+def flow_key(src, dst):
+    dport = dst.port
+    return FlowKey(
+        pack_host(src.host), pack_host(dst.host),
+        int(dport) if dport != '' else NO_PORT)
+
+
+def format_host(packed):
+    if (packed >> 32) == 0xffff:
+        return socket.inet_ntop(socket.AF_INET, (packed & 0xffffffff).to_bytes(
+            4, 'big'))
+    return socket.inet_ntop(socket.AF_INET6, packed.to_bytes(16, 'big'))
+
+
+def format_daddr(key):
+    dport = key.dport
+    if dport == NO_PORT:
+        dport = '?'
+    return f'{format_host(key.dst)}:{dport}'
+
+
+def format_top(items):
+    return [((format_host(key.src), format_daddr(key)), count)
+            for (key, count) in items]
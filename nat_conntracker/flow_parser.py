@@ -1,9 +1,16 @@
+import calendar
+
 from collections import namedtuple
 from xml.dom.minidom import parseString as minidom_parse_string
 from xml.parsers.expat import ExpatError
 
+from . import metrics
+
 __all__ = ['FlowParser']
 
+_LINES = metrics.LINES.labels()
+_PARSE_ERRORS = metrics.PARSE_ERRORS.labels('minidom')
+
 
 class FlowParser(object):
     def __init__(self, conntracker, logger):
@@ -13,11 +20,13 @@ class FlowParser(object):
     def handle_events(self, stream, is_done=None):
         is_done = is_done if is_done is not None else lambda: False
         for line in stream:
+            _LINES.inc()
             try:
                 dom = minidom_parse_string(line)
                 for flow_node in dom.getElementsByTagName('flow'):
                     self._conntracker.handle_flow(Flow.from_node(flow_node))
             except ExpatError as experr:
+                _PARSE_ERRORS.inc()
                 self._logger.debug(f'expat error: {experr}')
             finally:
                 self._logger.debug(f'checking is_done={is_done()}')
@@ -83,10 +92,24 @@ class FlowMetaIndependent(object):
         return inst
 
 
+WHEN_TAGS = ('year', 'month', 'day', 'hour', 'min', 'sec')
+
+
+def when_timestamp(when):
+    # conntrack -o timestamp prints broken down local time without a zone,
+    # so it is read as UTC and reports print it back the same way.
+    try:
+        return calendar.timegm(
+            tuple(int(when[tag]) for tag in WHEN_TAGS) + (0, 0, 0))
+    except (KeyError, ValueError):
+        return None
+
+
 class Flow(object):
     def __init__(self):
         self.flowtype = ''
         self.meta = []
+        self.timestamp = None
 
     def __repr__(self):
         return f'<{self.__class__.__name__} flowtype={repr(self.flowtype)} ' \
@@ -106,6 +129,10 @@ class Flow(object):
         inst.flowtype = flow_node.getAttribute('type')
         for meta_node in flow_node.getElementsByTagName('meta'):
             inst.meta.append(cls.meta_from_node(meta_node))
+        for when_node in flow_node.getElementsByTagName('when'):
+            inst.timestamp = when_timestamp(
+                {tag: _find_data(when_node, tag)
+                 for tag in WHEN_TAGS})
         return inst
 
     @staticmethod
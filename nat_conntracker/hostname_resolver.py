@@ -0,0 +1,118 @@
+import socket
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from . import metrics
+
+__all__ = ['HostnameResolver']
+
+
+class HostnameResolver(object):
+    def __init__(self,
+                 logger,
+                 pool_size=4,
+                 cache_size=4096,
+                 ttl=3600,
+                 negative_ttl=300,
+                 clock=time.monotonic):
+        self._logger = logger
+        self._pool_size = pool_size
+        self._cache_size = cache_size
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._clock = clock
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._executor = None
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return ('<{} pool_size={!r} cached={!r} hit_rate={:.2f} '
+                'queue_depth={!r}>').format(
+                    self.__class__.__name__, self._pool_size, len(self._cache),
+                    self.hit_rate(), self.queue_depth())
+
+    def lookup(self, ip, callback=None):
+        # Returns the cached hostname, or None after scheduling a resolution
+        # which calls callback(ip, hostname) once it completes.  Concurrent
+        # lookups of the same ip share a single resolution.
+        try:
+            self._lock.acquire()
+            entry = self._cache.get(ip)
+            if entry is not None and entry[1] > self._clock():
+                self._cache.move_to_end(ip)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            callbacks = self._inflight.get(ip)
+            if callbacks is not None:
+                if callback is not None:
+                    callbacks.append(callback)
+                return None
+
+            self._inflight[ip] = [callback] if callback is not None else []
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._pool_size, thread_name_prefix='resolver')
+        finally:
+            self._lock.release()
+
+        try:
+            self._executor.submit(self._resolve, ip)
+        except RuntimeError:
+            # The executor has been shut down, so nothing will ever resolve
+            # the entry added above.
+            try:
+                self._lock.acquire()
+                self._inflight.pop(ip, None)
+            finally:
+                self._lock.release()
+            self._logger.debug(f'skipping lookup after shutdown ip={ip}')
+        return None
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def queue_depth(self):
+        return len(self._inflight)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _resolve(self, ip):
+        started = time.perf_counter()
+        try:
+            hostname = socket.gethostbyaddr(ip)[0]
+            ttl = self._ttl
+        except (socket.herror, socket.gaierror):
+            hostname = 'unknown'
+            ttl = self._negative_ttl
+        except Exception:
+            self._logger.exception('failed to get hostname')
+            hostname = 'unknown'
+            ttl = self._negative_ttl
+        metrics.DNS_SECONDS.observe(time.perf_counter() - started)
+
+        try:
+            self._lock.acquire()
+            self._cache[ip] = (hostname, self._clock() + ttl)
+            self._cache.move_to_end(ip)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            callbacks = self._inflight.pop(ip, [])
+        finally:
+            self._lock.release()
+
+        for callback in callbacks:
+            try:
+                callback(ip, hostname)
+            except Exception:
+                self._logger.exception('failed to handle hostname')
@@ -0,0 +1,147 @@
+import threading
+
+from collections import Counter, deque
+
+from . import metrics
+
+__all__ = ['IngestQueue', 'POLICIES', 'is_new_record']
+
+POLICIES = ('block', 'drop-oldest', 'drop-non-new')
+
+
+def is_new_record(record):
+    marker = b'type="new"' if isinstance(record, bytes) else 'type="new"'
+    return marker in record
+
+
+class IngestQueue(object):
+    # A bounded buffer of raw records between a dedicated reader thread and
+    # the parser, so that the input pipe keeps being drained while parsing
+    # stalls and overload is handled by an explicit policy.
+    def __init__(self,
+                 logger,
+                 max_records=65536,
+                 policy='block',
+                 batch_size=256,
+                 poll_interval=0.5):
+        if policy not in POLICIES:
+            raise ValueError(f'unknown ingest policy {policy!r}')
+        self._logger = logger
+        self.max_records = max_records
+        self.policy = policy
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        # With drop-non-new, records that are not "new" flows are queued
+        # separately so the oldest of them can be dropped in O(1). Sequence
+        # numbers keep the consumer in arrival order across both.
+        self._new = deque()
+        self._other = deque() if policy == 'drop-non-new' else self._new
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._reader = None
+        self.received = 0
+        self.dropped = Counter()
+        self._reported = Counter()
+        metrics.INGEST_DEPTH.set_function(self.__len__)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} max_records={self.max_records!r} ' \
+                f'policy={self.policy!r}>'
+
+    def __len__(self):
+        if self._other is self._new:
+            return len(self._new)
+        return len(self._new) + len(self._other)
+
+    def start(self, stream, is_done=None):
+        is_done = is_done if is_done is not None else lambda: False
+        self._reader = threading.Thread(
+            target=self._read, args=(stream, is_done), daemon=True)
+        self._reader.start()
+        return self.consume(is_done)
+
+    def put(self, record, is_done=None):
+        with self._cond:
+            self.received += 1
+            queue = self._new
+            if self._other is not self._new and not is_new_record(record):
+                queue = self._other
+
+            while len(self) >= self.max_records:
+                if self.policy == 'block':
+                    if is_done is not None and is_done():
+                        self._drop('shutdown')
+                        return False
+                    self._cond.wait(self._poll_interval)
+                    continue
+                if self.policy == 'drop-non-new':
+                    if queue is self._other:
+                        self._drop('non-new')
+                        return False
+                    if self._other:
+                        self._other.popleft()
+                        self._drop('non-new')
+                        continue
+                (self._new or self._other).popleft()
+                self._drop('oldest')
+
+            self._seq += 1
+            queue.append((self._seq, record))
+            self._cond.notify_all()
+            return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def consume(self, is_done=None):
+        is_done = is_done if is_done is not None else lambda: False
+        while True:
+            with self._cond:
+                while not len(self) and not self._closed:
+                    if is_done():
+                        return
+                    self._cond.wait(self._poll_interval)
+                if not len(self) and self._closed:
+                    return
+                batch = self._take()
+                self._cond.notify_all()
+            for record in batch:
+                yield record
+
+    def drops_since_last(self):
+        with self._cond:
+            dropped = self.dropped - self._reported
+            self._reported = Counter(self.dropped)
+        return dropped
+
+    def _take(self):
+        batch = []
+        new = self._new
+        other = self._other
+        while len(batch) < self._batch_size:
+            if other is not new and other and (not new
+                                               or other[0][0] < new[0][0]):
+                batch.append(other.popleft()[1])
+            elif new:
+                batch.append(new.popleft()[1])
+            else:
+                break
+        return batch
+
+    def _drop(self, reason):
+        self.dropped[reason] += 1
+        metrics.INGEST_DROPPED.labels(reason).inc()
+
+    def _read(self, stream, is_done):
+        try:
+            for record in stream:
+                self.put(record, is_done)
+                if is_done():
+                    break
+        except Exception:
+            self._logger.exception('breaking out of ingest read')
+        finally:
+            self.close()
@@ -0,0 +1,85 @@
+import random
+
+from . import metrics
+from .ingest_queue import is_new_record
+
+__all__ = ['LoadShedder', 'MAX_RATE']
+
+MAX_RATE = 65535
+
+
+class LoadShedder(object):
+    # Samples raw "new" flow records 1-in-rate between the ingest queue and
+    # the parser, so that shed records are never parsed. The rate doubles
+    # while the queue stays above high_water of its capacity and halves once
+    # it drains below low_water. Kept flows carry the rate as their weight so
+    # that counts stay comparable with the unsampled threshold.
+    def __init__(self,
+                 logger,
+                 queue,
+                 high_water=0.5,
+                 low_water=0.1,
+                 max_rate=64,
+                 check_every=1024,
+                 rand=random.random):
+        self._logger = logger
+        self._queue = queue
+        self._high = int(queue.max_records * high_water)
+        self._low = int(queue.max_records * low_water)
+        # Sync messages carry the rate as an unsigned 16-bit field.
+        self.max_rate = max(1, min(max_rate, MAX_RATE))
+        self._check_every = check_every
+        self._rand = rand
+        self.rate = 1
+        self.peak_rate = 1
+        self.weight = 1
+        self.kept = 0
+        self.shed = 0
+        metrics.SAMPLE_RATE.set_function(lambda: self.rate)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} max_rate={self.max_rate!r} ' \
+                f'high={self._high!r} low={self._low!r}>'
+
+    def filter(self, records):
+        seen = 0
+        for record in records:
+            seen += 1
+            if seen >= self._check_every:
+                seen = 0
+                self._adjust()
+
+            if self.rate > 1 and is_new_record(record):
+                if self._rand() * self.rate >= 1.0:
+                    self.shed += 1
+                    metrics.SHED_FLOWS.inc()
+                    continue
+                self.kept += 1
+                # Parsing happens before the next record is pulled, so the
+                # weight still belongs to this record when the flow is added.
+                self.weight = self.rate
+            elif self.weight != 1 and is_new_record(record):
+                self.weight = 1
+            yield record
+
+    def interval(self):
+        # Returns (peak_rate, kept, shed) since the last call.
+        summary = (self.peak_rate, self.kept, self.shed)
+        self.peak_rate = self.rate
+        self.kept = 0
+        self.shed = 0
+        return summary
+
+    def _adjust(self):
+        depth = len(self._queue)
+        rate = self.rate
+        if depth > self._high and rate < self.max_rate:
+            rate = min(rate * 2, self.max_rate)
+        elif depth < self._low and rate > 1:
+            rate //= 2
+        if rate == self.rate:
+            return
+        self._logger.warn(f'load shedding sample_rate=1/{rate} '
+                          f'previous=1/{self.rate} depth={depth}')
+        self.rate = rate
+        self.peak_rate = max(self.peak_rate, rate)
@@ -1,5 +1,9 @@
+from contextlib import contextmanager
 from ipaddress import ip_network
 
+from .cidr_matcher import CIDRMatcher
+from .rules import RuleSet, parse_rule
+
 __all__ = ['MemSettings']
 
 
@@ -8,23 +12,63 @@ class MemSettings(object):
         self._settings = {
             'src_ignore': set(),
             'dst_ignore': set(),
+            'rules': set(),
             'min_flow': 10
         }
+        self._matchers = {}
 
     def ping(self):
         pass
 
+    def close(self):
+        pass
+
+    @contextmanager
+    def batch(self):
+        yield self
+
     def src_ignore(self):
         return list(self._settings['src_ignore'])
 
     def dst_ignore(self):
         return list(self._settings['dst_ignore'])
 
+    def src_ignore_matcher(self):
+        return self._matcher('src_ignore')
+
+    def dst_ignore_matcher(self):
+        return self._matcher('dst_ignore')
+
     def add_ignore_src(self, src):
         self._settings['src_ignore'].add(ip_network(str(src)))
+        self._matchers.pop('src_ignore', None)
 
     def add_ignore_dst(self, dst):
         self._settings['dst_ignore'].add(ip_network(str(dst)))
+        self._matchers.pop('dst_ignore', None)
+
+    def rules(self):
+        return list(self._settings['rules'])
+
+    def rules_matcher(self):
+        matcher = self._matchers.get('rules')
+        if matcher is None:
+            matcher = RuleSet(self._settings['rules'])
+            self._matchers['rules'] = matcher
+        return matcher
+
+    def add_rule(self, rule):
+        if isinstance(rule, str):
+            rule = parse_rule(rule)
+        self._settings['rules'].add(rule)
+        self._matchers.pop('rules', None)
 
     def min_flow(self):
         return self._settings['min_flow']
+
+    def _matcher(self, key):
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = CIDRMatcher(self._settings[key])
+            self._matchers[key] = matcher
+        return matcher
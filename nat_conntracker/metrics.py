@@ -0,0 +1,337 @@
+import bisect
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+__all__ = [
+    'Counter', 'Gauge', 'Histogram', 'MetricsServer', 'Registry',
+    'TextfileWriter', 'REGISTRY'
+]
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0)
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for (name, value) in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(object):
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+        self._default = None
+        if not self.label_names:
+            self._default = self._children[()] = self._child()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        # Callers on the hot path should hold on to the returned child
+        # rather than looking it up for every update.
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}'
+        ]
+        for (values, child) in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child):
+        labels = _format_labels(self.label_names, values)
+        return [f'{self.name}{labels} {_format_value(child.get())}']
+
+
+class _Value(object):
+    # Updates are plain attribute arithmetic without a lock. Under the GIL
+    # a rare concurrent increment may be lost, which is an acceptable trade
+    # for keeping per-flow instrumentation to a few dozen nanoseconds.
+    __slots__ = ('value', 'func')
+
+    def __init__(self):
+        self.value = 0
+        self.func = None
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, func):
+        # The value is read from func at render time instead, for figures
+        # that are already tracked elsewhere.
+        self.func = func
+
+    def get(self):
+        if self.func is not None:
+            return self.func()
+        return self.value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def set_function(self, func):
+        self._default.set_function(func)
+
+    def _child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, func):
+        self._default.set_function(func)
+
+    def _child(self):
+        return _Value()
+
+
+class _HistogramValue(object):
+    __slots__ = ('upper_bounds', 'counts', 'sum')
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer(object):
+    __slots__ = ('_histogram', '_started')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self._histogram.observe(time.perf_counter() - self._started)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self,
+                 name,
+                 documentation,
+                 labels=(),
+                 buckets=LATENCY_BUCKETS,
+                 registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labels=labels, registry=registry)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        bounds = self.buckets + (float('inf'), )
+        for (bound, count) in zip(bounds, list(child.counts)):
+            cumulative += count
+            labels = _format_labels(self.label_names, values,
+                                    (('le', _format_value(float(bound))), ))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.label_names, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(child.sum)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+LINES = Counter('nat_conntracker_lines_total',
+                'Event lines read by the line based parsers.')
+FLOWS = Counter(
+    'nat_conntracker_flows_total',
+    'Flows handled by flowtype.',
+    labels=('flowtype', ))
+PARSE_ERRORS = Counter(
+    'nat_conntracker_parse_errors_total',
+    'Event lines that failed to parse.',
+    labels=('parser', ))
+IGNORED = Counter(
+    'nat_conntracker_ignored_flows_total',
+    'New flows dropped by an ignore list.',
+    labels=('list', ))
+INGEST_DEPTH = Gauge('nat_conntracker_ingest_queue_depth',
+                     'Raw event records waiting in the ingest queue.')
+INGEST_DROPPED = Counter(
+    'nat_conntracker_ingest_dropped_total',
+    'Raw event records dropped by the ingest queue by reason.',
+    labels=('reason', ))
+SAMPLE_RATE = Gauge('nat_conntracker_sample_rate',
+                    'Current 1-in-N sampling rate of new flows.')
+SHED_FLOWS = Counter('nat_conntracker_shed_flows_total',
+                     'New flow records skipped by load shedding.')
+STATS_SIZE = Gauge('nat_conntracker_stats_size',
+                   'Keys held by the stats engine at the last sample.')
+STATS_EVICTIONS = Counter('nat_conntracker_stats_evictions_total',
+                          'Keys evicted by the stats engine.')
+SAMPLE_SECONDS = Histogram('nat_conntracker_sample_duration_seconds',
+                           'Time spent in each sample.')
+REDIS_SECONDS = Histogram(
+    'nat_conntracker_redis_latency_seconds',
+    'Redis round trip latency by operation.',
+    labels=('op', ))
+DNS_SECONDS = Histogram('nat_conntracker_dns_lookup_seconds',
+                        'Reverse DNS lookup latency.')
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is only available from Python 3.7.
+    daemon_threads = True
+
+
+class MetricsServer(object):
+    def __init__(self, port, address='127.0.0.1', registry=REGISTRY):
+        registry_ = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry_.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer((address, port), Handler)
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # shutdown() waits for serve_forever() and would block if it never
+        # started.
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+
+class TextfileWriter(object):
+    def __init__(self, path, interval=15.0, registry=REGISTRY):
+        self.path = path
+        self._interval = interval
+        self._registry = registry
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join(self._interval)
+        self.write()
+
+    def write(self):
+        # Written aside and renamed so the collector never reads a partial
+        # file.
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as out:
+            out.write(self._registry.render())
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._done.wait(self._interval):
+            self.write()
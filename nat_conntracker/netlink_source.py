@@ -0,0 +1,205 @@
+import errno
+import socket
+import struct
+
+from .flow_parser import Flow, FlowAddress, FlowMetaOrigReply
+
+__all__ = ['NetlinkEventSource', 'decode_messages']
+
+NETLINK_NETFILTER = 12
+NFNLGRP_CONNTRACK_NEW = 1
+SO_RCVBUFFORCE = 33
+
+NLMSG_NOOP = 1
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLMSG_OVERRUN = 4
+NLM_F_CREATE = 0x400
+
+NFNL_SUBSYS_CTNETLINK = 1
+IPCTNL_MSG_CT_NEW = 0
+IPCTNL_MSG_CT_DELETE = 2
+
+NLA_TYPE_MASK = 0x3fff
+
+CTA_TUPLE_ORIG = 1
+CTA_TUPLE_IP = 1
+CTA_TUPLE_PROTO = 2
+CTA_IP_V4_SRC = 1
+CTA_IP_V4_DST = 2
+CTA_IP_V6_SRC = 3
+CTA_IP_V6_DST = 4
+CTA_PROTO_SRC_PORT = 2
+CTA_PROTO_DST_PORT = 3
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_NFGENMSG_LEN = 4
+_NLATTR = struct.Struct('=HH')
+_PORT = struct.Struct('!H')
+
+_IP_ATTRS = {
+    CTA_IP_V4_SRC: ('src', socket.AF_INET),
+    CTA_IP_V4_DST: ('dst', socket.AF_INET),
+    CTA_IP_V6_SRC: ('src', socket.AF_INET6),
+    CTA_IP_V6_DST: ('dst', socket.AF_INET6),
+}
+_PORT_ATTRS = {
+    CTA_PROTO_SRC_PORT: 'sport',
+    CTA_PROTO_DST_PORT: 'dport',
+}
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _attrs(data, start, end):
+    while start + _NLATTR.size <= end:
+        (length, attr_type) = _NLATTR.unpack_from(data, start)
+        if length < _NLATTR.size:
+            return
+        yield (attr_type & NLA_TYPE_MASK, start + _NLATTR.size, start + length)
+        start += _align(length)
+
+
+def _decode_tuple(data, start, end):
+    found = {}
+    for (attr_type, attr_start, attr_end) in _attrs(data, start, end):
+        if attr_type == CTA_TUPLE_IP:
+            for (ip_type, ip_start, ip_end) in _attrs(data, attr_start,
+                                                      attr_end):
+                if ip_type in _IP_ATTRS:
+                    (name, family) = _IP_ATTRS[ip_type]
+                    found[name] = socket.inet_ntop(family,
+                                                   data[ip_start:ip_end])
+        elif attr_type == CTA_TUPLE_PROTO:
+            for (proto_type, proto_start, _) in _attrs(data, attr_start,
+                                                       attr_end):
+                if proto_type in _PORT_ATTRS:
+                    found[_PORT_ATTRS[proto_type]] = str(
+                        _PORT.unpack_from(data, proto_start)[0])
+    return found
+
+
+def _decode_flow(data, msg_flags, ct_type, start, end):
+    flow = Flow()
+    if ct_type == IPCTNL_MSG_CT_DELETE:
+        flow.flowtype = 'destroy'
+    elif msg_flags & NLM_F_CREATE:
+        flow.flowtype = 'new'
+    else:
+        flow.flowtype = 'update'
+
+    for (attr_type, attr_start,
+         attr_end) in _attrs(data, start + _NFGENMSG_LEN, end):
+        if attr_type != CTA_TUPLE_ORIG:
+            continue
+        found = _decode_tuple(data, attr_start, attr_end)
+        meta = FlowMetaOrigReply()
+        meta.direction = 'original'
+        meta.src = FlowAddress(found.get('src', ''), found.get('sport', ''))
+        meta.dst = FlowAddress(found.get('dst', ''), found.get('dport', ''))
+        flow.meta.append(meta)
+    return flow
+
+
+def decode_messages(data):
+    # Yields a (msg_type, Flow or None) pair for each netlink message in the
+    # buffer, where Flow is only decoded for ctnetlink conntrack messages.
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        (length, msg_type, msg_flags, _, _) = _NLMSGHDR.unpack_from(
+            data, offset)
+        if length < _NLMSGHDR.size or offset + length > len(data):
+            return
+
+        flow = None
+        if (msg_type >> 8) == NFNL_SUBSYS_CTNETLINK:
+            flow = _decode_flow(data, msg_flags, msg_type & 0xff,
+                                offset + _NLMSGHDR.size, offset + length)
+        yield (msg_type, flow)
+        offset += _align(length)
+
+
+class NetlinkEventSource(object):
+    # Reads its own input rather than records from the events stream.
+    owns_input = True
+
+    def __init__(self,
+                 conntracker,
+                 logger,
+                 rcvbuf=4 * 1024 * 1024,
+                 replay=None,
+                 recv_size=65536,
+                 timeout=1.0):
+        self._conntracker = conntracker
+        self._logger = logger
+        self._rcvbuf = rcvbuf
+        self._replay = replay
+        self._recv_size = recv_size
+        self._timeout = timeout
+        self.messages = 0
+        self.enobufs = 0
+
+    def handle_events(self, _stream=None, is_done=None):
+        is_done = is_done if is_done is not None else lambda: False
+        if self._replay is not None:
+            with open(self._replay, 'rb') as replay:
+                for data in self._read_replay(replay):
+                    self._handle_data(data)
+                    if is_done():
+                        return
+            return
+
+        sock = self._open_socket()
+        try:
+            while not is_done():
+                try:
+                    data = sock.recv(self._recv_size)
+                except socket.timeout:
+                    continue
+                except OSError as oserr:
+                    if oserr.errno != errno.ENOBUFS:
+                        raise
+                    self.enobufs += 1
+                    self._logger.warn('netlink receive buffer overrun '
+                                      f'enobufs={self.enobufs}')
+                    continue
+                self._handle_data(data)
+        finally:
+            sock.close()
+
+    def _open_socket(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             NETLINK_NETFILTER)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, self._rcvbuf)
+        except OSError:
+            # SO_RCVBUFFORCE requires CAP_NET_ADMIN; fall back to the limit
+            # imposed by net.core.rmem_max.
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._rcvbuf)
+        sock.bind((0, 1 << (NFNLGRP_CONNTRACK_NEW - 1)))
+        sock.settimeout(self._timeout)
+        rcvbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        self._logger.info(f'subscribed to netlink conntrack rcvbuf={rcvbuf}')
+        return sock
+
+    def _read_replay(self, replay):
+        while True:
+            header = replay.read(_NLMSGHDR.size)
+            if len(header) < _NLMSGHDR.size:
+                return
+            length = _NLMSGHDR.unpack(header)[0]
+            if length < _NLMSGHDR.size:
+                return
+            body = replay.read(_align(length) - _NLMSGHDR.size)
+            yield header + body
+
+    def _handle_data(self, data):
+        for (msg_type, flow) in decode_messages(data):
+            self.messages += 1
+            if msg_type == NLMSG_OVERRUN:
+                self.enobufs += 1
+                continue
+            if flow is not None:
+                self._conntracker.handle_flow(flow)
@@ -7,12 +7,18 @@ class NullSyncer(object):
     def __init__(self, *_, **__):
         pass
 
-    def pub(self, *_):
+    def pub(self, *_, **__):
+        return 1
+
+    def pub_batch(self, *_, **__):
         return 1
 
     def sub(self, **__):
         while True:
             time.sleep(10)
 
+    async def asub(self, done):
+        await done.wait()
+
     def ping(self):
         pass
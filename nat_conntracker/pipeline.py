@@ -0,0 +1,191 @@
+import multiprocessing
+import queue
+import threading
+import time
+
+from collections import Counter
+
+from .fast_flow_parser import extract_new_flow
+from .flow_key import FlowKey, flow_key
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:
+    # Only available from Python 3.8.
+    SharedMemory = None
+
+__all__ = ['HAS_SHARED_MEMORY', 'ParallelPipeline']
+
+HAS_SHARED_MEMORY = SharedMemory is not None
+
+
+class ParallelPipeline(object):
+    # Batches the events stream into the workers' rings as it is read, so
+    # records bypass the ingest queue and load shedder in Conntracker.handle.
+    owns_input = True
+
+    def __init__(self,
+                 conntracker,
+                 logger,
+                 workers=2,
+                 slot_size=256 * 1024,
+                 slots=8,
+                 max_delay=0.5,
+                 poll_interval=0.5):
+        self._conntracker = conntracker
+        self._logger = logger
+        self._workers = workers
+        self._slot_size = slot_size
+        self._slots = slots
+        self._max_delay = max_delay
+        self._poll_interval = poll_interval
+        self.batches = 0
+
+    def handle_events(self, stream, is_done=None):
+        is_done = is_done if is_done is not None else lambda: False
+        context = multiprocessing.get_context()
+        results = context.Queue()
+        rings = [
+            _Ring(context, self._slot_size, self._slots)
+            for _ in range(self._workers)
+        ]
+        procs = [
+            context.Process(
+                target=_work,
+                args=(ring.shm, self._slot_size, ring.ready, ring.free,
+                      results),
+                daemon=True) for ring in rings
+        ]
+        for proc in procs:
+            proc.start()
+
+        merger = threading.Thread(target=self._merge, args=(results, procs))
+        merger.start()
+        self._logger.info(f'started parse pipeline workers={len(procs)}')
+
+        try:
+            self._read(stream, rings, procs, is_done)
+        finally:
+            for ring in rings:
+                ring.ready.put(None)
+            merger.join()
+            for proc in procs:
+                proc.join(self._poll_interval)
+            for ring in rings:
+                ring.close()
+
+    def _read(self, stream, rings, procs, is_done):
+        batch = bytearray()
+        dispatched = time.monotonic()
+        turn = 0
+        for record in stream:
+            if isinstance(record, str):
+                record = record.encode('utf-8')
+
+            if len(batch) + len(record) > self._slot_size:
+                turn = self._dispatch(batch, rings, procs, turn, is_done)
+                batch = bytearray()
+                dispatched = time.monotonic()
+
+            if len(record) > self._slot_size:
+                self._logger.debug(f'skipping oversized record '
+                                   f'len={len(record)}')
+            else:
+                batch += record
+
+            if batch and time.monotonic() - dispatched >= self._max_delay:
+                turn = self._dispatch(batch, rings, procs, turn, is_done)
+                batch = bytearray()
+                dispatched = time.monotonic()
+
+            if is_done():
+                break
+
+        if batch:
+            self._dispatch(batch, rings, procs, turn, is_done)
+
+    def _dispatch(self, batch, rings, procs, turn, is_done):
+        ring = rings[turn % len(rings)]
+        proc = procs[turn % len(rings)]
+        while True:
+            try:
+                slot = ring.free.get(timeout=self._poll_interval)
+                break
+            except queue.Empty:
+                if is_done() or not proc.is_alive():
+                    self._logger.warn('dropping batch for stalled worker '
+                                      f'pid={proc.pid}')
+                    return turn + 1
+
+        offset = slot * self._slot_size
+        ring.shm.buf[offset:offset + len(batch)] = batch
+        ring.ready.put((slot, len(batch)))
+        self.batches += 1
+        return turn + 1
+
+    def _merge(self, results, procs):
+        workers = len(procs)
+        try:
+            while workers > 0:
+                try:
+                    partial = results.get(timeout=self._poll_interval)
+                except queue.Empty:
+                    if not any(proc.is_alive() for proc in procs):
+                        break
+                    continue
+                if partial is None:
+                    workers -= 1
+                    continue
+                self._conntracker.handle_counts(
+                    (FlowKey(src, dst, dport), count)
+                    for (src, dst, dport, count) in partial)
+        except Exception:
+            self._logger.exception('breaking out of pipeline merge')
+        finally:
+            self._conntracker.flush()
+
+
+class _Ring(object):
+    # Fixed-size slots in one shared memory segment; only slot indexes and
+    # lengths travel through the queues, never the record bytes.
+    def __init__(self, context, slot_size, slots):
+        self.shm = SharedMemory(create=True, size=slot_size * slots)
+        self.free = context.Queue()
+        self.ready = context.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _work(shm, slot_size, ready, free, results):
+    try:
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+
+            (slot, length) = item
+            offset = slot * slot_size
+            data = bytes(shm.buf[offset:offset + length])
+            free.put(slot)
+
+            results.put(
+                [key + (count, ) for (key, count) in _count(data).items()])
+    finally:
+        results.put(None)
+
+
+def _count(data):
+    counts = Counter()
+    for line in data.split(b'\n'):
+        src_dst = extract_new_flow(line)
+        if src_dst is None:
+            continue
+        try:
+            counts[tuple(flow_key(*src_dst))] += 1
+        except ValueError:
+            continue
+    return counts
@@ -0,0 +1,64 @@
+import time
+
+__all__ = ['RecordReader']
+
+
+class RecordReader(object):
+    def __init__(self, stream, read_size=65536, delimiter=b'\n'):
+        raw = getattr(stream, 'buffer', stream)
+        # readinto1 performs at most one read on the underlying raw stream,
+        # so a quiet pipe yields what is available rather than blocking until
+        # the whole buffer is filled.
+        self._readinto = getattr(raw, 'readinto1', None) or raw.readinto
+        self._buf = bytearray(read_size)
+        self._delimiter = delimiter
+        self.read_size = read_size
+        self.bytes_read = 0
+        self.records = 0
+        self._last_rates = (time.monotonic(), 0, 0)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} read_size={self.read_size!r}>'
+
+    def __iter__(self):
+        buf = self._buf
+        view = memoryview(buf)
+        delimiter = self._delimiter
+        pending = b''
+
+        while True:
+            n = self._readinto(view)
+            if not n:
+                break
+            self.bytes_read += n
+
+            start = 0
+            end = buf.find(delimiter, 0, n)
+            while end != -1:
+                end += 1
+                if pending:
+                    record = pending + view[start:end]
+                    pending = b''
+                else:
+                    record = view[start:end].tobytes()
+                self.records += 1
+                yield record
+                start = end
+                end = buf.find(delimiter, start, n)
+
+            if start < n:
+                pending += view[start:n]
+
+        if pending:
+            self.records += 1
+            yield pending
+
+    def rates(self):
+        now = time.monotonic()
+        (then, bytes_then, records_then) = self._last_rates
+        (bytes_now, records_now) = (self.bytes_read, self.records)
+        self._last_rates = (now, bytes_now, records_now)
+
+        elapsed = max(now - then, 1e-9)
+        return ((bytes_now - bytes_then) / elapsed,
+                (records_now - records_then) / elapsed)
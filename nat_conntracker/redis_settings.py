@@ -1,28 +1,108 @@
+import logging
+import threading
+
+from contextlib import contextmanager
 from ipaddress import ip_network
 
 import redis
 from cachetools.func import ttl_cache
 
+from . import metrics
+from .cidr_matcher import CIDRMatcher
+from .rules import RuleSet, format_rule, parse_rule
+
 __all__ = ['RedisSettings']
 
+_SETTINGS_SECONDS = metrics.REDIS_SECONDS.labels('settings')
+
 
 class RedisSettings(object):
     def __init__(self,
                  namespace='nat-conntracker',
-                 conn_url='redis://localhost:6379/0'):
+                 conn_url='redis://localhost:6379/0',
+                 watch=False,
+                 watch_interval=5.0,
+                 logger=None):
         self._namespace = namespace
         self._conn = redis.from_url(conn_url)
+        self._logger = logger if logger is not None else \
+                logging.getLogger(__name__)
+        self._version_key = f'{namespace}:settings-version'
+        self._channel = f'{namespace}:settings'
+        self._watch_interval = watch_interval
+        self._watch_done = threading.Event()
+        self._watcher = None
+        self._snapshot = None
+        self._batching = 0
+        self._batch_dirty = False
+        self.reloads = 0
+        if watch:
+            self._snapshot = self._load_snapshot()
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
 
     def ping(self):
         return self._conn.ping()
 
-    @ttl_cache(ttl=30)
+    def close(self):
+        self._watch_done.set()
+        if self._watcher is not None:
+            self._watcher.join(self._watch_interval)
+
+    @contextmanager
+    def batch(self):
+        # Writes made inside the block bump the version, and so notify
+        # watchers and reload, once when the outermost block exits.
+        self._batching += 1
+        try:
+            yield self
+        finally:
+            self._batching -= 1
+            if not self._batching and self._batch_dirty:
+                self._batch_dirty = False
+                self._bump_version()
+
     def src_ignore(self):
-        return self._get_networks('src-ignore')
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.src_ignore
+        return self._cached_networks('src-ignore')
 
-    @ttl_cache(ttl=30)
     def dst_ignore(self):
-        return self._get_networks('dst-ignore')
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.dst_ignore
+        return self._cached_networks('dst-ignore')
+
+    def src_ignore_matcher(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.src_matcher
+        return self._cached_matcher('src-ignore')
+
+    def dst_ignore_matcher(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.dst_matcher
+        return self._cached_matcher('dst-ignore')
+
+    def rules(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.rules
+        return self._cached_rules()
+
+    def rules_matcher(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.rules_matcher
+        return self._cached_rules_matcher()
+
+    def add_rule(self, rule):
+        if isinstance(rule, str):
+            rule = parse_rule(rule)
+        self._conn.sadd(f'{self._namespace}:rules', format_rule(rule))
+        self._bump_version()
 
     def add_ignore_src(self, src):
         return self._add_ignore('src-ignore', src)
@@ -30,16 +110,126 @@ class RedisSettings(object):
     def add_ignore_dst(self, dst):
         return self._add_ignore('dst-ignore', dst)
 
-    @ttl_cache(ttl=30)
     def min_flow(self, default=10):
-        return int(self._conn.get(f'{self._namespace}:min-flow') or default)
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.min_flow
+        return self._cached_min_flow(default)
+
+    def set_min_flow(self, min_flow):
+        self._conn.set(f'{self._namespace}:min-flow', int(min_flow))
+        self._bump_version()
+
+    @ttl_cache(ttl=30)
+    def _cached_networks(self, key):
+        return self._get_networks(key)
+
+    @ttl_cache(ttl=30)
+    def _cached_rules(self):
+        return self._get_rules()
+
+    # The compiled matchers are cached alongside the lists they are built
+    # from, so the flow path only compiles them once per refresh.
+    @ttl_cache(ttl=30)
+    def _cached_matcher(self, key):
+        return CIDRMatcher(self._get_networks(key))
+
+    @ttl_cache(ttl=30)
+    def _cached_rules_matcher(self):
+        return RuleSet(self._get_rules())
+
+    @ttl_cache(ttl=30)
+    def _cached_min_flow(self, default):
+        return self._get_min_flow(default)
 
     def _get_networks(self, key):
+        with _SETTINGS_SECONDS.time():
+            members = self._conn.smembers(f'{self._namespace}:{key}')
         return [
             ip_network(s.decode('utf-8'))
-            for s in filter(lambda s: s.strip() != b'',
-                            self._conn.smembers(f'{self._namespace}:{key}'))
+            for s in filter(lambda s: s.strip() != b'', members)
         ]
 
+    def _get_rules(self):
+        with _SETTINGS_SECONDS.time():
+            members = self._conn.smembers(f'{self._namespace}:rules')
+        rules = []
+        for member in members:
+            try:
+                rules.append(parse_rule(member.decode('utf-8')))
+            except ValueError as exc:
+                self._logger.warn(f'skipping invalid rule {member!r} {exc}')
+        return rules
+
+    def _get_min_flow(self, default=10):
+        with _SETTINGS_SECONDS.time():
+            min_flow = self._conn.get(f'{self._namespace}:min-flow')
+        return int(min_flow or default)
+
+    def _get_version(self):
+        return int(self._conn.get(self._version_key) or 0)
+
     def _add_ignore(self, key, value):
         self._conn.sadd(f'{self._namespace}:{key}', str(value))
+        self._bump_version()
+
+    def _bump_version(self):
+        if self._batching:
+            self._batch_dirty = True
+            return None
+        version = self._conn.incr(self._version_key)
+        self._conn.publish(self._channel, version)
+        if self._snapshot is not None:
+            # Writes made through this instance apply immediately rather
+            # than waiting for the notification to come back around.
+            self._reload()
+        return version
+
+    def _load_snapshot(self):
+        # The version is read first so that a write racing with the load
+        # leaves the snapshot looking stale and triggers another reload.
+        version = self._get_version()
+        return _Snapshot(version, self._get_networks('src-ignore'),
+                         self._get_networks('dst-ignore'),
+                         self._get_min_flow(), self._get_rules())
+
+    def _reload(self):
+        self._snapshot = self._load_snapshot()
+        self.reloads += 1
+        self._logger.info(
+            f'reloaded settings version={self._snapshot.version}')
+
+    def _watch(self):
+        # Pub/sub delivery is fire-and-forget, so the version key is also
+        # checked every watch_interval to pick up missed notifications.
+        psconn = None
+        while not self._watch_done.is_set():
+            try:
+                if psconn is None:
+                    psconn = self._conn.pubsub(ignore_subscribe_messages=True)
+                    psconn.subscribe(self._channel)
+                psconn.get_message(timeout=self._watch_interval)
+                if self._get_version() != self._snapshot.version:
+                    self._reload()
+            except Exception:
+                self._logger.exception('failed to watch settings')
+                psconn = None
+                self._watch_done.wait(self._watch_interval)
+
+
+class _Snapshot(object):
+    # Replaced as a whole on reload, so readers on the flow path always see
+    # a consistent set of networks, rules, matchers and min_flow without
+    # locking.
+    __slots__ = ('version', 'src_ignore', 'dst_ignore', 'src_matcher',
+                 'dst_matcher', 'min_flow', 'rules', 'rules_matcher')
+
+    def __init__(self, version, src_ignore, dst_ignore, min_flow, rules):
+        self.version = version
+        self.src_ignore = src_ignore
+        self.dst_ignore = dst_ignore
+        self.src_matcher = CIDRMatcher(src_ignore)
+        self.dst_matcher = CIDRMatcher(dst_ignore)
+        self.min_flow = min_flow
+        self.rules = rules
+        self.rules_matcher = RuleSet(rules)
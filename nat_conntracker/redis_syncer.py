@@ -1,26 +1,57 @@
+import asyncio
+import functools
 import json
+import struct
 import time
 
 import redis
 
+from . import metrics
+
 __all__ = ['RedisSyncer']
 
+BATCH_MAGIC = b'NCT\x01'
+# Batches of sampled counts carry the 1-in-N rate after the header.
+SAMPLED_BATCH_MAGIC = b'NCT\x02'
+_BATCH_HEADER = struct.Struct('!4sIH')
+_BATCH_SAMPLE_RATE = struct.Struct('!H')
+_BATCH_COUNT = struct.Struct('!I')
+
+_PUBLISH_SECONDS = metrics.REDIS_SECONDS.labels('publish')
+
 
 class RedisSyncer(object):
-    def __init__(self, logger, channel, conn_url='redis://localhost:6379/0'):
+    def __init__(self,
+                 logger,
+                 channel,
+                 conn_url='redis://localhost:6379/0',
+                 encoding='json',
+                 max_batch=100):
         self._logger = logger
         self._channel = channel
         self._conn = redis.from_url(conn_url)
+        self._encoding = encoding
+        self._max_batch = max_batch
+
+    def pub(self, threshold, src, dst, count, sample_rate=1):
+        msg = {'threshold': threshold, 'src': src, 'dst': dst, 'count': count}
+        if sample_rate > 1:
+            msg['sample_rate'] = sample_rate
+        return self._conn.publish(self._channel, json.dumps(msg))
+
+    def pub_batch(self, threshold, offenders, sample_rate=1):
+        if not offenders:
+            return 0
 
-    def pub(self, threshold, src, dst, count):
-        return self._conn.publish(
-            self._channel,
-            json.dumps({
-                'threshold': threshold,
-                'src': src,
-                'dst': dst,
-                'count': count
-            }))
+        encode = _encode_binary if self._encoding == 'binary' else _encode_json
+        pipe = self._conn.pipeline(transaction=False)
+        for i in range(0, len(offenders), self._max_batch):
+            pipe.publish(
+                self._channel,
+                encode(threshold, offenders[i:i + self._max_batch],
+                       sample_rate))
+        with _PUBLISH_SECONDS.time():
+            return sum(pipe.execute())
 
     def sub(self, interval=0.01, is_done=None):
         is_done = is_done if is_done is not None else lambda: False
@@ -32,17 +63,97 @@ class RedisSyncer(object):
                 break
             time.sleep(interval)
 
+    async def asub(self, done, timeout=1.0):
+        loop = asyncio.get_event_loop()
+        psconn = self._conn.pubsub(ignore_subscribe_messages=True)
+        psconn.subscribe(**{self._channel: self._handle_message})
+        # get_message blocks on the pubsub socket for up to timeout, so
+        # messages are handled as they arrive without sleep-polling.
+        get_message = functools.partial(psconn.get_message, timeout=timeout)
+        while not done.is_set():
+            await loop.run_in_executor(None, get_message)
+
     def _handle_message(self, message):
         if message['type'] != 'message':
             return
 
         try:
-            msg = json.loads(message['data'].decode('utf-8'))
-            self._logger.warn(
-                ('over threshold={threshold} src={src} dst={dst} '
-                 'count={count} source=sync').format(**msg))
+            for msg in _decode(message['data']):
+                sample_rate = msg.get('sample_rate', 1)
+                self._logger.warn(
+                    ('over threshold={threshold} src={src} dst={dst} '
+                     'count={count} source=sync').format(**msg) +
+                    (f' sample_rate=1/{sample_rate}'
+                     if sample_rate > 1 else ''))
         except Exception:
             self._logger.exception('failed to handle message')
 
     def ping(self):
         return self._conn.ping()
+
+
+def _encode_json(threshold, offenders, sample_rate=1):
+    msg = {
+        'threshold':
+        threshold,
+        'batch': [{
+            'src': src,
+            'dst': dst,
+            'count': count
+        } for (src, dst, count) in offenders]
+    }
+    if sample_rate > 1:
+        msg['sample_rate'] = sample_rate
+    return json.dumps(msg)
+
+
+def _encode_binary(threshold, offenders, sample_rate=1):
+    magic = SAMPLED_BATCH_MAGIC if sample_rate > 1 else BATCH_MAGIC
+    parts = [_BATCH_HEADER.pack(magic, threshold, len(offenders))]
+    if sample_rate > 1:
+        parts.append(_BATCH_SAMPLE_RATE.pack(sample_rate))
+    for (src, dst, count) in offenders:
+        for value in (src.encode('utf-8'), dst.encode('utf-8')):
+            parts.append(bytes((len(value), )))
+            parts.append(value)
+        parts.append(_BATCH_COUNT.pack(count))
+    return b''.join(parts)
+
+
+def _decode(data):
+    if data.startswith(BATCH_MAGIC) or data.startswith(SAMPLED_BATCH_MAGIC):
+        return _decode_binary(data)
+
+    msg = json.loads(data.decode('utf-8'))
+    if 'batch' not in msg:
+        return [msg]
+    extra = {'threshold': msg['threshold']}
+    if 'sample_rate' in msg:
+        extra['sample_rate'] = msg['sample_rate']
+    return [dict(item, **extra) for item in msg['batch']]
+
+
+def _decode_binary(data):
+    (magic, threshold, n) = _BATCH_HEADER.unpack_from(data)
+    offset = _BATCH_HEADER.size
+    sample_rate = 1
+    if magic == SAMPLED_BATCH_MAGIC:
+        (sample_rate, ) = _BATCH_SAMPLE_RATE.unpack_from(data, offset)
+        offset += _BATCH_SAMPLE_RATE.size
+    msgs = []
+    for _ in range(n):
+        fields = []
+        for _ in range(2):
+            length = data[offset]
+            fields.append(data[offset + 1:offset + 1 + length].decode('utf-8'))
+            offset += 1 + length
+        (count, ) = _BATCH_COUNT.unpack_from(data, offset)
+        offset += _BATCH_COUNT.size
+        msgs.append({
+            'threshold': threshold,
+            'src': fields[0],
+            'dst': fields[1],
+            'count': count,
+            'sample_rate': sample_rate
+        })
+    return msgs
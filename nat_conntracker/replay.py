@@ -0,0 +1,145 @@
+import bz2
+import gzip
+import json
+import sys
+import time
+
+from .record_reader import RecordReader
+from .streaming_flow_parser import StreamingFlowParser
+
+__all__ = ['Replay', 'open_capture']
+
+
+def open_capture(path):
+    if path == '-':
+        return sys.stdin.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+class Replay(object):
+    # Sits between the parser and the Conntracker so that evaluation windows
+    # follow the capture's event timestamps instead of the wall clock.
+    def __init__(self,
+                 conntracker,
+                 stats,
+                 logger,
+                 out=None,
+                 threshold=100,
+                 top_n=10,
+                 interval=60,
+                 report_format='text',
+                 read_size=65536):
+        self._conntracker = conntracker
+        self._stats = stats
+        self._logger = logger
+        self._out = out if out is not None else sys.stdout
+        self._threshold = threshold
+        self._top_n = top_n
+        self._interval = max(int(interval), 1)
+        self._format = report_format
+        self._read_size = read_size
+        self._window = None
+        self._window_flows = 0
+        self.flows = 0
+        self.windows = 0
+        self.crossings = 0
+
+    def replay(self, stream):
+        if self._read_size > 0:
+            stream = RecordReader(stream, read_size=self._read_size)
+        StreamingFlowParser(self, self._logger).handle_events(stream)
+
+    def finish(self):
+        if self._window_flows > 0:
+            self._report()
+        self._emit({
+            'summary': True,
+            'flows': self.flows,
+            'windows': self.windows,
+            'crossings': self.crossings
+        }, f'summary flows={self.flows} windows={self.windows} '
+                   f'crossings={self.crossings}')
+
+    def handle_flow(self, flow):
+        if flow is None or flow.flowtype != 'new':
+            return
+
+        # Flows without a timestamp, or that arrive out of order, are
+        # counted into the window that is currently open.
+        timestamp = flow.timestamp
+        if timestamp is not None:
+            window = int(timestamp // self._interval)
+            if self._window is None:
+                self._window = window
+            elif window > self._window:
+                self._report()
+                self._window = window
+
+        self.flows += 1
+        self._window_flows += 1
+        self._conntracker.handle_flow(flow)
+
+    def _report(self):
+        self.windows += 1
+        (start, end) = (None, None)
+        if self._window is not None:
+            start = self._window * self._interval
+            end = start + self._interval
+        top = self._stats.top(n=self._top_n)
+        crossings = [(src, dst, count) for ((src, dst), count) in top
+                     if count >= self._threshold]
+        self.crossings += len(crossings)
+
+        if self._format == 'json':
+            self._emit_json({
+                'start':
+                None if start is None else _format_time(start),
+                'end':
+                None if end is None else _format_time(end),
+                'flows':
+                self._window_flows,
+                'top': [{
+                    'src': src,
+                    'dst': dst,
+                    'count': count
+                } for ((src, dst), count) in top],
+                'threshold':
+                self._threshold,
+                'crossings':
+                len(crossings)
+            })
+        else:
+            self._write(f'window start={_format_time(start)} '
+                        f'end={_format_time(end)} '
+                        f'flows={self._window_flows}')
+            for i, ((src, dst), count) in enumerate(top):
+                self._write(f'  top {i + 1}/{len(top)} src={src} dst={dst} '
+                            f'count={count}')
+            for (src, dst, count) in crossings:
+                self._write(f'  over threshold={self._threshold} src={src} '
+                            f'dst={dst} count={count}')
+
+        self._window_flows = 0
+        self._stats.reset()
+
+    def _emit(self, obj, text):
+        if self._format == 'json':
+            self._emit_json(obj)
+        else:
+            self._write(text)
+
+    def _emit_json(self, obj):
+        self._write(json.dumps(obj, sort_keys=True))
+
+    def _write(self, line):
+        self._out.write(line + '\n')
+
+
+def _format_time(timestamp):
+    if timestamp is None:
+        return '-'
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(timestamp))
@@ -0,0 +1,133 @@
+from collections import namedtuple
+from ipaddress import ip_network
+
+from .cidr_matcher import pack_network
+from .flow_key import NO_PORT
+
+__all__ = ['Rule', 'RuleSet', 'format_rule', 'load_rules', 'parse_rule']
+
+Rule = namedtuple('Rule', ['threshold', 'dport', 'dst', 'src'])
+
+_FIELDS = ('threshold', 'dport', 'dst', 'src')
+
+
+def parse_rule(line):
+    # Rules are written as space separated fields, as in
+    # "threshold=20 dport=25 dst=0.0.0.0/0 src=10.0.0.0/8", and anything
+    # other than threshold may be left out to match every value.
+    fields = {}
+    for field in line.split():
+        (name, sep, value) = field.partition('=')
+        if not sep or name not in _FIELDS or name in fields:
+            raise ValueError(f'invalid rule field {field!r}')
+        fields[name] = value
+
+    if 'threshold' not in fields:
+        raise ValueError(f'rule without threshold {line!r}')
+    threshold = int(fields['threshold'])
+    dport = fields.get('dport')
+    if dport is not None:
+        dport = int(dport)
+        if not 0 <= dport <= 65535:
+            raise ValueError(f'invalid rule dport={dport}')
+    dst = fields.get('dst')
+    src = fields.get('src')
+    return Rule(threshold, dport,
+                ip_network(dst) if dst is not None else None,
+                ip_network(src) if src is not None else None)
+
+
+def format_rule(rule):
+    return ' '.join(f'{name}={value}' for (name, value) in zip(_FIELDS, rule)
+                    if value is not None)
+
+
+def load_rules(path):
+    rules = []
+    with open(path) as inp:
+        for (lineno, line) in enumerate(inp, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                rules.append(parse_rule(line))
+            except ValueError as exc:
+                raise ValueError(f'{path}:{lineno}: {exc}')
+    return rules
+
+
+def _prefix(net):
+    if net is None:
+        return (0, 0)
+    return pack_network(net)
+
+
+def _specificity(rule):
+    return (rule.dport is None, -_prefix(rule.dst)[1], -_prefix(rule.src)[1],
+            rule.threshold)
+
+
+class RuleSet(object):
+    # Rules are ordered from most to least specific (dport, then dst and src
+    # prefix length) and rule i is bit i of a mask. Each dimension compiles
+    # to masks of the rules it allows: a list indexed by dport and, for dst
+    # and src, one dict per distinct prefix length keyed by masked prefix,
+    # in the manner of CIDRMatcher. The lowest bit set in all three masks
+    # is the most specific matching rule.
+    def __init__(self, rules=()):
+        self.rules = tuple(sorted(set(rules), key=_specificity))
+
+        any_port = 0
+        for (i, rule) in enumerate(self.rules):
+            if rule.dport is None:
+                any_port |= 1 << i
+        self._any_port = any_port
+        self._ports = [any_port] * 65536
+        for (i, rule) in enumerate(self.rules):
+            if rule.dport is not None:
+                self._ports[rule.dport] |= 1 << i
+
+        self._dst = self._index(rule.dst for rule in self.rules)
+        self._src = self._index(rule.src for rule in self.rules)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} rules={len(self.rules)!r} ' \
+                f'dst_prefixlens={len(self._dst)!r} ' \
+                f'src_prefixlens={len(self._src)!r}>'
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, key):
+        if not self.rules:
+            return None
+        mask = self._any_port if key.dport == NO_PORT else \
+            self._ports[key.dport]
+        if mask:
+            mask &= _lookup(self._dst, key.dst)
+        if mask:
+            mask &= _lookup(self._src, key.src)
+        if not mask:
+            return None
+        return self.rules[(mask & -mask).bit_length() - 1]
+
+    def threshold(self, key, default):
+        rule = self.match(key)
+        return rule.threshold if rule is not None else default
+
+    def _index(self, networks):
+        by_prefixlen = {}
+        for (i, net) in enumerate(networks):
+            (prefix, prefixlen) = _prefix(net)
+            table = by_prefixlen.setdefault(prefixlen, {})
+            key = prefix >> (128 - prefixlen)
+            table[key] = table.get(key, 0) | (1 << i)
+        return tuple((128 - prefixlen, table)
+                     for (prefixlen, table) in sorted(by_prefixlen.items()))
+
+
+def _lookup(index, addr):
+    mask = 0
+    for (shift, table) in index:
+        mask |= table.get(addr >> shift, 0)
+    return mask
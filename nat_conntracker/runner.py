@@ -21,6 +21,7 @@ class Runner(object):
 
         try:
             signal.signal(signal.SIGUSR1, self._conntracker.dump_state)
+            signal.signal(signal.SIGTERM, self._terminate)
             self._logger.info('entering sample loop '
                               'threshold={} top_n={} eval_interval={}'.format(
                                   self._args['conn_threshold'],
@@ -31,17 +32,30 @@ class Runner(object):
             self._logger.warn('interrupt')
         finally:
             signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
             self._logger.info('cleaning up')
             self._done = True
-            self._conntracker.sample(self._args['conn_threshold'],
-                                     self._args['top_n'])
+            # A checkpointed partial interval is sampled after the next
+            # start instead, so that its crossings are not alerted twice.
+            if not self._conntracker.checkpoint():
+                self._conntracker.sample(self._args['conn_threshold'],
+                                         self._args['top_n'])
             self._conntracker.cleanup()
             self._join()
 
+    def _terminate(self, *_):
+        # Shut down through the same path as an interrupt.
+        raise KeyboardInterrupt
+
     def _run_sample_loop(self):
+        # Restored counts are completed by a full interval of new ones
+        # before the first sample checks and resets them.
+        restored = self._conntracker.restored > 0
         while True:
-            self._conntracker.sample(self._args['conn_threshold'],
-                                     self._args['top_n'])
+            if not restored:
+                self._conntracker.sample(self._args['conn_threshold'],
+                                         self._args['top_n'])
+            restored = False
             nextloop = time.time() + self._args['eval_interval']
             while time.time() < nextloop:
                 self._join()
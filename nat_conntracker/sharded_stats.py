@@ -0,0 +1,145 @@
+import threading
+import time
+
+from collections import Counter
+
+from .flow_key import format_top
+from .stats import TOP_SIZE, Stats
+
+__all__ = ['ShardedStats']
+
+
+class ShardedStats(object):
+    def __init__(self,
+                 max_size=1000,
+                 top_size=TOP_SIZE,
+                 batch_size=256,
+                 flush_interval=0.5,
+                 clock=time.monotonic):
+        self.max_size = max_size
+        self.top_size = top_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._local = threading.local()
+        # _lock only guards the swap of the active buffer and batch merges
+        # into it; producers otherwise count into thread-local shards.
+        self._lock = threading.Lock()
+        self._active = Stats(max_size=max_size, top_size=top_size)
+        self._snapshot_lock = threading.Lock()
+        self._frozen = None
+        self._shards = []
+
+    def __repr__(self):
+        return '<{} max_size={!r} batch_size={!r}>'.format(
+            self.__class__.__name__, self.max_size, self.batch_size)
+
+    def __len__(self):
+        # Counted without swapping the active buffer, so keys both frozen
+        # and active since are counted twice.
+        frozen = self._frozen
+        return len(self._active) + (len(frozen) if frozen is not None else 0)
+
+    def top(self, n=10):
+        return format_top(self.top_keys(n=n))
+
+    def top_keys(self, n=10):
+        try:
+            self._snapshot_lock.acquire()
+            return self._snapshot().top_keys(n=n)
+        finally:
+            self._snapshot_lock.release()
+
+    def items(self):
+        # Unlike top_keys() this leaves the active buffer in place, and it
+        # also includes counts that producers have not flushed yet.
+        total = Counter()
+        try:
+            self._snapshot_lock.acquire()
+            if self._frozen is not None:
+                total.update(dict(self._frozen.items()))
+        finally:
+            self._snapshot_lock.release()
+        try:
+            self._lock.acquire()
+            total.update(dict(self._active.items()))
+            shards = list(self._shards)
+        finally:
+            self._lock.release()
+        for shard in shards:
+            total.update(_copy(shard.counter))
+        return list(total.items())
+
+    def reset(self):
+        # Only the frozen snapshot is discarded; anything flushed since the
+        # last top() is already counting towards the next interval.
+        try:
+            self._snapshot_lock.acquire()
+            self._frozen = None
+        finally:
+            self._snapshot_lock.release()
+
+    def add(self, key, count=1):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard(self._clock())
+            try:
+                self._lock.acquire()
+                self._shards.append(shard)
+            finally:
+                self._lock.release()
+
+        shard.counter[key] += count
+        shard.adds += 1
+        if shard.adds >= self.batch_size or \
+                self._clock() - shard.flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None or not shard.counter:
+            return
+
+        counter = shard.counter
+        shard.counter = Counter()
+        shard.adds = 0
+        shard.flushed = self._clock()
+        try:
+            self._lock.acquire()
+            self._active.merge(counter.items())
+        finally:
+            self._lock.release()
+
+    def _snapshot(self):
+        fresh = Stats(max_size=self.max_size, top_size=self.top_size)
+        try:
+            self._lock.acquire()
+            (swapped, self._active) = (self._active, fresh)
+        finally:
+            self._lock.release()
+
+        if self._frozen is None:
+            self._frozen = swapped
+        else:
+            self._frozen.merge(swapped.counter.items())
+        return self._frozen
+
+
+def _copy(counter):
+    # Shards are counted into by their producer thread without a lock, so a
+    # copy is retried if the producer adds a key while it is being made.
+    while True:
+        try:
+            return dict(counter)
+        except RuntimeError:
+            continue
+
+
+class _Shard(object):
+    __slots__ = ('counter', 'adds', 'flushed')
+
+    def __init__(self, flushed):
+        self.counter = Counter()
+        self.adds = 0
+        self.flushed = flushed
@@ -0,0 +1,108 @@
+import heapq
+
+from operator import itemgetter
+from threading import Lock
+
+from .flow_key import format_top
+
+__all__ = ['SpaceSavingStats']
+
+
+class SpaceSavingStats(object):
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.evictions = 0
+        self._lock = Lock()
+        self._clear()
+
+    def __repr__(self):
+        return '<{} max_size={!r} min_count={!r}>'.format(
+            self.__class__.__name__, self.max_size, self._min)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def top(self, n=10):
+        return format_top(self.top_keys(n=n))
+
+    def top_keys(self, n=10):
+        try:
+            self._lock.acquire()
+            return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+        finally:
+            self._lock.release()
+
+    def items(self):
+        try:
+            self._lock.acquire()
+            return list(self.counts.items())
+        finally:
+            self._lock.release()
+
+    def error(self, key):
+        # Reported counts overestimate the true count by at most the count
+        # inherited from the evicted key, which is recorded per key.
+        try:
+            self._lock.acquire()
+            return self.errors.get(key, self._min)
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        try:
+            self._lock.acquire()
+            self._clear()
+        finally:
+            self._lock.release()
+
+    def add(self, key, count=1):
+        try:
+            self._lock.acquire()
+            self._add(key, count)
+        finally:
+            self._lock.release()
+
+    def _clear(self):
+        self.counts = {}
+        self.errors = {}
+        # Stream-Summary: keys grouped by count so that a key with the
+        # minimum count can be found and replaced in O(1).
+        self._buckets = {}
+        self._min = 0
+
+    def _add(self, key, count):
+        counts = self.counts
+        buckets = self._buckets
+        emptied_min = False
+
+        current = counts.get(key)
+        if current is None:
+            current = 0
+            if len(counts) >= self.max_size:
+                bucket = buckets[self._min]
+                victim = bucket.pop()
+                if not bucket:
+                    del buckets[self._min]
+                    emptied_min = True
+                current = counts.pop(victim)
+                del self.errors[victim]
+                self.evictions += 1
+            self.errors[key] = current
+        else:
+            bucket = buckets[current]
+            bucket.discard(key)
+            if not bucket:
+                del buckets[current]
+                emptied_min = current == self._min
+
+        new = current + count
+        counts[key] = new
+        bucket = buckets.get(new)
+        if bucket is None:
+            bucket = buckets[new] = set()
+        bucket.add(key)
+
+        if emptied_min:
+            self._min = new if count == 1 else min(buckets)
+        elif len(counts) == 1 or new < self._min:
+            self._min = new
@@ -1,28 +1,63 @@
-from collections import Counter, OrderedDict
+import heapq
+
+from collections import Counter, deque
+from operator import itemgetter
 from threading import Lock
 
-__all__ = ['Stats']
+from .flow_key import format_top
+from .top_heap import TopHeap
+
+__all__ = ['Stats', 'TOP_SIZE']
+
+# The number of top candidates kept incrementally, which callers reading
+# more than this from Stats.top_keys pay for with a scan of the table.
+TOP_SIZE = 100
 
 
 class Stats(object):
-    def __init__(self, max_size=1000):
+    def __init__(self, max_size=1000, top_size=TOP_SIZE):
         self.max_size = max_size
         self.counter = Counter()
-        self.index = OrderedDict()
+        self.index = deque()
+        self.evictions = 0
+        # The largest counts are kept as they are added so that reading
+        # them holds the lock for the candidates only, not the whole table.
+        self.candidates = TopHeap(min(top_size, max_size))
         self._lock = Lock()
 
     def __repr__(self):
         return '<{} max_size={!r}>'.format(self.__class__.__name__,
                                            self.max_size)
 
+    def __len__(self):
+        return len(self.counter)
+
     def top(self, n=10):
+        return format_top(self.top_keys(n=n))
+
+    def top_keys(self, n=10):
+        try:
+            self._lock.acquire()
+            if n is None or n > self.candidates.size:
+                return self.counter.most_common(n)
+            candidates = self.candidates
+            if candidates.dirty and len(self.counter) > len(candidates):
+                candidates.rebuild(
+                    heapq.nlargest(
+                        candidates.size,
+                        self.counter.items(),
+                        key=itemgetter(1)))
+            items = candidates.items()
+        finally:
+            self._lock.release()
+        items.sort(key=lambda item: (-item[1], item[2]))
+        return [(key, count) for (key, count, _) in items[:n]]
+
+    def items(self):
+        # A copy of every (key, count) pair, without sorting, for export.
         try:
             self._lock.acquire()
-            ret = []
-            for key, count in self.counter.most_common(n):
-                (src, dst) = self.index[key]
-                ret.append(((src.host, self._daddr(dst)), count))
-            return ret
+            return list(self.counter.items())
         finally:
             self._lock.release()
 
@@ -30,27 +65,43 @@ class Stats(object):
         try:
             self._lock.acquire()
             self.counter = Counter()
-            self.index = OrderedDict()
+            self.index = deque()
+            self.candidates.clear()
         finally:
             self._lock.release()
 
-    def add(self, src, dst):
+    def add(self, key, count=1):
         try:
             self._lock.acquire()
-            while len(self.index) > self.max_size:
-                item_key, _ = self.index.popitem(last=False)
-                del self.counter[item_key]
-            key = self._key(src, dst)
-            self.counter[key] += 1
-            self.index[key] = (src, dst)
+            self._add(key, count)
         finally:
             self._lock.release()
 
-    def _key(self, src, dst):
-        return '{}_{}'.format(src.host, self._daddr(dst))
+    def merge(self, counts):
+        try:
+            self._lock.acquire()
+            for (key, count) in counts:
+                self._add(key, count)
+        finally:
+            self._lock.release()
 
-    def _daddr(self, dst):
-        dport = dst.port
-        if dport == '':
-            dport = '?'
-        return '{}:{}'.format(dst.host, dport)
+    def _add(self, key, count):
+        if key not in self.counter:
+            # Candidates are moved to the back of the index rather than
+            # evicted, so churn through a full table evicts the oldest light
+            # keys and the heap stays exact without a rebuild. Once every
+            # candidate has been passed over, the oldest key goes anyway.
+            passed = 0
+            while len(self.index) >= self.max_size:
+                evicted = self.index.popleft()
+                if evicted in self.candidates and \
+                        passed < len(self.candidates):
+                    self.index.append(evicted)
+                    passed += 1
+                    continue
+                del self.counter[evicted]
+                self.candidates.remove(evicted)
+                self.evictions += 1
+            self.index.append(key)
+        self.counter[key] += count
+        self.candidates.update(key, self.counter[key])
@@ -0,0 +1,124 @@
+from xml.parsers.expat import ExpatError, ParserCreate
+
+from . import metrics
+from .flow_parser import (WHEN_TAGS, Flow, FlowAddress, FlowMetaGeneric,
+                          FlowMetaIndependent, FlowMetaOrigReply,
+                          when_timestamp)
+
+__all__ = ['StreamingFlowParser']
+
+_LINES = metrics.LINES.labels()
+_PARSE_ERRORS = metrics.PARSE_ERRORS.labels('expat')
+
+_DATA_TAGS = frozenset(('src', 'dst', 'sport', 'dport', 'id'))
+_WHEN_TAGS = frozenset(WHEN_TAGS)
+
+
+class StreamingFlowParser(object):
+    def __init__(self, conntracker, logger):
+        self._conntracker = conntracker
+        self._logger = logger
+        self._parser = None
+        self._reset()
+
+    def handle_events(self, stream, is_done=None):
+        is_done = is_done if is_done is not None else lambda: False
+        for line in stream:
+            _LINES.inc()
+            try:
+                self.feed(line)
+            except ExpatError as experr:
+                _PARSE_ERRORS.inc()
+                self._logger.debug(f'expat error: {experr}')
+                self._reset()
+            finally:
+                self._logger.debug(f'checking is_done={is_done()}')
+                if is_done():
+                    return
+
+    def feed(self, line):
+        # The XML declaration is only valid at the very start of a document,
+        # and the parser is primed with its own root element, so any
+        # declaration seen in the stream is skipped.
+        if line.lstrip()[:5] in ('<?xml', b'<?xml'):
+            return
+        self._parser.Parse(line, False)
+
+    def _reset(self):
+        self._flow = None
+        self._meta = None
+        self._tag = None
+        self._data = {}
+        self._when = None
+
+        parser = ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start_element
+        parser.EndElementHandler = self._end_element
+        parser.CharacterDataHandler = self._character_data
+        # A synthetic root element allows a stream of <flow> elements with or
+        # without the enclosing <conntrack> element.
+        parser.Parse('<stream>', False)
+        self._parser = parser
+
+    def _start_element(self, name, attrs):
+        if name == 'flow':
+            self._flow = Flow()
+            self._flow.flowtype = attrs.get('type', '')
+            return
+
+        if self._flow is None:
+            return
+
+        if name == 'meta':
+            self._meta = attrs.get('direction', '')
+            self._data = {}
+        elif name == 'assured' and self._meta is not None:
+            self._data['assured'] = True
+        elif name in _DATA_TAGS and self._meta is not None:
+            self._tag = name
+        elif name == 'when':
+            self._when = {}
+        elif name in _WHEN_TAGS and self._when is not None:
+            self._tag = name
+
+    def _end_element(self, name):
+        self._tag = None
+
+        if name == 'meta' and self._flow is not None:
+            self._flow.meta.append(self._build_meta())
+            self._meta = None
+        elif name == 'when' and self._flow is not None:
+            self._flow.timestamp = when_timestamp(self._when)
+            self._when = None
+        elif name == 'flow' and self._flow is not None:
+            flow = self._flow
+            self._flow = None
+            self._conntracker.handle_flow(flow)
+
+    def _character_data(self, data):
+        if self._tag is not None:
+            # Mirror FlowParser by keeping the first text seen for each tag.
+            if self._when is not None:
+                self._when.setdefault(self._tag, data)
+            else:
+                self._data.setdefault(self._tag, data)
+
+    def _build_meta(self):
+        data = self._data
+        if self._meta in ('original', 'reply'):
+            meta = FlowMetaOrigReply()
+            meta.direction = self._meta
+            meta.src = FlowAddress(data.get('src', ''), data.get('sport', ''))
+            meta.dst = FlowAddress(data.get('dst', ''), data.get('dport', ''))
+            return meta
+
+        if self._meta == 'independent':
+            meta = FlowMetaIndependent()
+            meta.id = data.get('id', '')
+            meta.assured = data.get('assured', False)
+            return meta
+
+        meta = FlowMetaGeneric()
+        meta.direction = self._meta
+        return meta
@@ -0,0 +1,121 @@
+__all__ = ['TopHeap']
+
+
+class TopHeap(object):
+    # An indexed min-heap of the size largest counts seen through update().
+    # Counts only grow between resets, so a key that is not in the heap
+    # never outranks its minimum, except after remove() leaves a vacancy
+    # that only the next update() fills. Callers that need exact results
+    # check the dirty flag and rebuild from their full table. Keys are
+    # numbered as they enter so that ties can be read back in that order.
+    def __init__(self, size=100):
+        self.size = size
+        self.dirty = False
+        self._keys = []
+        self._counts = []
+        self._pos = {}
+        self._order = {}
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def items(self):
+        # Returns unsorted (key, count, order) tuples.
+        order = self._order
+        return [(key, count, order[key])
+                for (key, count) in zip(self._keys, self._counts)]
+
+    def clear(self):
+        self.dirty = False
+        self._keys = []
+        self._counts = []
+        self._pos = {}
+        self._order = {}
+
+    def rebuild(self, items):
+        self.clear()
+        for (key, count) in items:
+            self.update(key, count)
+
+    def update(self, key, count):
+        pos = self._pos.get(key)
+        if pos is not None:
+            self._counts[pos] = count
+            self._sift_down(pos)
+            return
+
+        if len(self._keys) < self.size:
+            self._seq += 1
+            self._order[key] = self._seq
+            self._keys.append(key)
+            self._counts.append(count)
+            self._pos[key] = len(self._keys) - 1
+            self._sift_up(len(self._keys) - 1)
+            return
+
+        if count > self._counts[0]:
+            del self._pos[self._keys[0]]
+            del self._order[self._keys[0]]
+            self._seq += 1
+            self._order[key] = self._seq
+            self._keys[0] = key
+            self._counts[0] = count
+            self._pos[key] = 0
+            self._sift_down(0)
+
+    def remove(self, key):
+        pos = self._pos.pop(key, None)
+        if pos is None:
+            return
+        del self._order[key]
+        self.dirty = True
+        last_key = self._keys.pop()
+        last_count = self._counts.pop()
+        if pos == len(self._keys):
+            return
+        self._keys[pos] = last_key
+        self._counts[pos] = last_count
+        self._pos[last_key] = pos
+        self._sift_down(pos)
+        self._sift_up(pos)
+
+    def _sift_up(self, pos):
+        keys = self._keys
+        counts = self._counts
+        (key, count) = (keys[pos], counts[pos])
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if counts[parent] <= count:
+                break
+            keys[pos] = keys[parent]
+            counts[pos] = counts[parent]
+            self._pos[keys[pos]] = pos
+            pos = parent
+        keys[pos] = key
+        counts[pos] = count
+        self._pos[key] = pos
+
+    def _sift_down(self, pos):
+        keys = self._keys
+        counts = self._counts
+        end = len(keys)
+        (key, count) = (keys[pos], counts[pos])
+        while True:
+            child = 2 * pos + 1
+            if child >= end:
+                break
+            if child + 1 < end and counts[child + 1] < counts[child]:
+                child += 1
+            if counts[child] >= count:
+                break
+            keys[pos] = keys[child]
+            counts[pos] = counts[child]
+            self._pos[keys[pos]] = pos
+            pos = child
+        keys[pos] = key
+        counts[pos] = count
+        self._pos[key] = pos
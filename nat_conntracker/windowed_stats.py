@@ -0,0 +1,100 @@
+import math
+import time
+
+from collections import Counter, deque
+from threading import Lock
+
+from .flow_key import format_top
+
+__all__ = ['WindowedStats']
+
+
+class WindowedStats(object):
+    def __init__(self,
+                 max_size=1000,
+                 window=60,
+                 bucket_width=5,
+                 clock=time.monotonic):
+        self.max_size = max_size
+        self.window = window
+        self.bucket_width = bucket_width
+        self._clock = clock
+        self._started = clock()
+        self._epoch = int(self._started // bucket_width)
+        # A fixed ring of buckets that are cleared and reused as the window
+        # slides rather than reallocated.
+        self._buckets = [
+            (Counter(), deque())
+            for _ in range(max(1, int(math.ceil(window / bucket_width))))
+        ]
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '<{} max_size={!r} window={!r} bucket_width={!r}>'.format(
+            self.__class__.__name__, self.max_size, self.window,
+            self.bucket_width)
+
+    def __len__(self):
+        # Keys counted in more than one bucket are counted once per bucket.
+        return sum(len(counter) for (counter, _) in self._buckets)
+
+    def top(self, n=10):
+        return format_top(self.top_keys(n=n))
+
+    def top_keys(self, n=10):
+        try:
+            self._lock.acquire()
+            self._advance()
+            total = Counter()
+            for (counter, _) in self._buckets:
+                total.update(counter)
+            return total.most_common(n)
+        finally:
+            self._lock.release()
+
+    def items(self):
+        try:
+            self._lock.acquire()
+            self._advance()
+            total = Counter()
+            for (counter, _) in self._buckets:
+                total.update(counter)
+            return list(total.items())
+        finally:
+            self._lock.release()
+
+    def rate(self, count):
+        now = self._clock()
+        span = min(now - self._started,
+                   (len(self._buckets) - 1) * self.bucket_width +
+                   (now % self.bucket_width))
+        return count / max(span, 1e-9)
+
+    def reset(self):
+        # Counts age out of the trailing window as buckets are recycled, so
+        # there is nothing to reset at the end of each sample.
+        pass
+
+    def add(self, key, count=1):
+        try:
+            self._lock.acquire()
+            self._advance()
+            (counter, index) = self._buckets[self._epoch % len(self._buckets)]
+            if key not in counter:
+                while len(index) >= self.max_size:
+                    del counter[index.popleft()]
+                index.append(key)
+            counter[key] += count
+        finally:
+            self._lock.release()
+
+    def _advance(self):
+        epoch = int(self._clock() // self.bucket_width)
+        steps = min(epoch - self._epoch, len(self._buckets))
+        for step in range(1, steps + 1):
+            (counter,
+             index) = self._buckets[(self._epoch + step) % len(self._buckets)]
+            counter.clear()
+            index.clear()
+        if epoch > self._epoch:
+            self._epoch = epoch
@@ -0,0 +1,40 @@
+import asyncio
+import logging
+
+from nat_conntracker.__main__ import build_runner
+from nat_conntracker.async_runner import AsyncRunner
+from nat_conntracker.null_syncer import NullSyncer
+
+
+def test_async_runner_init():
+    runner = AsyncRunner(None, NullSyncer(), logging.getLogger())
+    assert runner is not None
+
+
+def test_async_runner_events_sample(events_sample, caplog):
+    events = open(events_sample, 'rb')
+    runner = build_runner(
+        events=events, conn_threshold=100, runtime='asyncio', parser='expat')
+    assert isinstance(runner, AsyncRunner)
+    with caplog.at_level(logging.INFO):
+        runner.run()
+
+    assert ' over threshold=100 src=10.10.0.7' in caplog.text
+    assert ' entering async sample loop' in caplog.text
+    assert ' cleaning up' in caplog.text
+
+
+def test_null_syncer_asub():
+    async def run():
+        done = asyncio.Event()
+        sub = asyncio.ensure_future(NullSyncer().asub(done))
+        await asyncio.sleep(0)
+        assert not sub.done()
+        done.set()
+        await asyncio.wait_for(sub, 1)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
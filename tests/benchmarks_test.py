@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks.suite import main, run_case
+
+
+@pytest.mark.parametrize('engine', ['fifo', 'sharded'])
+def test_benchmarks_run_case(engine):
+    args = {
+        'events': 'sample',
+        'repeat': 1,
+        'ignore_networks': 2,
+        'seed': 1,
+        'max_stats_size': 100,
+        'sample_every': 100,
+    }
+    result = run_case(args, 'fast', engine)
+    assert result['engine'] == engine
+    assert result['flows'] > 0
+    assert result['samples'] > 0
+
+
+def test_benchmarks_main_reports_failed_case(capsys):
+    # sample_every=0 makes the case raise in the child process.
+    assert main([
+        'suite', '--events=sample', '--repeat=1', '--parsers=fast',
+        '--engines=fifo', '--sample-every=0'
+    ]) == 1
+    assert 'case failed parser=fast engine=fifo' in capsys.readouterr().err
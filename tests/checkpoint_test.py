@@ -0,0 +1,126 @@
+import logging
+import os
+import struct
+
+import pytest
+
+from nat_conntracker.checkpoint import (CHECKPOINT_MAGIC, Checkpointer,
+                                        read_checkpoint, write_checkpoint)
+from nat_conntracker.conntracker import Conntracker
+from nat_conntracker.flow_key import NO_PORT, FlowKey, pack_host
+from nat_conntracker.mem_settings import MemSettings
+from nat_conntracker.null_healther import NullHealther
+from nat_conntracker.null_syncer import NullSyncer
+from nat_conntracker.sharded_stats import ShardedStats
+from nat_conntracker.stats import Stats
+
+ITEMS = [
+    (FlowKey(pack_host('10.0.0.1'), pack_host('1.3.3.7'), 443), 12),
+    (FlowKey(pack_host('fd00::1'), pack_host('2001:db8::7'), NO_PORT), 3),
+]
+
+
+def _checkpointer(path, now=1000.0, **kwargs):
+    return Checkpointer(
+        str(path), logging.getLogger(__name__), clock=lambda: now, **kwargs)
+
+
+def test_checkpoint_round_trip(tmpdir):
+    path = str(tmpdir.join('stats.ckpt'))
+    assert write_checkpoint(path, ITEMS, timestamp=1234.5) == 2
+    assert read_checkpoint(path) == (1234.5, ITEMS)
+    assert os.listdir(str(tmpdir)) == ['stats.ckpt']
+
+
+def test_checkpoint_rejects_bad_magic(tmpdir):
+    path = tmpdir.join('stats.ckpt')
+    path.write_binary(b'x' * 64)
+    with pytest.raises(ValueError):
+        read_checkpoint(str(path))
+
+
+def test_checkpoint_rejects_truncated(tmpdir):
+    path = str(tmpdir.join('stats.ckpt'))
+    write_checkpoint(path, ITEMS, timestamp=1.0)
+    with open(path, 'r+b') as inp:
+        inp.truncate(os.path.getsize(path) - 1)
+    with pytest.raises(ValueError):
+        read_checkpoint(path)
+
+
+def test_checkpoint_rejects_unknown_version(tmpdir):
+    path = str(tmpdir.join('stats.ckpt'))
+    write_checkpoint(path, ITEMS, timestamp=1.0)
+    with open(path, 'r+b') as inp:
+        inp.seek(len(CHECKPOINT_MAGIC))
+        inp.write(struct.pack('!H', 99))
+    with pytest.raises(ValueError):
+        read_checkpoint(path)
+
+
+@pytest.mark.parametrize('written,restored', [(990.0, 2), (600.0, 0),
+                                              (1100.0, 0)])
+def test_checkpointer_restore_by_age(tmpdir, written, restored):
+    path = tmpdir.join('stats.ckpt')
+    write_checkpoint(str(path), ITEMS, timestamp=written)
+    stats = Stats(max_size=10)
+    assert _checkpointer(path, max_age=300).restore(stats) == restored
+    assert len(stats.top_keys(n=10)) == restored
+
+
+def test_checkpointer_restore_missing(tmpdir):
+    stats = Stats(max_size=10)
+    assert _checkpointer(tmpdir.join('nope.ckpt')).restore(stats) == 0
+
+
+def test_conntracker_checkpoint_restore(tmpdir):
+    path = tmpdir.join('stats.ckpt')
+    stats = Stats(max_size=10)
+    for (key, count) in ITEMS:
+        stats.add(key, count)
+    checkpointer = _checkpointer(path)
+    conntracker = Conntracker(
+        logging.getLogger(__name__),
+        NullSyncer(),
+        MemSettings(),
+        NullHealther(),
+        stats,
+        checkpointer=checkpointer)
+    conntracker.checkpoint()
+    conntracker.cleanup()
+    assert checkpointer.writes == 1
+
+    restored = Stats(max_size=10)
+    assert _checkpointer(path).restore(restored) == 2
+    assert sorted(restored.top_keys(n=10)) == sorted(ITEMS)
+
+
+def test_checkpointer_write_sharded_stats(tmpdir):
+    stats = ShardedStats(batch_size=10, flush_interval=3600)
+    (key, _) = ITEMS[0]
+    stats.add(key, 4)
+    stats.flush()
+    stats.add(key, 2)
+    active = stats._active
+
+    checkpointer = _checkpointer(tmpdir.join('stats.ckpt'))
+    assert checkpointer.write(stats) == 1
+    assert stats._active is active
+    assert read_checkpoint(checkpointer.path)[1] == [(key, 6)]
+
+
+def test_checkpointer_rule_stats(tmpdir):
+    path = tmpdir.join('stats.ckpt')
+    (key, count) = ITEMS[0]
+    stats = Stats(max_size=10)
+    rule_stats = Stats(max_size=10)
+    stats.add(key, count)
+    rule_stats.add(key, count)
+    assert _checkpointer(path).write(stats, rule_stats=rule_stats) == 1
+    assert os.path.exists(str(path) + '.rules')
+
+    restored = Stats(max_size=10)
+    restored_rules = Stats(max_size=10)
+    assert _checkpointer(path).restore(
+        restored, rule_stats=restored_rules) == 1
+    assert restored_rules.top_keys(n=10) == [(key, count)]
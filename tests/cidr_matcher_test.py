@@ -0,0 +1,47 @@
+from ipaddress import ip_address, ip_network
+
+from nat_conntracker.cidr_matcher import CIDRMatcher, pack_address
+from nat_conntracker.mem_settings import MemSettings
+
+
+def test_cidr_matcher_empty():
+    matcher = CIDRMatcher()
+    assert len(matcher) == 0
+    assert ip_address('10.0.0.1') not in matcher
+
+
+def test_cidr_matcher_contains():
+    networks = [
+        ip_network('10.0.0.0/8'),
+        ip_network('192.168.1.0/24'),
+        ip_network('8.8.8.8/32'),
+        ip_network('2001:db8::/32'),
+    ]
+    matcher = CIDRMatcher(networks)
+    assert len(matcher) == 4
+
+    for addr in ('10.1.2.3', '192.168.1.77', '8.8.8.8', '2001:db8::1',
+                 '1.1.1.1', '192.168.2.1', '8.8.8.9', '2001:db9::1',
+                 '::a00:1'):
+        addr = ip_address(addr)
+        expected = any(
+            addr.version == net.version and addr in net for net in networks)
+        assert (addr in matcher) == expected
+        assert (pack_address(addr) in matcher) == expected
+
+
+def test_cidr_matcher_default_routes():
+    assert ip_address('1.2.3.4') in CIDRMatcher(['0.0.0.0/0'])
+    assert ip_address('::1') not in CIDRMatcher(['0.0.0.0/0'])
+    assert ip_address('::1') in CIDRMatcher(['::/0'])
+
+
+def test_mem_settings_matcher_rebuilds_on_change():
+    settings = MemSettings()
+    matcher = settings.src_ignore_matcher()
+    assert settings.src_ignore_matcher() is matcher
+    assert ip_address('10.1.1.1') not in matcher
+
+    settings.add_ignore_src('10.0.0.0/8')
+    assert settings.src_ignore_matcher() is not matcher
+    assert ip_address('10.1.1.1') in settings.src_ignore_matcher()
@@ -2,6 +2,8 @@ import logging
 import os
 import sys
 
+import pytest
+
 from ipaddress import ip_address
 
 from nat_conntracker.__main__ import (build_argument_parser, build_runner,
@@ -29,6 +31,16 @@ def test_build_argument_parser():
     assert args.include_privnets is True
 
 
+def test_build_argument_parser_ingest_queue():
+    env = {'NAT_CONNTRACKER_INGEST_POLICY': 'drop-oldest'}
+    args = build_argument_parser(env).parse_args(
+        ['--ingest-queue-size=10', '--load-shed-max-rate=16', '-'])
+
+    assert args.ingest_queue_size == 10
+    assert args.ingest_policy == 'drop-oldest'
+    assert args.load_shed_max_rate == 16
+
+
 class FakeArgs(object):
     def __init__(self):
         self.events = None
@@ -37,9 +49,8 @@ class FakeArgs(object):
         self.eval_interval = 1
 
 
-def test_run_events_sample(caplog):
-    events = open(
-        os.path.join(HERE, 'data', 'conntrack-events-sample.xml'), 'r')
+def test_run_events_sample(events_sample, caplog):
+    events = open(events_sample, 'r')
     runner = build_runner(events=events, conn_threshold=100, debug=True)
     with caplog.at_level(logging.DEBUG):
         runner.run()
@@ -51,6 +62,80 @@ def test_run_events_sample(caplog):
     assert ' cleaning up' in caplog.text
 
 
+@pytest.mark.parametrize('parser', ['minidom', 'expat', 'fast'])
+@pytest.mark.parametrize('read_size', [0, 4096])
+def test_run_events_sample_parsers(events_sample, caplog, parser, read_size):
+    events = open(events_sample, 'rb')
+    runner = build_runner(
+        events=events, conn_threshold=100, parser=parser, read_size=read_size)
+    with caplog.at_level(logging.INFO):
+        runner.run()
+
+    assert ' over threshold=100 src=10.10.0.7' in caplog.text
+    assert ' cleaning up' in caplog.text
+
+
+def test_run_events_sample_workers(events_sample, caplog):
+    events = open(events_sample, 'rb')
+    runner = build_runner(events=events, conn_threshold=100, workers=2)
+    with caplog.at_level(logging.INFO):
+        runner.run()
+
+    assert ' over threshold=100 src=10.10.0.7' in caplog.text
+
+
+@pytest.mark.parametrize('engine', ['fifo', 'sharded'])
+def test_build_runner_sizes_top_candidates(engine):
+    runner = build_runner(
+        events=open(os.devnull), top_n=250, stats_engine=engine)
+    stats = runner._conntracker._stats
+    assert type(runner._conntracker._rule_stats) is type(stats)
+    if engine == 'sharded':
+        stats = stats._active
+    assert stats.candidates.size == 250
+
+
+@pytest.mark.parametrize('policy', ['block', 'drop-non-new'])
+def test_run_events_sample_ingest_queue(events_sample, caplog, policy):
+    events = open(events_sample, 'rb')
+    runner = build_runner(
+        events=events,
+        conn_threshold=100,
+        ingest_queue_size=1024,
+        ingest_policy=policy)
+    with caplog.at_level(logging.INFO):
+        runner.run()
+
+    assert ' over threshold=100 src=10.10.0.7' in caplog.text
+
+
+@pytest.mark.parametrize('runtime', ['threads', 'asyncio'])
+def test_run_events_sample_ingest_queue_runtimes(events_sample, runtime):
+    events = open(events_sample, 'rb')
+    runner = build_runner(
+        events=events,
+        conn_threshold=100,
+        ingest_queue_size=1024,
+        runtime=runtime)
+    runner.run()
+
+    assert runner._conntracker._ingest_queue.received > 0
+
+
+def test_build_runner_ignores_ingest_queue_with_workers(caplog):
+    with caplog.at_level(logging.WARN):
+        runner = build_runner(
+            events=open(os.devnull),
+            workers=2,
+            ingest_queue_size=1024,
+            load_shed_max_rate=4)
+
+    if 'without shared memory' not in caplog.text:
+        assert 'ignoring ingest queue with workers' in caplog.text
+        assert runner._conntracker._ingest_queue is None
+        assert runner._conntracker._shedder is None
+
+
 def test_private_nets():
     assert len(PRIVATE_NETS) > 0
     covers_local = False
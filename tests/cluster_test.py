@@ -0,0 +1,126 @@
+import logging
+
+from nat_conntracker.cluster import Cluster, decode_member, encode_member
+from nat_conntracker.conntracker import Conntracker
+from nat_conntracker.flow_key import flow_key
+from nat_conntracker.flow_parser import FlowAddress
+from nat_conntracker.mem_settings import MemSettings
+from nat_conntracker.null_healther import NullHealther
+from nat_conntracker.null_syncer import NullSyncer
+from nat_conntracker.stats import Stats
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _key(src, dst, dport='443'):
+    return flow_key(FlowAddress(src, ''), FlowAddress(dst, dport))
+
+
+def _cluster(clock, role='node', top_k=100):
+    return Cluster(
+        logging.getLogger(__name__),
+        namespace='nat-conntracker-tests',
+        role=role,
+        interval=60,
+        top_k=top_k,
+        clock=clock)
+
+
+def test_cluster_member_round_trip():
+    key = _key('10.0.0.1', '2001:db8::1', '')
+    assert decode_member(encode_member(key)) == key
+    assert decode_member(encode_member(key).encode('ascii')) == key
+
+
+def test_cluster_merges_nodes():
+    clock = FakeClock()
+    node_a = _cluster(clock)
+    node_b = _cluster(clock)
+    aggregator = _cluster(clock, role='aggregator')
+
+    spread = _key('10.0.0.1', '1.3.3.7')
+    local = _key('10.0.0.2', '1.3.3.7')
+    assert node_a.push([(spread, 40), (local, 50)]) == 2
+    assert node_b.push([(spread, 40)]) == 1
+    assert aggregator.push([(spread, 40)]) == 1
+
+    # The current interval is still open to pushes.
+    assert aggregator.aggregate() == []
+
+    clock.now += 60
+    assert aggregator.aggregate(top_n=1) == [(spread, 120)]
+    # Each closed interval is only aggregated once.
+    assert aggregator.aggregate() == []
+    assert node_a.aggregate() == []
+
+
+def test_cluster_push_bounded_by_top_k():
+    clock = FakeClock()
+    node = _cluster(clock, top_k=2)
+    top_keys = [(_key(f'10.0.0.{i}', '1.3.3.7'), 10 - i) for i in range(5)]
+    assert node.push(top_keys) == 2
+    assert node.pushed == 2
+    assert node.push([]) == 0
+
+
+def test_cluster_aggregates_every_closed_interval():
+    clock = FakeClock(now=1200.0)
+    node = _cluster(clock)
+    aggregator = _cluster(clock, role='aggregator')
+    early = _key('10.0.0.1', '1.3.3.7')
+    late = _key('10.0.0.2', '1.3.3.7')
+
+    assert aggregator.aggregate() == []
+    assert node.push([(early, 40)]) == 1
+    clock.now += 60
+    assert node.push([(late, 30), (early, 10)]) == 2
+
+    # Two intervals close between aggregations.
+    clock.now += 60
+    assert aggregator.aggregate() == [(early, 40), (late, 30)]
+    assert aggregator.aggregate() == []
+
+
+def test_cluster_pushes_once_per_interval():
+    clock = FakeClock()
+    node = _cluster(clock)
+    aggregator = _cluster(clock, role='aggregator')
+    key = _key('10.0.0.1', '1.3.3.7')
+    assert node.push([(key, 40)]) == 1
+    # A final sample on shutdown within the same interval.
+    assert node.push([(key, 5)]) == 0
+
+    clock.now += 60
+    assert node.push([(key, 7)]) == 1
+    assert aggregator.aggregate() == [(key, 40)]
+
+
+def test_conntracker_sample_cluster(caplog):
+    clock = FakeClock()
+    node = _cluster(clock)
+    aggregator = _cluster(clock, role='aggregator')
+    stats = Stats()
+    ctr = Conntracker(
+        logging.getLogger(__name__),
+        NullSyncer(),
+        MemSettings(),
+        NullHealther(),
+        stats,
+        cluster=aggregator)
+
+    node.push([(_key('10.0.0.1', '1.3.3.7'), 30)])
+    stats.add(_key('10.0.0.1', '1.3.3.7'), 30)
+    ctr.sample(50, 10)
+    assert 'source=cluster' not in caplog.text
+
+    clock.now += 60
+    with caplog.at_level(logging.WARN):
+        ctr.sample(50, 10)
+    assert ('over threshold=50 src=10.0.0.1 dst=1.3.3.7:443 count=60 '
+            'source=cluster') in caplog.text
@@ -3,7 +3,10 @@ import logging
 import pytest
 
 from nat_conntracker.conntracker import Conntracker
-from nat_conntracker.flow_parser import Flow
+from nat_conntracker.flow_key import flow_key
+from nat_conntracker.flow_parser import Flow, FlowAddress
+from nat_conntracker.mem_settings import MemSettings
+from nat_conntracker.stats import Stats
 
 
 @pytest.fixture
@@ -26,3 +29,17 @@ def test_conntracker_handle_flow(empty_conntracker):
     empty_flow = Flow()
     empty_flow.flowtype = 'new'
     assert empty_conntracker.handle_flow(empty_flow) is None
+
+
+def test_conntracker_handle_counts():
+    settings = MemSettings()
+    settings.add_ignore_dst('1.2.3.0/24')
+    stats = Stats()
+    ctr = Conntracker(logging.getLogger(), None, settings, None, stats)
+
+    ignored = flow_key(
+        FlowAddress('10.0.0.1', ''), FlowAddress('1.2.3.4', '443'))
+    kept = flow_key(FlowAddress('10.0.0.1', ''), FlowAddress('5.6.7.8', '443'))
+    ctr.handle_counts([(ignored, 3), (kept, 4)])
+
+    assert stats.top() == [(('10.0.0.1', '5.6.7.8:443'), 4)]
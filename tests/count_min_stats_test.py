@@ -0,0 +1,49 @@
+import random
+
+from collections import Counter
+
+from nat_conntracker.count_min_stats import CountMinStats
+from nat_conntracker.flow_key import FlowKey
+
+
+def _key(i):
+    return FlowKey(i, i + 1, 443)
+
+
+def test_count_min_stats_init():
+    stats = CountMinStats(epsilon=0.01, delta=0.01)
+    assert stats.width == 272
+    assert stats.depth == 5
+    assert stats.top() == []
+    assert 'error=0' in repr(stats)
+    assert len(stats) == 0
+    assert stats.items() == []
+
+
+def test_count_min_stats_error_bound():
+    rand = random.Random(0)
+    stats = CountMinStats(max_size=20, epsilon=0.01, delta=0.01)
+    exact = Counter()
+    for _ in range(20000):
+        key = _key(int(rand.paretovariate(1.2)) % 5000)
+        exact[key] += 1
+        stats.add(key)
+
+    assert stats.total == 20000
+    assert stats.error_estimate() == 200
+    for (key, count) in exact.items():
+        est = stats.estimate(key)
+        assert count <= est <= count + stats.error_estimate()
+
+    heavy = [key for (key, _) in exact.most_common(5)]
+    assert [key for (key, _) in stats.top_keys(n=5)] == heavy
+    assert len(stats._candidates) == 20
+
+
+def test_count_min_stats_reset():
+    stats = CountMinStats(max_size=2)
+    stats.add(_key(1), count=3)
+    stats.reset()
+    assert stats.total == 0
+    assert stats.estimate(_key(1)) == 0
+    assert stats.top_keys() == []
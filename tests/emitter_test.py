@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+
+from nat_conntracker.emitter import AlertEmitter
+
+
+class FakeResolver(object):
+    def lookup(self, ip, callback=None):
+        return f'host-{ip}'
+
+
+class BlockingSyncer(object):
+    def __init__(self):
+        self.published = []
+        self.release = threading.Event()
+
+    def pub_batch(self, threshold, offenders, sample_rate=1):
+        self.release.wait(5)
+        self.published.append((threshold, offenders, sample_rate))
+        return 1
+
+
+def _emitter(syncer, max_pending):
+    return AlertEmitter(
+        logging.getLogger(__name__),
+        syncer,
+        FakeResolver(),
+        max_pending=max_pending)
+
+
+def test_emitter_inline(caplog):
+    syncer = BlockingSyncer()
+    syncer.release.set()
+    emitter = _emitter(syncer, 0)
+    with caplog.at_level(logging.WARN):
+        assert emitter.emit(5, [('over threshold=5 src=10.0.0.1', '10.0.0.1')],
+                            [('10.0.0.1', '1.3.3.7:443', 9)])
+
+    assert 'over threshold=5 src=10.0.0.1 hostname=host-10.0.0.1' in \
+        caplog.text
+    assert syncer.published == [(5, [('10.0.0.1', '1.3.3.7:443', 9)], 1)]
+
+
+def test_emitter_does_not_block_caller():
+    syncer = BlockingSyncer()
+    emitter = _emitter(syncer, 1)
+    offenders = [('10.0.0.1', '1.3.3.7:443', 9)]
+    alerts = [('over threshold=5 src=10.0.0.1', '10.0.0.1')]
+
+    # The worker holds the first batch in pub_batch, the second waits in
+    # the queue and the third is dropped, all without blocking.
+    assert emitter.emit(5, alerts, offenders, sample_rate=4)
+    while len(emitter) > 0:
+        time.sleep(0.01)
+    assert emitter.emit(5, alerts, offenders)
+    assert not emitter.emit(5, alerts, offenders)
+    assert emitter.dropped == 1
+
+    syncer.release.set()
+    emitter.close()
+    assert [rate for (_, _, rate) in syncer.published] == [4, 1]
+    assert emitter.emitted == 2
+
+
+def test_emitter_close_does_not_block_on_full_queue():
+    syncer = BlockingSyncer()
+    emitter = _emitter(syncer, 1)
+    offenders = [('10.0.0.1', '1.3.3.7:443', 9)]
+    alerts = [('over threshold=5 src=10.0.0.1', '10.0.0.1')]
+
+    assert emitter.emit(5, alerts, offenders)
+    while len(emitter) > 0:
+        time.sleep(0.01)
+    assert emitter.emit(5, alerts, offenders)
+
+    started = time.monotonic()
+    emitter.close(timeout=0.1)
+    assert time.monotonic() - started < 1
+
+    # The stuck batch finishes and the queued one is dropped.
+    syncer.release.set()
+    deadline = time.monotonic() + 5
+    while emitter.emitted == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert emitter.emitted == 1
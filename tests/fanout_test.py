@@ -0,0 +1,84 @@
+import logging
+
+import pytest
+
+from nat_conntracker.cidr_matcher import IPV4_MAPPED
+from nat_conntracker.conntracker import Conntracker
+from nat_conntracker.fanout import FanoutDetector, splitmix64
+from nat_conntracker.flow_key import NO_PORT, FlowKey
+from nat_conntracker.mem_settings import MemSettings
+from nat_conntracker.null_healther import NullHealther
+from nat_conntracker.null_syncer import NullSyncer
+from nat_conntracker.stats import Stats
+
+SRC = IPV4_MAPPED | 0x0a000001
+
+
+def test_splitmix64_spreads():
+    assert len({splitmix64(i) >> 56 for i in range(1024)}) > 200
+
+
+def test_fanout_detector_invalid_precision():
+    with pytest.raises(ValueError):
+        FanoutDetector(precision=20)
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 20000])
+def test_fanout_detector_estimate(distinct):
+    fanout = FanoutDetector(precision=10)
+    for i in range(distinct):
+        fanout.add(FlowKey(SRC, IPV4_MAPPED | i, 443))
+        # Repeated pairs must not inflate the estimate.
+        fanout.add(FlowKey(SRC, IPV4_MAPPED | i, 443))
+
+    [(src, dsts, dports)] = fanout.top()
+    assert src == '10.0.0.1'
+    assert abs(dsts - distinct) <= max(distinct * 0.1, 1)
+    assert dports == 1
+
+
+def test_fanout_detector_ports():
+    fanout = FanoutDetector()
+    for port in range(500):
+        fanout.add(FlowKey(SRC, IPV4_MAPPED | 1, port))
+    fanout.add(FlowKey(SRC, IPV4_MAPPED | 2, NO_PORT))
+
+    [(_, dsts, dports)] = fanout.top_keys()
+    assert dsts == 2
+    assert abs(dports - 500) <= 50
+
+
+def test_fanout_detector_evicts_cold_sources():
+    fanout = FanoutDetector(max_sources=2)
+    fanout.add(FlowKey(1, 10, 443))
+    fanout.add(FlowKey(2, 10, 443))
+    fanout.add(FlowKey(1, 11, 443))
+    fanout.add(FlowKey(3, 10, 443))
+
+    assert len(fanout) == 2
+    assert fanout.evictions == 1
+    assert sorted(src for (src, _, _) in fanout.top_keys()) == [1, 3]
+    assert fanout.memory_bound() == 2 * 2 * 256
+
+    fanout.reset()
+    assert fanout.top_keys() == []
+
+
+def test_conntracker_sample_fanout(caplog):
+    fanout = FanoutDetector(threshold=100)
+    ctr = Conntracker(
+        logging.getLogger(__name__),
+        NullSyncer(),
+        MemSettings(),
+        NullHealther(),
+        Stats(),
+        fanout=fanout)
+    ctr.handle_counts(
+        (FlowKey(SRC, IPV4_MAPPED | i, 22), 1) for i in range(200))
+
+    with caplog.at_level(logging.WARN):
+        ctr.sample(1000, 10)
+
+    assert 'over fanout_threshold=100 src=10.0.0.1 dsts=' in caplog.text
+    assert 'over threshold=1000' not in caplog.text
+    assert len(fanout) == 0
@@ -0,0 +1,84 @@
+import bz2
+import logging
+import os
+
+from xml.dom.minidom import parseString as minidom_parse_string
+from xml.parsers.expat import ExpatError
+
+from nat_conntracker.fast_flow_parser import (FastFlowParser, NewFlow,
+                                              extract_new_flow)
+from nat_conntracker.flow_parser import Flow
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+SAMPLE = os.path.join(HERE, 'data', 'conntrack-events-sample.xml.bz2')
+
+
+def _sample_lines(mode):
+    with bz2.open(SAMPLE, mode) as events:
+        return list(events)
+
+
+def _from_node_src_dst(line):
+    try:
+        dom = minidom_parse_string(line)
+    except ExpatError:
+        return None
+    for flow_node in dom.getElementsByTagName('flow'):
+        flow = Flow.from_node(flow_node)
+        if flow.flowtype != 'new':
+            return None
+        (src, dst) = flow.src_dst()
+        return (src.host, dst.host, dst.port)
+    return None
+
+
+def _fast_src_dst(line):
+    src_dst = extract_new_flow(line)
+    if src_dst is None:
+        return None
+    (src, dst) = src_dst
+    return (src.host, dst.host, dst.port)
+
+
+def test_fast_flow_parser_init():
+    flp = FastFlowParser(None, None)
+    assert flp is not None
+
+
+def test_extract_new_flow_conformance():
+    lines = _sample_lines('rt')
+    expected = [_from_node_src_dst(line) for line in lines]
+    assert len(list(filter(None, expected))) > 0
+    assert [_fast_src_dst(line) for line in lines] == expected
+
+
+def test_extract_new_flow_conformance_bytes():
+    lines = _sample_lines('rb')
+    expected = [_from_node_src_dst(line) for line in lines]
+    assert [_fast_src_dst(line) for line in lines] == expected
+
+
+def test_extract_new_flow_rejects_non_new():
+    line = ('<flow type="destroy"><meta direction="original"><layer3>'
+            '<src>10.0.0.1</src><dst>1.2.3.4</dst></layer3></meta></flow>')
+    assert extract_new_flow(line) is None
+    assert extract_new_flow(line.replace('destroy', 'new')) is not None
+
+
+class CollectingConntracker(object):
+    def __init__(self):
+        self.flows = []
+
+    def handle_flow(self, flow):
+        self.flows.append(flow)
+
+
+def test_fast_flow_parser_handle_events():
+    ctr = CollectingConntracker()
+    FastFlowParser(ctr, logging.getLogger()).handle_events(_sample_lines('rt'))
+
+    assert len(ctr.flows) > 0
+    for flow in ctr.flows:
+        assert isinstance(flow, NewFlow)
+        assert flow.flowtype == 'new'
+        assert flow.src_dst()[0].host != ''
@@ -0,0 +1,30 @@
+from nat_conntracker.flow_key import (FlowKey, flow_key, format_daddr,
+                                      format_host, format_top, NO_PORT)
+from nat_conntracker.flow_parser import FlowAddress
+
+import pytest
+
+
+def test_flow_key_ipv4():
+    key = flow_key(
+        FlowAddress('10.10.0.7', '40000'), FlowAddress('1.2.3.4', '443'))
+    assert isinstance(key, FlowKey)
+    assert format_host(key.src) == '10.10.0.7'
+    assert format_daddr(key) == '1.2.3.4:443'
+
+
+def test_flow_key_ipv6_no_port():
+    key = flow_key(FlowAddress('fd00::7', ''), FlowAddress('2001:db8::1', ''))
+    assert key.dport == NO_PORT
+    assert format_host(key.src) == 'fd00::7'
+    assert format_daddr(key) == '2001:db8::1:?'
+
+
+def test_flow_key_invalid():
+    with pytest.raises(ValueError):
+        flow_key(FlowAddress('', ''), FlowAddress('1.2.3.4', '443'))
+
+
+def test_format_top():
+    key = flow_key(FlowAddress('10.10.0.7', ''), FlowAddress('1.2.3.4', '53'))
+    assert format_top([(key, 3)]) == [(('10.10.0.7', '1.2.3.4:53'), 3)]
@@ -0,0 +1,116 @@
+import logging
+import socket
+import threading
+
+from nat_conntracker.hostname_resolver import HostnameResolver
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _resolved(resolver, ip):
+    done = threading.Event()
+    results = []
+
+    def callback(cb_ip, hostname):
+        results.append((cb_ip, hostname))
+        done.set()
+
+    assert resolver.lookup(ip, callback=callback) is None
+    assert done.wait(5)
+    return results
+
+
+def test_hostname_resolver_init():
+    resolver = HostnameResolver(logging.getLogger())
+    assert resolver.queue_depth() == 0
+    assert resolver.hit_rate() == 0.0
+
+
+def test_hostname_resolver_caches(monkeypatch):
+    monkeypatch.setattr(socket, 'gethostbyaddr',
+                        lambda ip: (f'host-{ip}', [], [ip]))
+    clock = FakeClock()
+    resolver = HostnameResolver(logging.getLogger(), ttl=60, clock=clock)
+
+    assert _resolved(resolver, '10.0.0.1') == [('10.0.0.1', 'host-10.0.0.1')]
+    assert resolver.lookup('10.0.0.1') == 'host-10.0.0.1'
+    assert resolver.hit_rate() == 0.5
+
+    clock.now += 61
+    assert resolver.lookup('10.0.0.1') is None
+    resolver.shutdown()
+
+
+def test_hostname_resolver_negative_cache(monkeypatch):
+    def fail(ip):
+        raise socket.herror('nope')
+
+    monkeypatch.setattr(socket, 'gethostbyaddr', fail)
+    clock = FakeClock()
+    resolver = HostnameResolver(
+        logging.getLogger(), ttl=600, negative_ttl=10, clock=clock)
+
+    assert _resolved(resolver, '10.0.0.2') == [('10.0.0.2', 'unknown')]
+    assert resolver.lookup('10.0.0.2') == 'unknown'
+    clock.now += 11
+    assert resolver.lookup('10.0.0.2') is None
+    resolver.shutdown()
+
+
+def test_hostname_resolver_coalesces(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def slow(ip):
+        calls.append(ip)
+        release.wait(5)
+        return ('slow', [], [ip])
+
+    monkeypatch.setattr(socket, 'gethostbyaddr', slow)
+    resolver = HostnameResolver(logging.getLogger(), pool_size=2)
+
+    results = []
+    done = threading.Event()
+
+    def callback(ip, hostname):
+        results.append(hostname)
+        if len(results) == 3:
+            done.set()
+
+    for _ in range(3):
+        assert resolver.lookup('10.0.0.3', callback=callback) is None
+    assert resolver.queue_depth() == 1
+
+    release.set()
+    assert done.wait(5)
+    assert calls == ['10.0.0.3']
+    assert results == ['slow', 'slow', 'slow']
+    assert resolver.queue_depth() == 0
+    resolver.shutdown()
+
+
+def test_hostname_resolver_lru_eviction(monkeypatch):
+    monkeypatch.setattr(socket, 'gethostbyaddr', lambda ip: (ip, [], [ip]))
+    resolver = HostnameResolver(logging.getLogger(), cache_size=2)
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        _resolved(resolver, ip)
+
+    assert resolver.lookup('10.0.0.1') is None
+    assert resolver.lookup('10.0.0.3') == '10.0.0.3'
+    resolver.shutdown()
+
+
+def test_hostname_resolver_lookup_after_shutdown(monkeypatch):
+    monkeypatch.setattr(socket, 'gethostbyaddr', lambda ip: (ip, [], [ip]))
+    resolver = HostnameResolver(logging.getLogger())
+    _resolved(resolver, '10.0.0.1')
+    resolver.shutdown()
+
+    assert resolver.lookup('10.0.0.2') is None
+    assert resolver.queue_depth() == 0
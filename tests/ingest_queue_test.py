@@ -0,0 +1,88 @@
+import logging
+import threading
+
+import pytest
+
+from nat_conntracker.conntracker import Conntracker
+from nat_conntracker.fast_flow_parser import FastFlowParser
+from nat_conntracker.ingest_queue import IngestQueue
+from nat_conntracker.mem_settings import MemSettings
+from nat_conntracker.null_healther import NullHealther
+from nat_conntracker.null_syncer import NullSyncer
+from nat_conntracker.stats import Stats
+
+NEW = ('<flow type="new"><meta direction="original"><layer3><src>10.0.0.{i}'
+       '</src><dst>1.3.3.7</dst></layer3><layer4><dport>443</dport>'
+       '</layer4></meta></flow>\n')
+UPDATE = '<flow type="update">{i}</flow>\n'
+
+
+def _queue(policy, max_records=4):
+    return IngestQueue(
+        logging.getLogger(__name__),
+        max_records=max_records,
+        policy=policy,
+        poll_interval=0.01)
+
+
+def _drain(queue):
+    queue.close()
+    return list(queue.consume())
+
+
+def test_ingest_queue_invalid_policy():
+    with pytest.raises(ValueError):
+        _queue('drop-everything')
+
+
+def test_ingest_queue_drop_oldest():
+    queue = _queue('drop-oldest')
+    for i in range(10):
+        assert queue.put(i)
+    assert _drain(queue) == [6, 7, 8, 9]
+    assert queue.received == 10
+    assert queue.dropped == {'oldest': 6}
+    assert queue.drops_since_last() == {'oldest': 6}
+    assert queue.drops_since_last() == {}
+
+
+def test_ingest_queue_drop_non_new():
+    queue = _queue('drop-non-new')
+    records = [
+        NEW.format(i=1),
+        UPDATE.format(i=2),
+        UPDATE.format(i=3),
+        NEW.format(i=4),
+        NEW.format(i=5),
+        UPDATE.format(i=6),
+        NEW.format(i=7),
+        NEW.format(i=8),
+    ]
+    for record in records:
+        queue.put(record)
+
+    # Queued updates go first, then incoming updates, then the oldest news.
+    assert _drain(queue) == [records[i] for i in (3, 4, 6, 7)]
+    assert queue.dropped == {'non-new': 3, 'oldest': 1}
+
+
+def test_ingest_queue_block():
+    queue = _queue('block', max_records=2)
+    done = threading.Event()
+    reader = queue.start(iter(range(100)), is_done=done.is_set)
+    assert list(reader) == list(range(100))
+    assert queue.dropped == {}
+
+
+def test_conntracker_handle_ingest_queue():
+    stats = Stats()
+    ctr = Conntracker(
+        logging.getLogger(__name__),
+        NullSyncer(),
+        MemSettings(),
+        NullHealther(),
+        stats,
+        parser_class=FastFlowParser,
+        ingest_queue=_queue('block', max_records=8))
+    ctr.handle([NEW.format(i=1)] * 50 + [UPDATE.format(i=2)] * 50)
+    assert stats.top() == [(('10.0.0.1', '1.3.3.7:443'), 50)]
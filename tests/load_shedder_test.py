@@ -0,0 +1,73 @@
+import logging
+
+from nat_conntracker.conntracker import Conntracker
+from nat_conntracker.fast_flow_parser import FastFlowParser
+from nat_conntracker.load_shedder import LoadShedder
+from nat_conntracker.mem_settings import MemSettings
+from nat_conntracker.null_healther import NullHealther
+from nat_conntracker.null_syncer import NullSyncer
+from nat_conntracker.stats import Stats
+
+NEW = ('<flow type="new"><meta direction="original"><layer3><src>10.0.0.1'
+       '</src><dst>1.3.3.7</dst></layer3><layer4><dport>443</dport>'
+       '</layer4></meta></flow>\n')
+UPDATE = '<flow type="update">{i}</flow>\n'
+
+
+class FakeQueue(object):
+    def __init__(self, depth, max_records=100):
+        self.depth = depth
+        self.max_records = max_records
+
+    def __len__(self):
+        return self.depth
+
+
+def _shedder(queue, **kwargs):
+    kwargs.setdefault('check_every', 1)
+    return LoadShedder(logging.getLogger(__name__), queue, **kwargs)
+
+
+def test_load_shedder_adjusts_rate():
+    queue = FakeQueue(depth=90)
+    shedder = _shedder(queue, max_rate=8, rand=lambda: 0.0)
+    list(shedder.filter([NEW] * 5))
+    assert shedder.rate == 8
+
+    queue.depth = 0
+    list(shedder.filter([NEW] * 2))
+    assert shedder.rate == 2
+    assert shedder.interval() == (8, 7, 0)
+    assert shedder.interval() == (2, 0, 0)
+
+
+def test_load_shedder_samples_only_new_flows():
+    shedder = _shedder(FakeQueue(depth=90), max_rate=4, rand=lambda: 0.5)
+    records = [NEW, UPDATE.format(i=1)] * 10
+    kept = list(shedder.filter(records))
+    assert UPDATE.format(i=1) in kept
+    assert shedder.shed > 0
+    assert kept.count(NEW) == 10 - shedder.shed
+
+
+def test_conntracker_scales_sampled_counts():
+    stats = Stats(max_size=10)
+    draws = iter([0.0, 0.9] * 10)
+    shedder = _shedder(
+        FakeQueue(depth=90), max_rate=2, rand=lambda: next(draws))
+    conntracker = Conntracker(
+        logging.getLogger(__name__),
+        NullSyncer(),
+        MemSettings(),
+        NullHealther(),
+        stats,
+        parser_class=FastFlowParser,
+        shedder=shedder)
+    conntracker.build_parser().handle_events(shedder.filter([NEW] * 20))
+
+    assert shedder.interval() == (2, 10, 10)
+    assert [count for (_, count) in stats.top(n=1)] == [20]
+
+
+def test_load_shedder_bounds_max_rate():
+    assert _shedder(FakeQueue(depth=0), max_rate=2**20).max_rate == 65535
@@ -0,0 +1,125 @@
+import logging
+import socket
+import urllib.request
+
+from nat_conntracker import metrics
+from nat_conntracker.conntracker import Conntracker
+from nat_conntracker.flow_parser import Flow, FlowAddress, FlowMetaOrigReply
+from nat_conntracker.mem_settings import MemSettings
+from nat_conntracker.metrics import (Counter, Gauge, Histogram, MetricsServer,
+                                     Registry, TextfileWriter)
+from nat_conntracker.null_healther import NullHealther
+from nat_conntracker.null_syncer import NullSyncer
+from nat_conntracker.stats import Stats
+
+
+def _registry():
+    registry = Registry()
+    counter = Counter(
+        'test_total', 'A counter.', labels=('kind', ), registry=registry)
+    counter.labels('a').inc()
+    counter.labels('a').inc(2)
+    gauge = Gauge('test_gauge', 'A gauge.', registry=registry)
+    gauge.set(7)
+    histogram = Histogram(
+        'test_seconds', 'A histogram.', buckets=(0.1, 1.0), registry=registry)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    return registry
+
+
+def test_metrics_render():
+    assert _registry().render().splitlines() == [
+        '# HELP test_total A counter.',
+        '# TYPE test_total counter',
+        'test_total{kind="a"} 3',
+        '# HELP test_gauge A gauge.',
+        '# TYPE test_gauge gauge',
+        'test_gauge 7',
+        '# HELP test_seconds A histogram.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        'test_seconds_sum 5.55',
+        'test_seconds_count 3',
+    ]
+
+
+def test_metrics_set_function():
+    registry = Registry()
+    counter = Counter('test_total', 'A counter.', registry=registry)
+    counter.set_function(lambda: 42)
+    assert 'test_total 42' in registry.render()
+
+
+def test_metrics_server(monkeypatch):
+    monkeypatch.setattr(socket, 'getfqdn', lambda name='': 'localhost')
+    server = MetricsServer(0, registry=_registry()).start()
+    try:
+        url = f'http://127.0.0.1:{server.port}/metrics'
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert b'test_gauge 7' in response.read()
+    finally:
+        server.stop()
+
+
+def test_metrics_textfile(tmpdir):
+    path = str(tmpdir.join('nat-conntracker.prom'))
+    TextfileWriter(path, registry=_registry()).write()
+    with open(path) as textfile:
+        assert 'test_total{kind="a"} 3' in textfile.read()
+
+
+def _flow(flowtype, src, dst):
+    flow = Flow()
+    flow.flowtype = flowtype
+    meta = FlowMetaOrigReply()
+    meta.direction = 'original'
+    meta.src = FlowAddress(src, '')
+    meta.dst = FlowAddress(dst, '443')
+    flow.meta.append(meta)
+    return flow
+
+
+def test_conntracker_metrics():
+    settings = MemSettings()
+    settings.add_ignore_dst('1.2.3.0/24')
+    ctr = Conntracker(logging.getLogger(), None, settings, None, Stats())
+
+    new_flows = metrics.FLOWS.labels('new').get()
+    update_flows = metrics.FLOWS.labels('update').get()
+    destroy_flows = metrics.FLOWS.labels('destroy').get()
+    dst_ignored = metrics.IGNORED.labels('dst').get()
+
+    ctr.handle_flow(_flow('new', '10.0.0.1', '1.2.3.4'))
+    ctr.handle_flow(_flow('new', '10.0.0.1', '5.6.7.8'))
+    ctr.handle_flow(_flow('update', '10.0.0.1', '5.6.7.8'))
+    ctr.handle_flow(_flow('destroy', '10.0.0.1', '5.6.7.8'))
+
+    assert metrics.FLOWS.labels('new').get() == new_flows + 2
+    assert metrics.FLOWS.labels('update').get() == update_flows + 1
+    assert metrics.FLOWS.labels('destroy').get() == destroy_flows + 1
+    assert metrics.IGNORED.labels('dst').get() == dst_ignored + 1
+
+
+def test_conntracker_cleanup_stops_exporters(tmpdir, monkeypatch):
+    monkeypatch.setattr(socket, 'getfqdn', lambda name='': 'localhost')
+    path = str(tmpdir.join('nat-conntracker.prom'))
+    server = MetricsServer(0, registry=_registry()).start()
+    writer = TextfileWriter(path, registry=_registry()).start()
+    ctr = Conntracker(
+        logging.getLogger(),
+        NullSyncer(),
+        MemSettings(),
+        NullHealther(),
+        Stats(),
+        exporters=[server, writer])
+    ctr.cleanup()
+
+    assert server._thread is None
+    assert not writer._thread.is_alive()
+    with open(path) as textfile:
+        assert 'test_gauge 7' in textfile.read()
@@ -0,0 +1,115 @@
+import errno
+import logging
+import socket
+import struct
+
+from nat_conntracker.netlink_source import (
+    NetlinkEventSource, decode_messages, CTA_IP_V4_DST, CTA_IP_V4_SRC,
+    CTA_IP_V6_DST, CTA_IP_V6_SRC, CTA_PROTO_DST_PORT, CTA_PROTO_SRC_PORT,
+    CTA_TUPLE_IP, CTA_TUPLE_ORIG, CTA_TUPLE_PROTO, IPCTNL_MSG_CT_DELETE,
+    IPCTNL_MSG_CT_NEW, NFNL_SUBSYS_CTNETLINK, NLM_F_CREATE)
+
+NLA_F_NESTED = 0x8000
+
+
+def _attr(attr_type, payload):
+    length = 4 + len(payload)
+    return struct.pack('=HH', length, attr_type) + payload + \
+        b'\x00' * ((4 - length % 4) % 4)
+
+
+def _message(src,
+             dst,
+             sport,
+             dport,
+             ct_type=IPCTNL_MSG_CT_NEW,
+             flags=NLM_F_CREATE):
+    family = socket.AF_INET6 if ':' in src else socket.AF_INET
+    (src_attr, dst_attr) = (CTA_IP_V4_SRC, CTA_IP_V4_DST)
+    if family == socket.AF_INET6:
+        (src_attr, dst_attr) = (CTA_IP_V6_SRC, CTA_IP_V6_DST)
+
+    tuple_ip = _attr(
+        CTA_TUPLE_IP | NLA_F_NESTED,
+        _attr(src_attr, socket.inet_pton(family, src)) + _attr(
+            dst_attr, socket.inet_pton(family, dst)))
+    tuple_proto = _attr(
+        CTA_TUPLE_PROTO | NLA_F_NESTED,
+        _attr(1, b'\x06') + _attr(CTA_PROTO_SRC_PORT, struct.pack('!H', sport))
+        + _attr(CTA_PROTO_DST_PORT, struct.pack('!H', dport)))
+    body = struct.pack('=BBH', family, 0, 0) + _attr(
+        CTA_TUPLE_ORIG | NLA_F_NESTED, tuple_ip + tuple_proto)
+    msg_type = (NFNL_SUBSYS_CTNETLINK << 8) | ct_type
+    return struct.pack('=IHHII', 16 + len(body), msg_type, flags, 0, 0) + body
+
+
+class CollectingConntracker(object):
+    def __init__(self):
+        self.flows = []
+
+    def handle_flow(self, flow):
+        self.flows.append(flow)
+
+
+def test_decode_messages():
+    data = _message('10.10.0.7', '1.2.3.4', 40000, 443) + _message(
+        '10.10.0.7',
+        '1.2.3.4',
+        40000,
+        443,
+        ct_type=IPCTNL_MSG_CT_DELETE,
+        flags=0) + _message(
+            'fd00::7', '2001:db8::1', 40001, 25, flags=0)
+
+    flows = [flow for (_, flow) in decode_messages(data)]
+    assert [f.flowtype for f in flows] == ['new', 'destroy', 'update']
+
+    (src, dst) = flows[0].src_dst()
+    assert src == ('10.10.0.7', '40000')
+    assert dst == ('1.2.3.4', '443')
+
+    (src, dst) = flows[2].src_dst()
+    assert src == ('fd00::7', '40001')
+    assert dst == ('2001:db8::1', '25')
+
+
+def test_netlink_event_source_replay(tmpdir):
+    replay = tmpdir.join('events.nl')
+    replay.write_binary(b''.join(
+        _message('10.10.0.7', f'1.2.3.{i}', 40000 + i, 443) for i in range(5)))
+
+    ctr = CollectingConntracker()
+    source = NetlinkEventSource(ctr, logging.getLogger(), replay=str(replay))
+    source.handle_events()
+
+    assert source.messages == 5
+    assert [f.src_dst()[1].host
+            for f in ctr.flows] == [f'1.2.3.{i}' for i in range(5)]
+
+
+class ENOBUFSSocket(object):
+    def __init__(self, source):
+        self._source = source
+        self._calls = 0
+
+    def recv(self, _):
+        self._calls += 1
+        if self._calls == 1:
+            raise OSError(errno.ENOBUFS, 'No buffer space available')
+        self._source._done = True
+        return _message('10.10.0.7', '1.2.3.4', 40000, 443)
+
+    def close(self):
+        pass
+
+
+def test_netlink_event_source_counts_enobufs(monkeypatch):
+    ctr = CollectingConntracker()
+    source = NetlinkEventSource(ctr, logging.getLogger())
+    source._done = False
+    monkeypatch.setattr(source, '_open_socket', lambda: ENOBUFSSocket(source))
+
+    source.handle_events(is_done=lambda: source._done)
+
+    assert source.enobufs == 1
+    assert len(ctr.flows) == 1
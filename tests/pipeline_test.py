@@ -0,0 +1,56 @@
+import bz2
+import logging
+import os
+
+from collections import Counter
+
+import pytest
+
+from nat_conntracker.fast_flow_parser import extract_new_flow
+from nat_conntracker.flow_key import flow_key
+from nat_conntracker.pipeline import HAS_SHARED_MEMORY, ParallelPipeline
+
+pytestmark = pytest.mark.skipif(
+    not HAS_SHARED_MEMORY, reason='requires multiprocessing.shared_memory')
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+SAMPLE = os.path.join(HERE, 'data', 'conntrack-events-sample.xml.bz2')
+
+
+class CountingConntracker(object):
+    def __init__(self):
+        self.counts = Counter()
+        self.flushed = 0
+
+    def handle_counts(self, counts):
+        for (key, count) in counts:
+            self.counts[key] += count
+
+    def flush(self):
+        self.flushed += 1
+
+
+def test_parallel_pipeline_init():
+    pipeline = ParallelPipeline(None, None)
+    assert pipeline is not None
+
+
+def test_parallel_pipeline_matches_in_process_counts():
+    with bz2.open(SAMPLE, 'rb') as events:
+        lines = list(events)
+
+    expected = Counter()
+    for line in lines:
+        src_dst = extract_new_flow(line)
+        if src_dst is not None:
+            expected[flow_key(*src_dst)] += 1
+
+    ctr = CountingConntracker()
+    pipeline = ParallelPipeline(
+        ctr, logging.getLogger(), workers=3, slot_size=4096, slots=2)
+    pipeline.handle_events(lines)
+
+    assert len(expected) > 0
+    assert ctr.counts == expected
+    assert ctr.flushed == 1
+    assert pipeline.batches > 3
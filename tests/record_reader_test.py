@@ -0,0 +1,45 @@
+import bz2
+import io
+import os
+
+from nat_conntracker.record_reader import RecordReader
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+SAMPLE = os.path.join(HERE, 'data', 'conntrack-events-sample.xml.bz2')
+
+
+def test_record_reader_init():
+    reader = RecordReader(io.BytesIO(b''))
+    assert reader.read_size > 0
+    assert list(reader) == []
+
+
+def test_record_reader_splits_across_reads():
+    with bz2.open(SAMPLE, 'rb') as events:
+        raw = events.read()
+
+    for read_size in (7, 512, 65536):
+        reader = RecordReader(io.BytesIO(raw), read_size=read_size)
+        records = list(reader)
+        assert records == raw.splitlines(keepends=True)
+        assert reader.records == len(records)
+        assert reader.bytes_read == len(raw)
+
+
+def test_record_reader_trailing_partial_record():
+    reader = RecordReader(io.BytesIO(b'one\ntwo\nthree'), read_size=4)
+    assert list(reader) == [b'one\n', b'two\n', b'three']
+
+
+def test_record_reader_text_stream_buffer():
+    stream = io.TextIOWrapper(io.BytesIO(b'<a/>\n<b/>\n'))
+    assert list(RecordReader(stream)) == [b'<a/>\n', b'<b/>\n']
+
+
+def test_record_reader_rates():
+    reader = RecordReader(io.BytesIO(b'one\ntwo\n'))
+    list(reader)
+    (bytes_rate, records_rate) = reader.rates()
+    assert bytes_rate > 0
+    assert records_rate > 0
+    assert reader.rates() == (0.0, 0.0)
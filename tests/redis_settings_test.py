@@ -1,4 +1,6 @@
-from ipaddress import ip_network
+import time
+
+from ipaddress import ip_address, ip_network
 
 import pytest
 
@@ -26,3 +28,78 @@ def test_redis_settings_src_ignore(settings):
 def test_redis_settings_dst_ignore(settings):
     settings.add_ignore_dst('167.189.0.0/16')
     assert ip_network('167.189.0.0/16') in settings.dst_ignore()
+
+
+def test_redis_settings_ignore_matchers(settings):
+    settings.add_ignore_src('123.145.0.0/16')
+    settings.add_ignore_dst('167.189.0.0/16')
+    assert ip_address('123.145.6.7') in settings.src_ignore_matcher()
+    assert ip_address('167.189.6.7') in settings.dst_ignore_matcher()
+    assert ip_address('123.145.6.7') not in settings.dst_ignore_matcher()
+
+
+def test_redis_settings_caches_matchers(settings):
+    settings.add_ignore_src('123.145.0.0/16')
+    matcher = settings.src_ignore_matcher()
+    assert settings.src_ignore_matcher() is matcher
+    assert settings.rules_matcher() is settings.rules_matcher()
+
+
+def test_redis_settings_bumps_version(settings):
+    settings.add_ignore_src('123.145.0.0/16')
+    settings.set_min_flow(5)
+    assert settings._get_version() == 2
+    assert settings.min_flow() == 5
+
+
+def test_redis_settings_batch_bumps_version_once():
+    settings = RedisSettings(watch=True, watch_interval=0.05)
+    try:
+        with settings.batch():
+            settings.add_ignore_src('123.145.0.0/16')
+            settings.add_ignore_dst('167.189.0.0/16')
+            settings.add_rule('threshold=5 dport=25')
+            assert settings._get_version() == 0
+            assert settings.reloads == 0
+
+        assert settings._get_version() == 1
+        assert settings._snapshot.version == 1
+        assert ip_address('123.145.6.7') in settings.src_ignore_matcher()
+        assert len(settings.rules_matcher()) == 1
+    finally:
+        settings.close()
+
+
+def test_redis_settings_watch():
+    settings = RedisSettings(watch=True, watch_interval=0.05)
+    try:
+        assert settings.min_flow() == 10
+        assert ip_address('123.145.6.7') not in settings.src_ignore_matcher()
+
+        # Simulate a write by another instance sharing the same keys.
+        settings._conn.sadd('nat-conntracker:src-ignore', '123.145.0.0/16')
+        settings._conn.set('nat-conntracker:min-flow', 3)
+        settings._conn.publish('nat-conntracker:settings',
+                               settings._conn.incr(settings._version_key))
+
+        deadline = time.monotonic() + 5
+        while settings.reloads == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert settings.reloads > 0
+        assert settings.min_flow() == 3
+        assert ip_address('123.145.6.7') in settings.src_ignore_matcher()
+        assert ip_network('123.145.0.0/16') in settings.src_ignore()
+    finally:
+        settings.close()
+
+    assert not settings._watcher.is_alive()
+
+
+def test_redis_settings_rules(settings):
+    settings.add_rule('threshold=5 dport=25')
+    settings.add_rule('threshold=5000 dst=104.16.0.0/12')
+    settings._conn.sadd('nat-conntracker:rules', 'threshold=bogus')
+
+    assert len(settings.rules()) == 2
+    assert len(settings.rules_matcher()) == 2
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 
@@ -81,3 +82,93 @@ def test_redis_syncer_handle_message(syncer):
         b'{"threshold":5,"src":"10.9.8.7","dst":"1.3.3.7","count":40}'
     })
     assert ok is None
+
+
+class MockBlockingPubSubConn(MockPubSubConn):
+    def __init__(self, done):
+        super().__init__()
+        self.timeouts = []
+        self._done = done
+
+    def get_message(self, timeout=0):
+        self.timeouts.append(timeout)
+        self._done.set()
+
+
+def test_redis_syncer_asub(syncer, monkeypatch):
+    async def run():
+        done = asyncio.Event()
+        mpsconn = MockBlockingPubSubConn(done)
+        monkeypatch.setattr(syncer._conn, 'pubsub',
+                            lambda *args, **kwargs: mpsconn)
+        await asyncio.wait_for(syncer.asub(done, timeout=0.5), 5)
+        return mpsconn
+
+    loop = asyncio.new_event_loop()
+    try:
+        mpsconn = loop.run_until_complete(run())
+    finally:
+        loop.close()
+    assert mpsconn.subscriptions[syncer._channel] is not None
+    assert mpsconn.timeouts == [0.5]
+
+
+@pytest.mark.parametrize('encoding', ['json', 'binary'])
+def test_redis_syncer_pub_batch(caplog, monkeypatch, encoding):
+    syncer = RedisSyncer(
+        logging.getLogger(__name__),
+        'nat-conntracker-tests:sync',
+        encoding=encoding,
+        max_batch=2)
+    published = []
+
+    def mock_publish(*args):
+        published.append(args)
+        return 1
+
+    monkeypatch.setattr(syncer._conn, 'publish', mock_publish)
+    offenders = [('10.9.8.7', '1.3.3.7:443', 40),
+                 ('10.9.8.6', '1.3.3.7:25', 30), ('10.9.8.5', '[::1]:?', 20)]
+    assert syncer.pub_batch(5, offenders) == 2
+    assert len(published) == 2
+
+    with caplog.at_level(logging.WARN):
+        for (channel, data) in published:
+            assert channel == syncer._channel
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            syncer._handle_message({'type': 'message', 'data': data})
+
+    for (src, dst, count) in offenders:
+        assert (f'over threshold=5 src={src} dst={dst} count={count} '
+                'source=sync') in caplog.text
+
+
+def test_redis_syncer_pub_batch_empty(syncer):
+    assert syncer.pub_batch(5, []) == 0
+
+
+@pytest.mark.parametrize('encoding', ['json', 'binary'])
+def test_redis_syncer_pub_batch_sample_rate(caplog, monkeypatch, encoding):
+    syncer = RedisSyncer(
+        logging.getLogger(__name__),
+        'nat-conntracker-tests:sync',
+        encoding=encoding)
+    published = []
+
+    def mock_publish(*args):
+        published.append(args)
+        return 1
+
+    monkeypatch.setattr(syncer._conn, 'publish', mock_publish)
+    assert syncer.pub_batch(
+        5, [('10.9.8.7', '1.3.3.7:443', 64)], sample_rate=8) == 1
+
+    with caplog.at_level(logging.WARN):
+        data = published[0][1]
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        syncer._handle_message({'type': 'message', 'data': data})
+
+    assert ('over threshold=5 src=10.9.8.7 dst=1.3.3.7:443 count=64 '
+            'source=sync sample_rate=1/8') in caplog.text
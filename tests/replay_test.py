@@ -0,0 +1,113 @@
+import bz2
+import gzip
+import json
+import logging
+
+import pytest
+
+from nat_conntracker.__main__ import main
+from nat_conntracker.flow_parser import Flow, when_timestamp
+from nat_conntracker.streaming_flow_parser import StreamingFlowParser
+
+from xml.dom.minidom import parseString as minidom_parse_string
+
+FLOW = ('<flow type="{flowtype}"><meta direction="original">'
+        '<layer3 protonum="2" protoname="ipv4"><src>{src}</src>'
+        '<dst>{dst}</dst></layer3><layer4 protonum="6" protoname="tcp">'
+        '<sport>40000</sport><dport>443</dport></layer4></meta>'
+        '<when><hour>12</hour><min>{min}</min><sec>{sec}</sec><wday>3</wday>'
+        '<day>15</day><month>6</month><year>2021</year></when></flow>\n')
+
+
+def _capture(flows):
+    return ('<?xml version="1.0" encoding="utf-8"?>\n<conntrack>\n' + ''.join(
+        FLOW.format(flowtype=flowtype, src=src, dst=dst, min=m, sec=sec)
+        for (flowtype, src, dst, m, sec) in flows) +
+            '</conntrack>\n').encode('utf-8')
+
+
+CAPTURE = _capture([
+    ('new', '10.0.0.1', '1.3.3.7', 0, 1),
+    ('new', '10.0.0.1', '1.3.3.7', 0, 30),
+    ('update', '10.0.0.1', '1.3.3.7', 0, 31),
+    ('new', '10.0.0.2', '1.3.3.7', 0, 59),
+    ('new', '10.0.0.2', '1.3.3.7', 1, 5),
+    ('new', '127.0.0.1', '1.3.3.7', 1, 6),
+])
+
+
+def test_when_timestamp():
+    when = dict(year='2021', month='6', day='15', hour='12', min='0', sec='1')
+    assert when_timestamp(when) == 1623758401
+    assert when_timestamp({}) is None
+
+
+class Collector(object):
+    def __init__(self):
+        self.flows = []
+
+    def handle_flow(self, flow):
+        self.flows.append(flow)
+
+
+def test_parsers_read_timestamps():
+    collector = Collector()
+    StreamingFlowParser(collector, logging.getLogger()).handle_events(
+        CAPTURE.splitlines(True))
+    timestamps = [flow.timestamp for flow in collector.flows]
+    assert timestamps[:2] == [1623758401, 1623758430]
+
+    dom = minidom_parse_string(CAPTURE)
+    minidom_flows = [
+        Flow.from_node(node) for node in dom.getElementsByTagName('flow')
+    ]
+    assert [flow.timestamp for flow in minidom_flows] == timestamps
+
+
+@pytest.mark.parametrize('suffix,compress',
+                         [('.xml', bytes), ('.xml.gz', gzip.compress),
+                          ('.xml.bz2', bz2.compress)])
+def test_replay(tmpdir, capsys, suffix, compress):
+    path = tmpdir.join(f'capture{suffix}')
+    path.write_binary(compress(CAPTURE))
+
+    assert main(['nat-conntracker', 'replay', '-T', '2', str(path)]) == 0
+    out = capsys.readouterr().out.splitlines()
+
+    assert out == [
+        'window start=2021-06-15T12:00:00 end=2021-06-15T12:01:00 flows=3',
+        '  top 1/2 src=10.0.0.1 dst=1.3.3.7:443 count=2',
+        '  top 2/2 src=10.0.0.2 dst=1.3.3.7:443 count=1',
+        '  over threshold=2 src=10.0.0.1 dst=1.3.3.7:443 count=2',
+        'window start=2021-06-15T12:01:00 end=2021-06-15T12:02:00 flows=2',
+        '  top 1/1 src=10.0.0.2 dst=1.3.3.7:443 count=1',
+        'summary flows=5 windows=2 crossings=1',
+    ]
+
+
+def test_replay_json(tmpdir, capsys):
+    path = tmpdir.join('capture.xml')
+    path.write_binary(CAPTURE)
+
+    assert main([
+        'nat-conntracker', 'replay', '--format', 'json', '-I', '3600',
+        str(path)
+    ]) == 0
+    reports = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+
+    assert len(reports) == 2
+    assert reports[0]['start'] == '2021-06-15T12:00:00'
+    assert reports[0]['flows'] == 5
+    assert reports[0]['top'][0] == {
+        'src': '10.0.0.1',
+        'dst': '1.3.3.7:443',
+        'count': 2
+    }
+    assert reports[1] == {
+        'summary': True,
+        'flows': 5,
+        'windows': 1,
+        'crossings': 0
+    }
@@ -0,0 +1,143 @@
+import logging
+
+import pytest
+
+from nat_conntracker.conntracker import Conntracker
+from nat_conntracker.flow_key import NO_PORT, FlowKey, pack_host
+from nat_conntracker.mem_settings import MemSettings
+from nat_conntracker.null_healther import NullHealther
+from nat_conntracker.null_syncer import NullSyncer
+from nat_conntracker.rules import (RuleSet, format_rule, load_rules,
+                                   parse_rule)
+from nat_conntracker.stats import Stats
+
+
+def _key(src, dst, dport=443):
+    return FlowKey(pack_host(src), pack_host(dst), dport)
+
+
+def test_parse_rule_round_trip():
+    line = 'threshold=20 dport=25 dst=0.0.0.0/0 src=10.0.0.0/8'
+    rule = parse_rule(line)
+    assert rule.threshold == 20
+    assert rule.dport == 25
+    assert format_rule(rule) == line
+    assert format_rule(parse_rule('threshold=5')) == 'threshold=5'
+
+
+@pytest.mark.parametrize('line', [
+    'dport=25', 'threshold=5 dport=70000', 'threshold=5 bogus=1',
+    'threshold=5 dst=10.0.0.1/8', 'threshold=5 dport=25 dport=26'
+])
+def test_parse_rule_invalid(line):
+    with pytest.raises(ValueError):
+        parse_rule(line)
+
+
+def test_load_rules(tmpdir):
+    path = tmpdir.join('rules')
+    path.write('# smtp\n\nthreshold=10 dport=25  # any dst\n'
+               'threshold=5000 dst=104.16.0.0/12\n')
+    assert [format_rule(rule) for rule in load_rules(str(path))] == [
+        'threshold=10 dport=25', 'threshold=5000 dst=104.16.0.0/12'
+    ]
+
+    path.write('threshold=10\nthreshold=ten\n')
+    with pytest.raises(ValueError) as exc:
+        load_rules(str(path))
+    assert ':2:' in str(exc.value)
+
+
+def test_rule_set_most_specific_wins():
+    rules = RuleSet([
+        parse_rule(line) for line in (
+            'threshold=10 dport=25',
+            'threshold=3 dport=25 src=10.1.0.0/16',
+            'threshold=5000 dst=104.16.0.0/12',
+            'threshold=7 dst=2001:db8::/32',
+            'threshold=50 src=10.0.0.0/8',
+        )
+    ])
+
+    assert rules.threshold(_key('10.1.2.3', '1.2.3.4', 25), 100) == 3
+    assert rules.threshold(_key('10.2.2.3', '1.2.3.4', 25), 100) == 10
+    assert rules.threshold(_key('10.2.2.3', '104.16.1.1'), 100) == 5000
+    assert rules.threshold(_key('10.2.2.3', '1.2.3.4'), 100) == 50
+    assert rules.threshold(_key('fd00::1', '2001:db8::1', NO_PORT), 100) == 7
+    assert rules.threshold(_key('192.168.0.1', '1.2.3.4'), 100) == 100
+    assert RuleSet().match(_key('10.1.2.3', '1.2.3.4')) is None
+
+
+def test_rule_set_many_rules():
+    rules = RuleSet(
+        parse_rule(f'threshold={port} dport={port} dst=10.{port % 256}.0.0/16')
+        for port in range(1, 3001))
+    assert len(rules) == 3000
+    assert rules.threshold(_key('1.1.1.1', '10.232.0.1', 2024), 100) == 2024
+    assert rules.threshold(_key('1.1.1.1', '10.233.0.1', 2024), 100) == 100
+
+
+def test_conntracker_sample_applies_rules(caplog):
+    settings = MemSettings()
+    settings.add_rule('threshold=5 dport=25')
+    conntracker = Conntracker(
+        logging.getLogger(__name__), NullSyncer(), settings, NullHealther(),
+        Stats())
+    conntracker.handle_counts([(_key('10.0.0.1', '1.3.3.7', 25), 6), (_key(
+        '10.0.0.2', '1.3.3.7', 443), 50), (_key('10.0.0.3', '1.3.3.7', 443),
+                                           150)])
+
+    with caplog.at_level(logging.WARN):
+        conntracker.sample(100, 2)
+
+    assert (
+        'over threshold=5 src=10.0.0.1 dst=1.3.3.7:25 count=6' in caplog.text)
+    assert ('over threshold=100 src=10.0.0.3 dst=1.3.3.7:443 count=150' in
+            caplog.text)
+    assert 'src=10.0.0.2' not in caplog.text
+
+
+def test_conntracker_sample_checks_every_rule_match(caplog):
+    settings = MemSettings()
+    settings.add_rule('threshold=5 dport=25')
+    conntracker = Conntracker(
+        logging.getLogger(__name__),
+        NullSyncer(),
+        settings,
+        NullHealther(),
+        Stats(max_size=1000))
+    conntracker.handle_counts([(_key(f'10.0.{i // 256}.{i % 256}', '1.3.3.7'),
+                                200) for i in range(300)])
+    conntracker.handle_counts([(_key('10.9.0.1', '1.3.3.7', 25), 6)])
+
+    with caplog.at_level(logging.WARN):
+        conntracker.sample(100, 2)
+
+    assert 'over threshold=5 src=10.9.0.1 dst=1.3.3.7:25 count=6' in \
+        caplog.text
+    # The global threshold only applies to the top_n pairs.
+    assert caplog.text.count('over threshold=100') == 2
+    assert len(conntracker._rule_stats) == 0
+
+
+def test_conntracker_reads_rules_once_per_sample():
+    settings = MemSettings()
+    settings.add_rule('threshold=5 dport=25')
+    calls = []
+    rules_matcher = settings.rules_matcher
+    settings.rules_matcher = lambda: calls.append(1) or rules_matcher()
+    rule_stats = Stats()
+    conntracker = Conntracker(
+        logging.getLogger(__name__),
+        NullSyncer(),
+        settings,
+        NullHealther(),
+        Stats(),
+        rule_stats=rule_stats)
+    for i in range(10):
+        conntracker.handle_counts([(_key('10.0.0.1', '1.3.3.7', 25), 1)])
+
+    assert len(calls) == 1
+    assert rule_stats.top_keys(n=1) == [(_key('10.0.0.1', '1.3.3.7', 25), 10)]
+    conntracker.sample(100, 2)
+    assert len(calls) == 2
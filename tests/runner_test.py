@@ -0,0 +1,53 @@
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from nat_conntracker.__main__ import build_runner
+from nat_conntracker.checkpoint import read_checkpoint, write_checkpoint
+from nat_conntracker.flow_key import FlowKey, pack_host
+
+KEY = FlowKey(pack_host('10.0.0.1'), pack_host('1.3.3.7'), 443)
+
+
+def _run(caplog, runtime, path, events, close_after=None):
+    runner = build_runner(
+        events=events,
+        conn_threshold=100,
+        eval_interval=0.3,
+        checkpoint_path=path,
+        runtime=runtime)
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        if close_after is not None:
+            threading.Timer(close_after[0], close_after[1]).start()
+        runner.run()
+    return caplog.text.count('over threshold=100 src=10.0.0.1')
+
+
+@pytest.mark.parametrize('runtime', ['threads', 'asyncio'])
+def test_runner_checkpoint_restart(caplog, tmpdir, runtime):
+    path = str(tmpdir.join('stats.ckpt'))
+    write_checkpoint(path, [(KEY, 150)], timestamp=time.time())
+
+    # Input that ends right away leaves the restored counts unsampled and
+    # checkpointed again for the next start.
+    assert _run(caplog, runtime, path, open(os.devnull, 'rb')) == 0
+    assert read_checkpoint(path)[1] == [(KEY, 150)]
+
+    # With input that stays open, the first sample comes a full interval
+    # after the restore and alerts on the restored counts once.
+    (rfd, wfd) = os.pipe()
+    events = os.fdopen(rfd, 'rb')
+    assert _run(
+        caplog,
+        runtime,
+        path,
+        events,
+        close_after=(0.8, lambda: os.close(wfd))) == 1
+    assert read_checkpoint(path)[1] == []
+
+    # Nothing is alerted again after another restart.
+    assert _run(caplog, runtime, path, open(os.devnull, 'rb')) == 0
@@ -0,0 +1,58 @@
+import threading
+
+from nat_conntracker.flow_key import FlowKey
+from nat_conntracker.sharded_stats import ShardedStats
+
+
+def _key(i):
+    return FlowKey(i, i + 1, 443)
+
+
+def test_sharded_stats_init():
+    stats = ShardedStats()
+    assert stats.max_size > 0
+    assert stats.top() == []
+
+
+def test_sharded_stats_batches_until_flush():
+    stats = ShardedStats(batch_size=10, flush_interval=3600)
+    for _ in range(5):
+        stats.add(_key(1))
+    assert stats.top_keys() == []
+    frozen = stats._frozen
+
+    stats.flush()
+    assert len(stats) == 1
+    assert stats._frozen is frozen
+    assert stats.top_keys() == [(_key(1), 5)]
+
+
+def test_sharded_stats_multiple_producers():
+    stats = ShardedStats(batch_size=7, flush_interval=3600)
+
+    def produce():
+        for i in range(1000):
+            stats.add(_key(i % 3))
+        stats.flush()
+
+    producers = [threading.Thread(target=produce) for _ in range(4)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+
+    assert sorted(stats.top_keys()) == [(_key(0), 1336), (_key(1), 1332),
+                                        (_key(2), 1332)]
+
+
+def test_sharded_stats_snapshot_isolated_from_new_flows():
+    stats = ShardedStats(batch_size=1)
+    stats.add(_key(1))
+    assert stats.top_keys() == [(_key(1), 1)]
+
+    stats.add(_key(2))
+    assert stats.top_keys() == [(_key(1), 1), (_key(2), 1)]
+
+    stats.reset()
+    stats.add(_key(3))
+    assert stats.top_keys() == [(_key(3), 1)]
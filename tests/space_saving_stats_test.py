@@ -0,0 +1,56 @@
+import random
+
+from collections import Counter
+
+from nat_conntracker.flow_key import FlowKey
+from nat_conntracker.space_saving_stats import SpaceSavingStats
+
+
+def _key(i):
+    return FlowKey(i, i + 1, 443)
+
+
+def test_space_saving_stats_init():
+    stats = SpaceSavingStats()
+    assert stats.max_size > 0
+    assert stats.top() == []
+    assert len(stats) == 0
+    assert stats.items() == []
+
+
+def test_space_saving_stats_exact_under_capacity():
+    stats = SpaceSavingStats(max_size=10)
+    for i in range(5):
+        stats.add(_key(i), count=i + 1)
+    assert stats.top_keys(n=2) == [(_key(4), 5), (_key(3), 4)]
+    assert stats.error(_key(4)) == 0
+
+
+def test_space_saving_stats_error_bound():
+    rand = random.Random(0)
+    stats = SpaceSavingStats(max_size=50)
+    exact = Counter()
+    for _ in range(20000):
+        key = _key(int(rand.paretovariate(1.2)) % 2000)
+        exact[key] += 1
+        stats.add(key)
+
+    assert len(stats.counts) == 50
+    assert stats.evictions > 0
+    assert stats._min == min(stats.counts.values())
+    for (key, count) in stats.top_keys(n=50):
+        assert count >= exact[key]
+        assert count - stats.error(key) <= exact[key]
+
+    heavy = [key for (key, _) in exact.most_common(5)]
+    assert [key for (key, _) in stats.top_keys(n=5)] == heavy
+
+
+def test_space_saving_stats_reset():
+    stats = SpaceSavingStats(max_size=2)
+    for i in range(5):
+        stats.add(_key(i))
+    stats.reset()
+    assert stats.top_keys() == []
+    stats.add(_key(1))
+    assert stats.top_keys() == [(_key(1), 1)]
@@ -1,8 +1,71 @@
+from nat_conntracker.flow_key import flow_key
+from nat_conntracker.flow_parser import FlowAddress
 from nat_conntracker.stats import Stats
 
 
+def _key(src, dst, dport='443'):
+    return flow_key(FlowAddress(src, ''), FlowAddress(dst, dport))
+
+
 def test_stats_init():
     stats = Stats()
     assert stats.max_size > 0
     assert stats.counter is not None
     assert stats.index is not None
+    assert len(stats) == 0
+    assert stats.items() == []
+
+
+def test_stats_add_top():
+    stats = Stats()
+    for _ in range(3):
+        stats.add(_key('10.0.0.1', '1.2.3.4'))
+    stats.add(_key('10.0.0.2', '1.2.3.4'), count=2)
+
+    assert stats.top(n=2) == [
+        (('10.0.0.1', '1.2.3.4:443'), 3),
+        (('10.0.0.2', '1.2.3.4:443'), 2),
+    ]
+
+    stats.reset()
+    assert stats.top() == []
+
+
+def test_stats_evicts_oldest():
+    stats = Stats(max_size=2)
+    stats.add(_key('10.0.0.1', '1.2.3.4'))
+    stats.add(_key('10.0.0.1', '1.2.3.4'))
+    stats.add(_key('10.0.0.2', '1.2.3.4'))
+    stats.add(_key('10.0.0.3', '1.2.3.4'))
+
+    assert len(stats.counter) == 2
+    assert _key('10.0.0.1', '1.2.3.4') not in stats.counter
+
+
+def test_stats_keeps_candidates_through_churn():
+    stats = Stats(max_size=3, top_size=2)
+    stats.add(_key('10.0.0.1', '1.2.3.4'), count=10)
+    stats.add(_key('10.0.0.2', '1.2.3.4'), count=5)
+    for i in range(3, 20):
+        stats.add(_key(f'10.0.0.{i}', '1.2.3.4'))
+
+    assert stats.evictions == 16
+    assert not stats.candidates.dirty
+    assert stats.top(n=2) == [
+        (('10.0.0.1', '1.2.3.4:443'), 10),
+        (('10.0.0.2', '1.2.3.4:443'), 5),
+    ]
+    assert len(stats.top_keys(n=stats.max_size)) == 3
+
+
+def test_stats_top_after_evicting_candidate():
+    # With every key a candidate, the oldest is still evicted.
+    stats = Stats(max_size=2, top_size=2)
+    stats.add(_key('10.0.0.1', '1.2.3.4'), count=10)
+    stats.add(_key('10.0.0.2', '1.2.3.4'), count=5)
+    stats.add(_key('10.0.0.3', '1.2.3.4'), count=1)
+
+    assert stats.top(n=2) == [
+        (('10.0.0.2', '1.2.3.4:443'), 5),
+        (('10.0.0.3', '1.2.3.4:443'), 1),
+    ]
@@ -0,0 +1,65 @@
+import bz2
+import logging
+import os
+
+from xml.dom.minidom import parseString as minidom_parse_string
+from xml.parsers.expat import ExpatError
+
+from nat_conntracker.flow_parser import Flow
+from nat_conntracker.streaming_flow_parser import StreamingFlowParser
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+SAMPLE = os.path.join(HERE, 'data', 'conntrack-events-sample.xml.bz2')
+
+
+class CollectingConntracker(object):
+    def __init__(self):
+        self.flows = []
+
+    def handle_flow(self, flow):
+        self.flows.append(flow)
+
+
+def _minidom_flows(lines):
+    flows = []
+    for line in lines:
+        try:
+            dom = minidom_parse_string(line)
+        except ExpatError:
+            continue
+        for flow_node in dom.getElementsByTagName('flow'):
+            flows.append(Flow.from_node(flow_node))
+    return flows
+
+
+def test_streaming_flow_parser_init():
+    flp = StreamingFlowParser(None, None)
+    assert flp is not None
+
+
+def test_streaming_flow_parser_matches_minidom():
+    with bz2.open(SAMPLE, 'rt') as events:
+        lines = list(events)
+
+    ctr = CollectingConntracker()
+    StreamingFlowParser(ctr, logging.getLogger()).handle_events(lines)
+
+    expected = _minidom_flows(lines)
+    assert len(expected) > 0
+    assert [repr(f) for f in ctr.flows] == [repr(f) for f in expected]
+
+
+def test_streaming_flow_parser_recovers_from_garbage():
+    ctr = CollectingConntracker()
+    flp = StreamingFlowParser(ctr, logging.getLogger())
+    flp.handle_events([
+        '<flow type="new"><meta direction="original">\n', '</bogus>\n',
+        '<flow type="new"><meta direction="original"><layer3>'
+        '<src>10.0.0.1</src><dst>1.2.3.4</dst></layer3></meta></flow>\n'
+    ])
+
+    assert len(ctr.flows) == 1
+    assert ctr.flows[0].flowtype == 'new'
+    (src, dst) = ctr.flows[0].src_dst()
+    assert src.host == '10.0.0.1'
+    assert dst.host == '1.2.3.4'
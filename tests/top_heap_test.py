@@ -0,0 +1,42 @@
+import random
+
+from collections import Counter
+
+from nat_conntracker.top_heap import TopHeap
+
+
+def _top(heap):
+    return sorted(
+        ((key, count) for (key, count, _) in heap.items()),
+        key=lambda item: (-item[1], item[0]))
+
+
+def test_top_heap_tracks_largest():
+    rand = random.Random(7)
+    heap = TopHeap(size=5)
+    counter = Counter()
+    for _ in range(2000):
+        key = rand.randrange(50)
+        counter[key] += rand.randrange(1, 4)
+        heap.update(key, counter[key])
+
+    expected = sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+    assert [count for (_, count) in _top(heap)] == \
+        [count for (_, count) in expected[:5]]
+    assert not heap.dirty
+
+
+def test_top_heap_remove():
+    heap = TopHeap(size=3)
+    for (key, count) in (('a', 5), ('b', 3), ('c', 4)):
+        heap.update(key, count)
+    heap.remove('c')
+    heap.remove('nope')
+
+    assert heap.dirty
+    assert 'c' not in heap
+    assert _top(heap) == [('a', 5), ('b', 3)]
+
+    heap.clear()
+    assert len(heap) == 0
+    assert not heap.dirty
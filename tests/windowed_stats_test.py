@@ -0,0 +1,63 @@
+from nat_conntracker.flow_key import FlowKey
+from nat_conntracker.windowed_stats import WindowedStats
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _key(i):
+    return FlowKey(i, i + 1, 443)
+
+
+def test_windowed_stats_init():
+    stats = WindowedStats(window=60, bucket_width=5)
+    assert len(stats._buckets) == 12
+    assert stats.top() == []
+    assert len(stats) == 0
+    assert stats.items() == []
+
+
+def test_windowed_stats_spans_sample_boundary():
+    clock = FakeClock()
+    stats = WindowedStats(window=60, bucket_width=5, clock=clock)
+
+    for _ in range(30):
+        stats.add(_key(1))
+    clock.now += 30
+    stats.reset()
+    for _ in range(30):
+        stats.add(_key(1))
+
+    assert stats.top_keys() == [(_key(1), 60)]
+    assert stats.rate(60) == 2.0
+
+
+def test_windowed_stats_expires_old_buckets():
+    clock = FakeClock()
+    stats = WindowedStats(window=60, bucket_width=5, clock=clock)
+    buckets = [counter for (counter, _) in stats._buckets]
+
+    stats.add(_key(1), count=5)
+    clock.now += 30
+    stats.add(_key(2), count=3)
+    clock.now += 35
+    assert stats.top_keys() == [(_key(2), 3)]
+
+    clock.now += 600
+    assert stats.top_keys() == []
+    assert all(
+        a is b
+        for (a,
+             b) in zip([counter for (counter, _) in stats._buckets], buckets))
+
+
+def test_windowed_stats_bucket_max_size():
+    stats = WindowedStats(max_size=2, clock=FakeClock())
+    for i in range(4):
+        stats.add(_key(i))
+    assert [key for (key, _) in stats.top_keys()] == [_key(2), _key(3)]